@@ -27,7 +27,7 @@ docs_requirements = [
 required = [
     "appdirs",
     "daiquiri",
-    "pygithub",
+    "pygithub>=1.54,<1.56",
     "colored",
     "python-gitlab==1.15.0",
     "pluggy>=0.13.1",
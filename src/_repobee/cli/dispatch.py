@@ -9,12 +9,18 @@ CLI into commands for RepoBee's core.
 .. moduleauthor:: Simon Larsén
 """
 import argparse
+import hashlib
+import json
 import pathlib
 from typing import Optional, List
 
 import repobee_plug as plug
 
-from _repobee import command, exception, formatters, util
+from _repobee import command, config, constants, exception, formatters
+from _repobee import hookresults
+from _repobee.hookresults import HookResultsWriter
+from _repobee.journal import Journal
+from _repobee.taskcache import TaskCache
 from _repobee.cli.mainparser import (
     SETUP_PARSER,
     UPDATE_PARSER,
@@ -50,6 +56,8 @@ def dispatch_command(
         ext_commands: A list of active extension commands.
     """
     hook_results = {}
+    writer = _hook_results_writer(args)
+    on_results = writer.write if writer else None
 
     ext_command_names = [cmd.name for cmd in ext_commands or []]
     is_ext_command = args.subparser in ext_command_names
@@ -59,11 +67,21 @@ def dispatch_command(
         hook_results = res if res else hook_results
     elif args.subparser == SETUP_PARSER:
         hook_results = command.setup_student_repos(
-            args.master_repo_urls, args.students, api
+            args.master_repo_urls,
+            args.students,
+            api,
+            journal=_journal(args),
+            task_jobs=args.task_jobs,
+            on_results=on_results,
         )
     elif args.subparser == UPDATE_PARSER:
         command.update_student_repos(
-            args.master_repo_urls, args.students, api, issue=args.issue
+            args.master_repo_urls,
+            args.students,
+            api,
+            issue=args.issue,
+            journal=_journal(args),
+            task_jobs=args.task_jobs,
         )
     elif args.subparser == OPEN_ISSUE_PARSER:
         command.open_issue(
@@ -74,7 +92,17 @@ def dispatch_command(
     elif args.subparser == MIGRATE_PARSER:
         command.migrate_repos(args.master_repo_urls, api)
     elif args.subparser == CLONE_PARSER:
-        hook_results = command.clone_repos(args.repos, api)
+        hook_results = command.clone_repos(
+            args.repos,
+            api,
+            sync=args.sync,
+            depth=args.depth,
+            filter_spec=args.filter_spec,
+            task_jobs=args.task_jobs,
+            task_cache=_task_cache(args, config_file),
+            on_results=on_results,
+            master_repo_urls=args.master_repo_urls,
+        )
     elif args.subparser == VERIFY_PARSER:
         plug.manager.hook.get_api_class().verify_settings(
             args.user,
@@ -125,17 +153,107 @@ def dispatch_command(
         or is_ext_command
     ):
         LOGGER.info(formatters.format_hook_results_output(hook_results))
-    if hook_results and "hook_results_file" in args and args.hook_results_file:
+    if writer:
         _handle_hook_results(
-            hook_results=hook_results, filepath=args.hook_results_file
+            hook_results=hook_results,
+            writer=writer,
+            filepath=args.hook_results_file,
         )
 
 
-def _handle_hook_results(hook_results, filepath):
+def _journal(args: argparse.Namespace) -> Journal:
+    """Return the journal for a setup or update command. The journal is
+    identified by the arguments that determine which steps the command
+    performs, so only a rerun with the same arguments can resume from it.
+    """
+    return Journal.for_command(
+        args.subparser,
+        [args.base_url, args.org_name, *args.master_repo_urls]
+        + [
+            "{}:{}".format(team.name, ",".join(sorted(team.members)))
+            for team in args.students
+        ],
+        resume=args.resume,
+    )
+
+
+# arguments that only select which repos to act upon, or that can't affect
+# the results of tasks
+_TASK_CACHE_IGNORED_ARGS = frozenset(
+    [
+        "students",
+        "students_file",
+        "repos",
+        "master_repo_names",
+        "master_repo_urls",
+        "discover_repos",
+        "token",
+        "traceback",
+        "hook_results_file",
+        "sync",
+        "task_jobs",
+        "no_task_cache",
+    ]
+)
+
+
+def _task_cache(
+    args: argparse.Namespace, config_file: pathlib.Path
+) -> Optional[TaskCache]:
+    """Return the task cache for a clone command, or None if it is disabled.
+    The results of tasks may depend on any configuration, including
+    arguments added by plugins, so the cache is keyed by a digest of the
+    config file and of all arguments except those that are known to be
+    irrelevant.
+    """
+    if args.no_task_cache:
+        return None
+    content = config_file.read_bytes() if config_file.is_file() else b""
+    relevant_args = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in _TASK_CACHE_IGNORED_ARGS
+    }
+    digest = hashlib.sha256(content)
+    digest.update(
+        json.dumps(relevant_args, sort_keys=True, default=str).encode("utf8")
+    )
+    return TaskCache(
+        constants.TASK_CACHE_DIR,
+        digest.hexdigest(),
+        max_size=config.get_task_cache_size(config_file),
+    )
+
+
+def _hook_results_writer(
+    args: argparse.Namespace,
+) -> Optional[HookResultsWriter]:
+    """Return a writer that streams hook results to a records file next to
+    the hook results file, or None if no hook results file is specified.
+    """
+    if "hook_results_file" not in args or not args.hook_results_file:
+        return None
+    output_file = pathlib.Path(args.hook_results_file)
+    return HookResultsWriter(
+        output_file.with_name(output_file.name + ".jsonl")
+    )
+
+
+def _handle_hook_results(hook_results, writer, filepath):
+    """Write any hook results that were not streamed by the command, and then
+    compact the records into the hook results file.
+    """
+    for repo_name, results in hook_results.items():
+        if repo_name not in writer.written:
+            writer.write(repo_name, results)
+    writer.close()
+    if not writer.written:
+        return
+
     LOGGER.warning(
         "Storing hook results to file is an alpha feature, the file format "
         "is not final"
     )
-    output_file = pathlib.Path(filepath)
-    util.atomic_write(plug.result_mapping_to_json(hook_results), output_file)
+    hookresults.compact(writer.path, pathlib.Path(filepath))
+    writer.path.unlink()
     LOGGER.info("Hook results stored to {}".format(filepath))
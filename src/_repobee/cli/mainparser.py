@@ -67,6 +67,22 @@ _HOOK_RESULTS_PARSER.add_argument(
     type=str,
     default=None,
 )
+_RESUME_PARSER = argparse.ArgumentParser(add_help=False)
+_RESUME_PARSER.add_argument(
+    "--resume",
+    help="Resume a previous run with the same arguments that was "
+    "interrupted or had failures, skipping any steps that it completed.",
+    action="store_true",
+)
+_TASK_JOBS_PARSER = argparse.ArgumentParser(add_help=False)
+_TASK_JOBS_PARSER.add_argument(
+    "--task-jobs",
+    help="Execute plugin tasks in N processes in parallel. Tasks that are "
+    "not parallel safe are always executed one at a time.",
+    metavar="N",
+    type=int,
+    default=1,
+)
 _REPO_NAME_PARSER = argparse.ArgumentParser(add_help=False)
 _REPO_NAME_PARSER.add_argument(
     "--mn",
@@ -516,6 +532,8 @@ def _add_subparsers(parser, show_all_opts, ext_commands, config_file):
             master_org_parser,
             _REPO_NAME_PARSER,
             _HOOK_RESULTS_PARSER,
+            _RESUME_PARSER,
+            _TASK_JOBS_PARSER,
         ],
         formatter_class=_OrderedFormatter,
     )
@@ -534,6 +552,8 @@ def _add_subparsers(parser, show_all_opts, ext_commands, config_file):
             base_student_parser,
             master_org_parser,
             _REPO_NAME_PARSER,
+            _RESUME_PARSER,
+            _TASK_JOBS_PARSER,
         ],
         formatter_class=_OrderedFormatter,
     )
@@ -556,9 +576,46 @@ def _add_subparsers(parser, show_all_opts, ext_commands, config_file):
             base_student_parser,
             _REPO_DISCOVERY_PARSER,
             _HOOK_RESULTS_PARSER,
+            _TASK_JOBS_PARSER,
         ],
         formatter_class=_OrderedFormatter,
     )
+    clone.add_argument(
+        "--sync",
+        help=(
+            "Fast-forward student repos that are already on disk instead of "
+            "skipping them, and only run clone tasks on repos that were "
+            "cloned or changed."
+        ),
+        action="store_true",
+    )
+    clone.add_argument(
+        "--depth",
+        help=(
+            "Only clone the last N commits of each student repo. Ignored if "
+            "any clone task requires full history."
+        ),
+        metavar="N",
+        type=int,
+    )
+    clone.add_argument(
+        "--filter",
+        help=(
+            "Make partial clones that omit all blobs (blob:none) or all "
+            "trees and blobs (tree:0) outside of the checked out commit. "
+            "Ignored if any clone task requires full history."
+        ),
+        choices=("blob:none", "tree:0"),
+        dest="filter_spec",
+    )
+    clone.add_argument(
+        "--no-task-cache",
+        help=(
+            "Execute clone tasks on all repos, instead of reusing the results "
+            "from previous runs for repos that have not changed."
+        ),
+        action="store_true",
+    )
 
     for task in plug.manager.hook.clone_task():
         util.call_if_defined(task.add_option, clone)
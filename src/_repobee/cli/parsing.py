@@ -107,6 +107,16 @@ def _parse_args(
 
     if "base_url" in args:
         _validate_tls_url(args.base_url)
+    if "depth" in args and args.depth is not None and args.depth < 1:
+        raise exception.ParseError(
+            "--depth must be a positive integer, got {}".format(args.depth)
+        )
+    if "task_jobs" in args and args.task_jobs < 1:
+        raise exception.ParseError(
+            "--task-jobs must be a positive integer, got {}".format(
+                args.task_jobs
+            )
+        )
 
     args_dict = vars(args)
     args_dict["students"] = _extract_groups(args)
@@ -12,13 +12,23 @@ program.
 
 .. moduleauthor:: Simon Larsén
 """
-import itertools
+import collections
 import pathlib
-import shutil
 import os
 import sys
 import tempfile
-from typing import Iterable, List, Optional, Mapping, Generator
+from typing import (
+    Callable,
+    Container,
+    ContextManager,
+    Generator,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import daiquiri
 
@@ -30,12 +40,19 @@ from _repobee import exception
 from _repobee import config
 from _repobee import plugin
 from _repobee.git import Push
+from _repobee.journal import Journal
+from _repobee.taskcache import TaskCache
 
 LOGGER = daiquiri.getLogger(__file__)
 
 
 def setup_student_repos(
-    master_repo_urls: Iterable[str], teams: Iterable[plug.Team], api: plug.API
+    master_repo_urls: Iterable[str],
+    teams: Iterable[plug.Team],
+    api: plug.API,
+    journal: Optional[Journal] = None,
+    task_jobs: int = 1,
+    on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
 ) -> Mapping[str, List[plug.Result]]:
     """Setup student repositories based on master repo templates. Performs three
     primary tasks:
@@ -58,29 +75,85 @@ def setup_student_repos(
         teams: An iterable of student teams specifying the teams to be setup.
         api: An implementation of :py:class:`repobee_plug.API` used to
             interface with the platform (e.g. GitHub or GitLab) instance.
+        journal: An optional journal to record completed steps in. Steps that
+            are already recorded in it are skipped.
+        task_jobs: Amount of processes to execute setup tasks in.
+        on_results: An optional callback that is called with the name and
+            hook results of each master repo as soon as they are available.
     """
     urls = list(master_repo_urls)  # safe copy
-    master_repo_names = [util.repo_name(url) for url in urls]
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        LOGGER.info("Cloning into master repos ...")
-        master_repo_paths = _clone_all(urls, cwd=tmpdir)
-        hook_results = plugin.execute_setup_tasks(
-            master_repo_names, api, cwd=pathlib.Path(tmpdir)
-        )
+    with git.mirror_cache().mirrors(urls) as mirrors:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            master_repo_paths, local_paths = _prepare_master_repos(
+                urls, tmpdir, references=mirrors
+            )
+            hook_results = _execute_setup_tasks(
+                master_repo_paths, api, task_jobs, on_results
+            )
 
-        teams = api.ensure_teams_and_members(teams)
-        repo_urls = _create_student_repos(urls, teams, api)
+            teams = _ensure_teams(teams, api, journal)
+            repo_urls = _create_student_repos(urls, teams, api, journal)
 
-        push_tuples = _create_push_tuples(master_repo_paths, repo_urls)
-        LOGGER.info("Pushing files to student repos ...")
-        git.push(push_tuples)
+            git.repack_for_push(
+                [path for path in master_repo_paths if path not in local_paths]
+            )
+            push_tuples = _create_push_tuples(
+                master_repo_paths, repo_urls, local_paths
+            )
+            push_tuples = _skip_journaled_pushes(push_tuples, journal)
+            LOGGER.info("Pushing files to student repos ...")
+            failed_urls = _push(push_tuples, journal)
 
+    _finish_journal(journal, failed_urls)
     return hook_results
 
 
+def _ensure_teams(
+    teams: Iterable[plug.Team],
+    api: plug.API,
+    journal: Optional[Journal] = None,
+) -> List[plug.Team]:
+    """Ensure that the teams exist and contain their members. Teams that the
+    journal records as ensured are not touched.
+
+    Args:
+        teams: An iterable of student teams.
+        api: An implementation of :py:class:`plug.API` used to interface
+            with the platform (e.g. GitHub or GitLab) instance.
+        journal: An optional journal to record ensured teams in.
+    Returns:
+        the teams as returned by the platform.
+    """
+    if not journal:
+        return api.ensure_teams_and_members(teams)
+
+    ensured = journal.completed(Journal.TEAM_ENSURED)
+    teams = list(teams)
+    remaining = [team for team in teams if team.name not in ensured]
+    resumed = [
+        plug.Team(
+            name=team.name, members=team.members, id=ensured[team.name]["id"]
+        )
+        for team in teams
+        if team.name in ensured
+    ]
+    if resumed:
+        LOGGER.info(
+            "Skipping {} teams ensured in a previous run".format(len(resumed))
+        )
+
+    new = api.ensure_teams_and_members(remaining) if remaining else []
+    for team in new:
+        journal.record(Journal.TEAM_ENSURED, team.name, id=team.id)
+    journal.sync()
+    return resumed + new
+
+
 def _create_student_repos(
-    master_repo_urls: Iterable[str], teams: Iterable[plug.Team], api: plug.API
+    master_repo_urls: Iterable[str],
+    teams: Iterable[plug.Team],
+    api: plug.API,
+    journal: Optional[Journal] = None,
 ) -> List[str]:
     """Create student repos. Each team is assigned a single repo per master
     repo. Repos that already exist are not created, but their urls are returned
@@ -91,34 +164,211 @@ def _create_student_repos(
         teams: An iterable of student teams specifying the teams to be setup.
         api: An implementation of :py:class:`plug.API` used to interface
             with the platform (e.g. GitHub or GitLab) instance.
+        journal: An optional journal to record created repos in. Repos that
+            it records as created are not created again.
     Returns:
         a list of urls to the repos
     """
     LOGGER.info("Creating student repos ...")
     repo_infos = _create_repo_infos(master_repo_urls, teams)
-    repo_urls = api.create_repos(repo_infos)
+    if not journal:
+        return api.create_repos(repo_infos)
+
+    created = journal.completed(Journal.REPO_CREATED)
+    remaining = [info for info in repo_infos if info.name not in created]
+    resumed_names = [info.name for info in repo_infos if info.name in created]
+
+    # the repos are created with a single call so that the platform API can
+    # create them concurrently, and if the call fails, the next run still
+    # skips the repos that were created as they already exist
+    repo_urls = api.create_repos(remaining) if remaining else []
+    for info in remaining:
+        journal.record(Journal.REPO_CREATED, info.name)
+    journal.sync()
+
+    if resumed_names:
+        LOGGER.info(
+            "Skipping {} repos created in a previous run".format(
+                len(resumed_names)
+            )
+        )
+        repo_urls += api.get_repo_urls(resumed_names)
     return repo_urls
 
 
-def _clone_all(urls: Iterable[str], cwd: str):
-    """Attempts to clone all urls, sequentially. If a repo is already present,
-    it is skipped.  If any one clone fails (except for fails because the repo
-    is local), all cloned repos are removed
+def _skip_journaled_pushes(
+    push_tuples: List[Push], journal: Optional[Journal] = None
+) -> List[Push]:
+    """Return the push tuples that the journal does not record as pushed with
+    the current HEAD of the local repo.
+    """
+    if not journal:
+        return push_tuples
+
+    pushed = journal.completed(Journal.PUSH_SUCCEEDED)
+    heads = _local_heads(push_tuples)
+    remaining = [
+        pt
+        for pt in push_tuples
+        if pushed.get(util.repo_name(pt.repo_url), {}).get("sha")
+        != heads[pt.local_path]
+    ]
+    if len(remaining) < len(push_tuples):
+        LOGGER.info(
+            "Skipping {} pushes completed in a previous run".format(
+                len(push_tuples) - len(remaining)
+            )
+        )
+    return remaining
+
+
+def _push(push_tuples: List[Push], journal: Optional[Journal] = None):
+    """Push to the repos defined in push_tuples, and record each successful
+    push along with the pushed commit in the journal.
+
+    Returns:
+        urls to which pushes failed.
+    """
+    if not journal:
+        return git.push(push_tuples)
+
+    heads = _local_heads(push_tuples)
+
+    def _record_push(pt: Push) -> None:
+        journal.record(
+            Journal.PUSH_SUCCEEDED,
+            util.repo_name(pt.repo_url),
+            sha=heads[pt.local_path],
+        )
+
+    try:
+        return git.push(push_tuples, on_success=_record_push)
+    finally:
+        journal.sync()
+
+
+def _local_heads(push_tuples: Iterable[Push]) -> Mapping[str, Optional[str]]:
+    return {
+        path: git.head(path) for path in {pt.local_path for pt in push_tuples}
+    }
+
+
+def _finish_journal(
+    journal: Optional[Journal], failed_urls: Iterable[str]
+) -> None:
+    """Remove the journal if all steps were completed, and otherwise keep it
+    to allow resuming.
+    """
+    if not journal:
+        return
+    if failed_urls:
+        LOGGER.info(
+            "Progress is recorded in {}, rerun with --resume to only retry "
+            "the remaining steps".format(journal.path)
+        )
+    else:
+        journal.remove()
+
+
+def _prepare_master_repos(
+    urls: List[str],
+    cwd: str,
+    references: Optional[Mapping[str, pathlib.Path]] = None,
+) -> Tuple[List[str], Set[str]]:
+    """Get local copies of the master repos to push from. Master repos that
+    are local repos (i.e. that have file urls) are used directly instead of
+    being cloned, unless a setup task persists changes. They must then not be
+    modified, and HEAD should be pushed from them (see
+    :py:func:`_create_push_tuples`). The rest are cloned into cwd with
+    :py:func:`_clone_all`.
+
+    Args:
+        urls: Urls to master repos.
+        cwd: Directory to clone into.
+        references: See :py:func:`_clone_all`.
+    Returns:
+        paths to all of the master repos, in the same order as the urls, and
+        the subset of the paths that are local repos used directly.
+    """
+    if len(set(urls)) != len(urls):
+        raise ValueError("master_repo_urls contains duplicates")
+
+    local_paths = {}
+    if not any(
+        task.persist_changes for task in plug.manager.hook.setup_task()
+    ):
+        for url in urls:
+            path = util.local_repo_path(url)
+            if path:
+                local_paths[url] = str(path)
+    if local_paths:
+        LOGGER.info(
+            "Using {} local master repos without cloning".format(
+                len(local_paths)
+            )
+        )
+
+    remote_urls = [url for url in urls if url not in local_paths]
+    cloned_paths = (
+        _clone_all(remote_urls, cwd=cwd, references=references)
+        if remote_urls
+        else []
+    )
+    cloned = dict(zip(remote_urls, cloned_paths))
+    paths = [local_paths.get(url) or cloned[url] for url in urls]
+    return paths, set(local_paths.values())
+
+
+def _execute_setup_tasks(
+    master_repo_paths: List[str],
+    api: plug.API,
+    task_jobs: int,
+    on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
+) -> Mapping[str, List[plug.Result]]:
+    """Execute setup tasks on the master repos, which may be in different
+    directories.
+    """
+    repo_names_by_dir = collections.OrderedDict()
+    for path in map(pathlib.Path, master_repo_paths):
+        repo_names_by_dir.setdefault(path.parent, []).append(path.name)
+
+    hook_results = {}
+    for cwd, repo_names in repo_names_by_dir.items():
+        hook_results.update(
+            plugin.execute_setup_tasks(
+                repo_names,
+                api,
+                cwd=cwd,
+                jobs=task_jobs,
+                on_results=on_results,
+            )
+        )
+    return hook_results
+
+
+def _clone_all(
+    urls: Iterable[str],
+    cwd: str,
+    references: Optional[Mapping[str, pathlib.Path]] = None,
+):
+    """Attempts to clone all urls, concurrently. If any one clone fails, the
+    clones that are in progress are cancelled and the error is raised.
 
     Args:
         urls: HTTPS urls to git repositories.
         cwd: Working directory. Use temporary directory for automatic cleanup.
+        references: An optional mapping from url to a local repository to
+            borrow objects from. The references must outlive the clones.
     Returns:
         local paths to the cloned repos.
     """
     if len(set(urls)) != len(urls):
         raise ValueError("master_repo_urls contains duplicates")
+    LOGGER.info("Cloning into master repos ...")
     try:
-        for url in urls:
-            LOGGER.info("Cloning into {}".format(url))
-            git.clone_single(url, cwd=cwd)
-    except exception.CloneFailedError:
-        LOGGER.error("Error cloning into {}, aborting ...".format(url))
+        git.clone_all(urls, cwd=cwd, references=references)
+    except exception.CloneFailedError as exc:
+        LOGGER.error("Error cloning into {}, aborting ...".format(exc.url))
         raise
     paths = [os.path.join(cwd, util.repo_name(url)) for url in urls]
     assert all(map(util.is_git_repo, paths)), "all repos must be git repos"
@@ -130,6 +380,8 @@ def update_student_repos(
     teams: Iterable[plug.Team],
     api: plug.API,
     issue: Optional[plug.Issue] = None,
+    journal: Optional[Journal] = None,
+    task_jobs: int = 1,
 ) -> Mapping[str, List[plug.Result]]:
     """Attempt to update all student repos related to one of the master repos.
 
@@ -140,6 +392,9 @@ def update_student_repos(
         api: An implementation of :py:class:`repobee_plug.API` used to
             interface with the platform (e.g. GitHub or GitLab) instance.
         issue: An optional issue to open in repos to which pushing fails.
+        journal: An optional journal to record successful pushes in. Pushes
+            that are already recorded in it are skipped.
+        task_jobs: Amount of processes to execute setup tasks in.
     """
     urls = list(master_repo_urls)  # safe copy
 
@@ -150,22 +405,39 @@ def update_student_repos(
 
     repo_urls = api.get_repo_urls(master_repo_names, teams=teams)
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        LOGGER.info("Cloning into master repos ...")
-        master_repo_paths = _clone_all(urls, tmpdir)
-        hook_results = plugin.execute_setup_tasks(
-            master_repo_names, api, cwd=pathlib.Path(tmpdir)
-        )
+    with git.mirror_cache().mirrors(urls) as mirrors:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            master_repo_paths, local_paths = _prepare_master_repos(
+                urls, tmpdir, references=mirrors
+            )
+            hook_results = _execute_setup_tasks(
+                master_repo_paths, api, task_jobs
+            )
 
-        push_tuples = _create_push_tuples(master_repo_paths, repo_urls)
+            push_tuples = _create_push_tuples(
+                master_repo_paths, repo_urls, local_paths
+            )
+            push_tuples = _skip_journaled_pushes(push_tuples, journal)
+            LOGGER.info("Checking which student repos are up-to-date ...")
+            push_tuples, up_to_date = git.partition_up_to_date(push_tuples)
 
-        LOGGER.info("Pushing files to student repos ...")
-        failed_urls = git.push(push_tuples)
+            git.repack_for_push(
+                [path for path in master_repo_paths if path not in local_paths]
+            )
+            LOGGER.info("Pushing files to student repos ...")
+            failed_urls = _push(push_tuples, journal)
 
+    LOGGER.info(
+        "Skipped {} student repos that were already up-to-date".format(
+            len(up_to_date)
+        )
+    )
     if failed_urls and issue:
         LOGGER.info("Opening issue in repos to which push failed")
         _open_issue_by_urls(failed_urls, issue, api)
 
+    _finish_journal(journal, failed_urls)
+
     LOGGER.info("Done!")
     return hook_results
 
@@ -186,7 +458,15 @@ def _open_issue_by_urls(
 
 
 def clone_repos(
-    repos: Iterable[plug.Repo], api: plug.API
+    repos: Iterable[plug.Repo],
+    api: plug.API,
+    sync: bool = False,
+    depth: Optional[int] = None,
+    filter_spec: Optional[str] = None,
+    task_jobs: int = 1,
+    task_cache: Optional[TaskCache] = None,
+    on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
+    master_repo_urls: Optional[Iterable[str]] = None,
 ) -> Mapping[str, List[plug.Result]]:
     """Clone all student repos related to the provided master repos and student
     teams.
@@ -196,22 +476,182 @@ def clone_repos(
             ``implementation`` attribute, so it does not need to be set.
         api: An implementation of :py:class:`repobee_plug.API` used to
             interface with the platform (e.g. GitHub or GitLab) instance.
+        sync: If True, repos that are already on disk are fast-forwarded to
+            the state of their remotes instead of being skipped, and clone
+            tasks are only executed on repos that were cloned or whose HEAD
+            changed.
+        depth: If given, only the last depth commits of each repo are cloned.
+        filter_spec: If given, an object filter for partial clones (e.g.
+            ``blob:none``).
+        task_jobs: Amount of processes to execute clone tasks in.
+        task_cache: An optional cache of clone task results. Clone tasks are
+            not executed on repos whose results are cached.
+        on_results: An optional callback that is called with the name and
+            hook results of each repo as soon as they are available. It may
+            be called several times for the same repo.
+        master_repo_urls: URLs to the master repos that the student repos are
+            based on. Student repos borrow objects from cached mirrors of
+            them, if there are any.
     Returns:
         A mapping from repo name to a list of hook results.
     """
-    repos_for_tasks, repos_for_clone = itertools.tee(repos)
-    non_local_repos = _non_local_repos(repos_for_clone)
+    master_repo_urls = list(master_repo_urls or [])
+    full_history = plugin.clone_tasks_require_full_history()
+    if full_history and (depth or filter_spec):
+        LOGGER.warning(
+            "A clone task requires full history, cloning full history"
+        )
+        depth = filter_spec = None
+
+    if sync:
+        return _sync_repos(
+            repos,
+            api,
+            depth,
+            filter_spec,
+            full_history,
+            task_jobs,
+            task_cache,
+            on_results,
+            master_repo_urls,
+        )
+
+    repos = list(repos)
+    non_local_repos = list(_non_local_repos(repos))
+
+    if not any("clone_task" in dir(p) for p in plug.manager.get_plugins()):
+        LOGGER.info("Cloning into student repos ...")
+        with _staging_dir() as tmpdir:
+            _clone_repos_no_check(
+                non_local_repos,
+                tmpdir,
+                api,
+                depth=depth,
+                filter_spec=filter_spec,
+                master_repo_urls=master_repo_urls,
+            )
+        return {}
+
+    # clone tasks are executed on each repo as soon as it has been cloned,
+    # while the rest of the repos are being cloned
+    with plugin.clone_task_pipeline(
+        api, jobs=task_jobs, cache=task_cache, on_results=on_results
+    ) as pipeline:
+        non_local_repo_names = set(repo.name for repo in non_local_repos)
+        for repo in repos:
+            if repo.name not in non_local_repo_names:
+                pipeline.put(repo.name)
+
+        LOGGER.info("Cloning into student repos ...")
+        with _staging_dir() as tmpdir:
+            _clone_repos_no_check(
+                non_local_repos,
+                tmpdir,
+                api,
+                depth=depth,
+                filter_spec=filter_spec,
+                on_cloned=pipeline.put,
+                master_repo_urls=master_repo_urls,
+            )
+    return pipeline.results
+
+
+def _sync_repos(
+    repos: Iterable[plug.Repo],
+    api: plug.API,
+    depth: Optional[int],
+    filter_spec: Optional[str],
+    full_history: bool,
+    task_jobs: int,
+    task_cache: Optional[TaskCache],
+    on_results: Optional[Callable[[str, List[plug.Result]], None]],
+    master_repo_urls: List[str],
+) -> Mapping[str, List[plug.Result]]:
+    """Fast-forward the repos that are already on disk and clone the rest, and
+    then execute clone tasks on the repos that were cloned or whose HEAD
+    changed. The first hook result for each repo reports the commit SHAs of
+    HEAD before and after syncing. If full_history is True, shallow repos on
+    disk are deepened to their full history.
+    """
+    repos = list(repos)
+    local_repos = [repo for repo in repos if util.is_git_repo(repo.name)]
+    local_repo_names = set(repo.name for repo in local_repos)
+    non_local_repos = _non_local_repos(
+        repo for repo in repos if repo.name not in local_repo_names
+    )
+
+    LOGGER.info("Syncing existing student repos ...")
+    heads, _ = git.pull(
+        (
+            git.Pull(local_path=repo.name, repo_url=repo.url, branch="")
+            for repo in local_repos
+        ),
+        unshallow=full_history,
+    )
 
-    LOGGER.info("Cloning into student repos ...")
-    with tempfile.TemporaryDirectory() as tmpdir:
-        _clone_repos_no_check(non_local_repos, tmpdir, api)
+    LOGGER.info("Cloning into missing student repos ...")
+    with _staging_dir() as tmpdir:
+        cloned_repo_names = _clone_repos_no_check(
+            non_local_repos,
+            tmpdir,
+            api,
+            depth=depth,
+            filter_spec=filter_spec,
+            master_repo_urls=master_repo_urls,
+        )
 
-    for p in plug.manager.get_plugins():
-        if "clone_task" in dir(p):
-            return plugin.execute_clone_tasks(
-                [repo.name for repo in repos_for_tasks], api
+    sync_results = {}
+    for repo in local_repos:
+        if repo.url in heads:
+            sync_results[repo.name] = _sync_result(*heads[repo.url])
+        else:
+            sync_results[repo.name] = plug.Result(
+                name="sync",
+                status=plug.Status.ERROR,
+                msg="Failed to fast-forward {}".format(repo.name),
             )
-    return {}
+    for repo_name in cloned_repo_names:
+        sync_results[repo_name] = _sync_result(None, git.head(repo_name))
+
+    changed_repo_names = [
+        repo_name
+        for repo_name, result in sync_results.items()
+        if result.status == plug.Status.SUCCESS
+        and result.data["old_sha"] != result.data["new_sha"]
+    ]
+    hook_results = {
+        repo_name: [result] for repo_name, result in sync_results.items()
+    }
+    if on_results:
+        for repo_name, results in hook_results.items():
+            on_results(repo_name, results)
+    task_results = plugin.execute_clone_tasks(
+        changed_repo_names,
+        api,
+        jobs=task_jobs,
+        cache=task_cache,
+        on_results=on_results,
+    )
+    for repo_name, results in task_results.items():
+        hook_results.setdefault(repo_name, []).extend(results)
+    return hook_results
+
+
+def _sync_result(
+    old_sha: Optional[str], new_sha: Optional[str]
+) -> plug.Result:
+    if old_sha is None:
+        msg = "Cloned at {}".format(new_sha)
+    elif old_sha == new_sha:
+        msg = "Up-to-date at {}".format(new_sha)
+    else:
+        msg = "Fast-forwarded from {} to {}".format(old_sha, new_sha)
+    return plug.Result(
+        name="sync",
+        status=plug.Status.SUCCESS,
+        msg=msg,
+        data={"old_sha": old_sha, "new_sha": new_sha},
+    )
 
 
 def _non_local_repos(
@@ -220,7 +660,9 @@ def _non_local_repos(
     """Yield repos with names that do not clash with any of the files present
     in cwd.
     """
-    local_files = set(path.name for path in cwd.glob("*"))
+    local_files = set(
+        path.name for path in cwd.glob("*") if not util.is_scratch_dir(path)
+    )
     for repo in repos:
         if repo.name not in local_files:
             yield repo
@@ -228,31 +670,101 @@ def _non_local_repos(
             LOGGER.warning("{} already on disk, skipping".format(repo.name))
 
 
-def _clone_repos_no_check(repos, dst_dirpath, api) -> List[str]:
+def _staging_dir() -> ContextManager[pathlib.Path]:
+    """Return a temporary directory to clone into before moving the clones to
+    the current working directory. The directory is on the same filesystem as
+    the current working directory, so that the clones can be moved with an
+    atomic rename instead of being copied. See :py:func:`util.scratch_dir`.
+    """
+    return util.scratch_dir("staging", pathlib.Path("."))
+
+
+def _clone_repos_no_check(
+    repos,
+    dst_dirpath,
+    api,
+    depth=None,
+    filter_spec=None,
+    on_cloned: Optional[Callable[[str], None]] = None,
+    master_repo_urls: Iterable[str] = (),
+) -> List[str]:
     """Clone the specified repo urls into the destination directory without
-    making any sanity checks; they must be done in advance.
+    making any sanity checks; they must be done in advance. See
+    :py:func:`_repobee.git.clone` for the depth and filter_spec arguments.
+
+    Student repos borrow objects from any cached mirrors of the master repos
+    at master_repo_urls that they are based on, so that only the students'
+    own objects are fetched.
+
+    Each successfully cloned repo is moved into the current working directory
+    as soon as it has been cloned, after which on_cloned (if given) is called
+    with its name. The destination directory should be on the same filesystem
+    (see :py:func:`_staging_dir`), as the repos are moved with a rename.
 
     Return a list of names of the successfully cloned repos.
     """
-    repos_iter_a, repos_iter_b = itertools.tee(repos)
-    repo_urls = (repo.url for repo in repos_iter_b)
-
-    fail_urls = git.clone(repo_urls, cwd=dst_dirpath)
-    fail_repo_names = set(api.extract_repo_name(url) for url in fail_urls)
-    repo_names = set(repo.name for repo in repos_iter_a)
-    cloned_repos = [
-        path
-        for path in pathlib.Path(dst_dirpath).iterdir()
-        if path.is_dir()
-        and util.is_git_repo(str(path))
-        and path.name not in fail_repo_names
-        and path.name in repo_names
-    ]
-
+    repos = list(repos)
     cur_dir = pathlib.Path(".").resolve()
-    for repo in cloned_repos:
-        shutil.copytree(src=str(repo), dst=str(cur_dir / repo.name))
-    return [repo.name for repo in cloned_repos]
+    cloned_repo_names = []
+    move_errors = []
+
+    def _move_into_place(repo_url: str) -> None:
+        repo_name = api.extract_repo_name(repo_url)
+        dst = cur_dir / repo_name
+        if dst.exists():
+            move_errors.append(
+                FileExistsError(
+                    "Can't move {} into place, {} already exists".format(
+                        repo_name, dst
+                    )
+                )
+            )
+            return
+        os.rename(str(pathlib.Path(dst_dirpath) / repo_name), str(dst))
+        cloned_repo_names.append(repo_name)
+        if on_cloned:
+            on_cloned(repo_name)
+
+    with git.mirror_cache().cached_mirrors(master_repo_urls) as mirrors:
+        git.clone(
+            [repo.url for repo in repos],
+            cwd=str(dst_dirpath),
+            references=_find_master_mirrors(repos, mirrors),
+            depth=depth,
+            filter_spec=filter_spec,
+            on_success=_move_into_place,
+        )
+    if move_errors:
+        raise move_errors[0]
+    return cloned_repo_names
+
+
+def _find_master_mirrors(
+    repos: Iterable[plug.Repo], mirrors: Mapping[str, pathlib.Path]
+) -> Mapping[str, pathlib.Path]:
+    """Find the mirror of the master repo that each student repo is based on.
+    Student repo names end with the name of their master repo, and if several
+    master repo names match, the longest one is picked.
+
+    Args:
+        repos: Student repos.
+        mirrors: A mapping from master repo url to path to its mirror.
+    Returns:
+        A mapping from student repo url to master repo mirror, for each student
+        repo that has a mirrored master repo.
+    """
+    mirrors_by_name = sorted(
+        ((util.repo_name(url), mirror) for url, mirror in mirrors.items()),
+        key=lambda name_and_mirror: len(name_and_mirror[0]),
+        reverse=True,
+    )
+    references = {}
+    for repo in repos:
+        for master_repo_name, mirror in mirrors_by_name:
+            if repo.name.endswith("-" + master_repo_name):
+                references[repo.url] = mirror
+                break
+    return references
 
 
 def migrate_repos(master_repo_urls: Iterable[str], api: plug.API) -> None:
@@ -277,20 +789,21 @@ def migrate_repos(master_repo_urls: Iterable[str], api: plug.API) -> None:
         for master_name in master_names
     ]
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        _clone_all(master_repo_urls, cwd=tmpdir)
-        repo_urls = api.create_repos(infos)
-
-        git.push(
-            [
-                git.Push(
-                    local_path=os.path.join(tmpdir, info.name),
-                    repo_url=repo_url,
-                    branch="master",
-                )
-                for repo_url, info in zip(repo_urls, infos)
-            ]
-        )
+    with git.mirror_cache().mirrors(master_repo_urls) as mirrors:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _clone_all(master_repo_urls, cwd=tmpdir, references=mirrors)
+            repo_urls = api.create_repos(infos)
+
+            git.push(
+                [
+                    git.Push(
+                        local_path=os.path.join(tmpdir, info.name),
+                        repo_url=repo_url,
+                        branch="master",
+                    )
+                    for repo_url, info in zip(repo_urls, infos)
+                ]
+            )
 
     LOGGER.info("Done!")
 
@@ -325,7 +838,9 @@ def _create_repo_infos(
 
 
 def _create_push_tuples(
-    master_repo_paths: Iterable[str], repo_urls: Iterable[str]
+    master_repo_paths: Iterable[str],
+    repo_urls: Iterable[str],
+    local_paths: Container[str] = frozenset(),
 ) -> List[Push]:
     """Create Push namedtuples for all repo urls in repo_urls that share
     repo base name with any of the urls in master_urls.
@@ -333,6 +848,9 @@ def _create_push_tuples(
     Args:
         master_repo_paths: Local paths to master repos.
         repo_urls: Urls to student repos.
+        local_paths: Paths to master repos that are used directly instead of
+            being cloned, from which HEAD is pushed instead of the master
+            branch.
 
     Returns:
         A list of Push namedtuples for all student repo urls that relate to
@@ -341,8 +859,9 @@ def _create_push_tuples(
     push_tuples = []
     for path in master_repo_paths:
         repo_base_name = os.path.basename(path)
+        branch = "HEAD:master" if path in local_paths else "master"
         push_tuples += [
-            git.Push(local_path=path, repo_url=repo_url, branch="master")
+            git.Push(local_path=path, repo_url=repo_url, branch=branch)
             for repo_url in repo_urls
             if repo_url.endswith(repo_base_name)
             or repo_url.endswith(repo_base_name + ".git")
@@ -18,6 +18,8 @@ import repobee_plug as plug
 
 from _repobee import exception
 from _repobee import constants
+from _repobee import git
+from _repobee import taskcache
 
 
 LOGGER = daiquiri.getLogger(__file__)
@@ -86,6 +88,82 @@ def get_plugin_names(config_file: Union[str, pathlib.Path]) -> List[str]:
     return [name.strip() for name in plugin_string.split(",") if name]
 
 
+def get_git_settings(
+    config_file: Union[str, pathlib.Path]
+) -> Mapping[str, int]:
+    """Return the git settings that are configured in the config file, with
+    the ``git_`` prefix stripped from the option names. Settings that are not
+    configured are omitted.
+
+    Args:
+        config_file: path to the config file.
+
+    Returns:
+        a mapping from setting name to value.
+    """
+    config_file = pathlib.Path(config_file)
+    if not config_file.is_file():
+        return {}
+    defaults = _read_config(config_file)[constants.DEFAULTS_SECTION_HDR]
+
+    settings = {}
+    for option in constants.ORDERED_GIT_CONFIGURABLE_ARGS:
+        if option not in defaults:
+            continue
+        # a timeout of 0 disables the timeout
+        minimum = 0 if option == "git_timeout" else 1
+        settings[option[len("git_") :]] = _parse_int(
+            defaults[option], option, minimum, config_file
+        )
+
+    min_concurrency = settings.get("min_concurrency", git.MIN_CONCURRENT_TASKS)
+    max_concurrency = settings.get("max_concurrency", git.MAX_CONCURRENT_TASKS)
+    if min_concurrency > max_concurrency:
+        raise exception.FileError(
+            "config file at {} has git_min_concurrency ({}) larger than "
+            "git_max_concurrency ({})".format(
+                config_file, min_concurrency, max_concurrency
+            )
+        )
+    return settings
+
+
+def get_task_cache_size(config_file: Union[str, pathlib.Path]) -> int:
+    """Return the maximum size of the task cache in megabytes, as configured
+    in the config file.
+
+    Args:
+        config_file: path to the config file.
+    Returns:
+        the configured size, or the default size if it is not configured.
+    """
+    config_file = pathlib.Path(config_file)
+    if not config_file.is_file():
+        return taskcache.DEFAULT_TASK_CACHE_SIZE
+    defaults = _read_config(config_file)[constants.DEFAULTS_SECTION_HDR]
+    if "task_cache_size" not in defaults:
+        return taskcache.DEFAULT_TASK_CACHE_SIZE
+    return _parse_int(
+        defaults["task_cache_size"], "task_cache_size", 1, config_file
+    )
+
+
+def _parse_int(
+    value: str, option: str, minimum: int, config_file: pathlib.Path
+) -> int:
+    if not value.isdigit() or int(value) < minimum:
+        raise exception.FileError(
+            "config file at {} has an invalid value for {}: expected a "
+            "{} integer, got '{}'".format(
+                config_file,
+                option,
+                "non-negative" if minimum == 0 else "positive",
+                value,
+            )
+        )
+    return int(value)
+
+
 def execute_config_hooks(config_file: Union[str, pathlib.Path]) -> None:
     """Execute all config hooks.
 
@@ -22,11 +22,32 @@ LOG_DIR = pathlib.Path(
         appname=_repobee._external_package_name, appauthor=_repobee.__author__
     )
 )
+CACHE_DIR = pathlib.Path(
+    appdirs.user_cache_dir(
+        appname=_repobee._external_package_name, appauthor=_repobee.__author__
+    )
+)
+MIRROR_CACHE_DIR = CACHE_DIR / "mirrors"
+JOURNAL_DIR = CACHE_DIR / "journals"
+TASK_CACHE_DIR = CACHE_DIR / "tasks"
+HTTP_CACHE_DIR = CACHE_DIR / "http"
+SCRATCH_DIR = CACHE_DIR / "scratch"
 DEFAULTS_SECTION_HDR = "DEFAULTS"
 DEFAULT_CONFIG_FILE = CONFIG_DIR / "config.cnf"
 assert DEFAULT_CONFIG_FILE.is_absolute()
 
-# arguments that can be configured via config file
+# settings for git operations that can be configured via config file, all of
+# them are positive integers except for git_timeout, which may also be 0
+ORDERED_GIT_CONFIGURABLE_ARGS = (
+    "git_min_concurrency",
+    "git_max_concurrency",
+    "git_mirror_cache_size",
+    "git_push_tries",
+    "git_timeout",
+)
+
+# arguments that can be configured via config file, and that the config
+# wizard prompts for
 ORDERED_CONFIGURABLE_ARGS = (
     "user",
     "base_url",
@@ -36,6 +57,14 @@ ORDERED_CONFIGURABLE_ARGS = (
     "students_file",
     "plugins",
 )
-CONFIGURABLE_ARGS = set(ORDERED_CONFIGURABLE_ARGS)
+# arguments that can be configured via config file, but that the config
+# wizard does not prompt for
+ORDERED_ADVANCED_CONFIGURABLE_ARGS = ORDERED_GIT_CONFIGURABLE_ARGS + (
+    "task_cache_size",
+    "api_max_concurrency",
+)
+CONFIGURABLE_ARGS = set(ORDERED_CONFIGURABLE_ARGS) | set(
+    ORDERED_ADVANCED_CONFIGURABLE_ARGS
+)
 
 TOKEN_ENV = "REPOBEE_TOKEN"
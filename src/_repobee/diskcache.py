@@ -0,0 +1,131 @@
+"""Base class for persistent caches.
+
+.. module:: diskcache
+    :synopsis: On-disk caches with one file per entry, which are written
+        atomically and evicted in least recently used order.
+
+.. moduleauthor:: Simon Larsén
+"""
+import os
+import pathlib
+import threading
+from typing import Optional
+
+import daiquiri
+
+from _repobee import util
+
+LOGGER = daiquiri.getLogger(__file__)
+
+
+class DiskCache:
+    """An on-disk cache in which each entry is stored in a separate file.
+    Entries are written atomically, so several processes can safely use the
+    same cache concurrently. When the total size of the cache exceeds the
+    maximum size, the least recently used entries are evicted. The size of
+    the cache is only measured the first time it grows, after which the
+    sizes of new entries are added to it, so entries written by other
+    processes may not be accounted for until the next instance measures it.
+
+    An instance may be used by several threads at once.
+    """
+
+    ENTRY_SUFFIX = ".json"
+    # what the cache contains, for log messages
+    DESCRIPTION = "cache"
+
+    def __init__(self, root: pathlib.Path, max_size: int):
+        """
+        Args:
+            root: Directory to put the cache in.
+            max_size: Maximum size of the cache in megabytes.
+        """
+        self.root = root
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # the size of the cache in bytes, if it has been measured
+        self._size = None
+
+    def evict(self) -> None:
+        """Evict the least recently used entries until the size of the cache
+        is within the limit.
+        """
+        with self._lock:
+            self._evict()
+
+    def _read_entry(self, key: str) -> Optional[str]:
+        """Return the content of the entry with the given key, or None if
+        there is no such entry.
+        """
+        try:
+            return self._entry_path(key).read_text(encoding="utf8")
+        except FileNotFoundError:
+            return None
+
+    def _touch_entry(self, key: str) -> None:
+        """Mark the entry with the given key as used."""
+        try:
+            # the modification time of an entry marks its last use
+            os.utime(str(self._entry_path(key)))
+        except OSError:  # evicted by another process
+            pass
+
+    def _write_entry(self, key: str, content: str) -> int:
+        """Atomically write an entry. :py:meth:`_grow` must be called with
+        the returned size afterwards, which may be done once for several
+        entries.
+
+        Returns:
+            the size of the entry in bytes.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        util.atomic_write(content, self._entry_path(key))
+        return len(content.encode("utf8"))
+
+    def _grow(self, written: int) -> None:
+        """Account for written bytes, and evict entries if the cache has
+        outgrown its limit.
+        """
+        with self._lock:
+            if self._size is None or self._size + written > self._max_bytes():
+                self._evict()
+            else:
+                self._size += written
+
+    def _evict(self) -> None:
+        if not self.root.is_dir():
+            return
+        entries = []
+        for path in self.root.glob("*" + self.ENTRY_SUFFIX):
+            try:
+                stat = path.stat()
+            except OSError:  # evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        max_bytes = self._max_bytes()
+        evicted = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+            evicted += 1
+        self._size = total
+        if evicted:
+            LOGGER.info(
+                "Evicted {} entries from the {}".format(
+                    evicted, self.DESCRIPTION
+                )
+            )
+
+    def _max_bytes(self) -> float:
+        return self.max_size * 1024 * 1024
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.root / (key + self.ENTRY_SUFFIX)
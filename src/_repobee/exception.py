@@ -100,6 +100,14 @@ class PushFailedError(GitError):
         super().__init__(msg, returncode, stderr)
 
 
+class PullFailedError(GitError):
+    """An error to raise when pulling into an existing repository fails."""
+
+    def __init__(self, msg: str, returncode: int, stderr: bytes, url: str):
+        self.url = url
+        super().__init__(msg, returncode, stderr)
+
+
 class PluginLoadError(RepoBeeException):
     """Generic error to raise when something goes wrong with loading
     plugins.
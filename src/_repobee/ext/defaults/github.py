@@ -10,19 +10,30 @@ GitHubAPI are mostly high-level bulk operations.
 
 .. moduleauthor:: Simon Larsén
 """
+import concurrent.futures
+import configparser
+import datetime
+import math
 import re
+import threading
 import pathlib
-from typing import List, Iterable, Mapping, Optional, Generator, Tuple
+import urllib.parse
+from typing import List, Iterable, Mapping, Optional, Generator, Set, Tuple
 from socket import gaierror
 import collections
 import contextlib
+import itertools
 
 import daiquiri
 import github
+import requests.exceptions
 
 import repobee_plug as plug
 
+from _repobee import constants
 from _repobee import exception
+from _repobee import httpcache
+from _repobee import ratelimit
 
 REQUIRED_TOKEN_SCOPES = {"admin:org", "repo"}
 ISSUE_GENERATOR = Generator[plug.Issue, None, None]
@@ -38,6 +49,77 @@ _ISSUE_STATE_MAPPING = {
     plug.IssueState.CLOSED: "closed",
     plug.IssueState.ALL: "all",
 }
+_GRAPHQL_ISSUE_STATE_MAPPING = {
+    plug.IssueState.OPEN: ["OPEN"],
+    plug.IssueState.CLOSED: ["CLOSED"],
+    plug.IssueState.ALL: ["OPEN", "CLOSED"],
+}
+# the issues of the REST API include pull requests, and merged pull requests
+# are closed
+_GRAPHQL_PULL_REQUEST_STATE_MAPPING = {
+    plug.IssueState.OPEN: ["OPEN"],
+    plug.IssueState.CLOSED: ["CLOSED", "MERGED"],
+    plug.IssueState.ALL: ["OPEN", "CLOSED", "MERGED"],
+}
+
+# maximum page size of the REST API
+_MAX_PAGE_SIZE = 100
+
+# default maximum amount of concurrent API requests, see configure
+DEFAULT_MAX_CONCURRENCY = 8
+_MAX_CONCURRENCY = DEFAULT_MAX_CONCURRENCY
+
+# maximum amount of repos or teams to query in a single GraphQL request
+_GRAPHQL_BATCH_SIZE = 50
+# maximum amount of nodes in a page of a GraphQL connection
+_GRAPHQL_PAGE_SIZE = 100
+
+# issues and pull requests are ordered like in the REST API
+_GRAPHQL_REPO_ISSUES = """
+{alias}: repository(owner: $owner, name: ${alias}) {{
+    name
+    issues(first: %d, states: $states, orderBy: $order) {{
+        pageInfo {{ hasNextPage }}
+        nodes {{ title body number createdAt author {{ login }} }}
+    }}
+    pullRequests(first: %d, states: $pullRequestStates, orderBy: $order) {{
+        pageInfo {{ hasNextPage }}
+        nodes {{ title body number createdAt author {{ login }} }}
+    }}
+}}""" % (
+    _GRAPHQL_PAGE_SIZE,
+    _GRAPHQL_PAGE_SIZE,
+)
+_GRAPHQL_ISSUE_ORDER = dict(field="CREATED_AT", direction="DESC")
+_GRAPHQL_REVIEW_TEAM = """
+{alias}: team(slug: ${alias}) {{
+    members(first: %d) {{
+        pageInfo {{ hasNextPage }}
+        nodes {{ login }}
+    }}
+    repositories(first: 1) {{
+        totalCount
+        nodes {{
+            name
+            issues(first: %d, states: [OPEN]) {{
+                pageInfo {{ hasNextPage }}
+                nodes {{ title author {{ login }} }}
+            }}
+        }}
+    }}
+}}""" % (
+    _GRAPHQL_PAGE_SIZE,
+    _GRAPHQL_PAGE_SIZE,
+)
+# types of GraphQL errors that are caused by a lack of permissions, which
+# will not go away by using the GraphQL API again
+_GRAPHQL_PERMISSION_ERRORS = {"FORBIDDEN", "INSUFFICIENT_SCOPES"}
+# HTTP statuses of GraphQL requests that mean that the GraphQL API is not
+# available with the current credentials or GitHub instance
+_GRAPHQL_UNAVAILABLE_STATUSES = {403, 404}
+# GitHub answers heavy GraphQL queries with e.g. 502 or 504 when they take too
+# long, in which case only the failed query falls back to the REST API
+_GRAPHQL_TRANSIENT_ERRORS = (requests.exceptions.Timeout,)
 
 
 # classes used internally in this module
@@ -109,6 +191,119 @@ def _try_api_request(ignore_statuses: Optional[Iterable[int]] = None):
         )
 
 
+def configure(max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> None:
+    """Configure how API requests are executed. Typically called with the
+    ``api_max_concurrency`` setting from the config file.
+
+    Args:
+        max_concurrency: The maximum amount of worker threads that send
+            concurrent API requests.
+    """
+    global _MAX_CONCURRENCY
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be larger than 0")
+    _MAX_CONCURRENCY = max_concurrency
+
+
+class _GraphQLError(Exception):
+    """Raised when a GraphQL query can't be answered, in which case the REST
+    API should be used instead.
+    """
+
+
+def _batches(items: list, size: int) -> Generator[list, None, None]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _graphql_query(
+    fields_template: str, values: List[str], outer: str = "{}"
+) -> Tuple[str, Mapping[str, str]]:
+    """Create a query with one aliased field per value, where the alias is
+    also the name of the variable that the value is passed in.
+
+    Args:
+        fields_template: A template of the field with an alias placeholder.
+        values: Values to create one field each for.
+        outer: A template that the fields are put in.
+    Returns:
+        the query without variable definitions, and a mapping from alias to
+        value.
+    """
+    aliases = ["v{}".format(i) for i in range(len(values))]
+    fields = "".join(fields_template.format(alias=alias) for alias in aliases)
+    return outer.format(fields), dict(zip(aliases, values))
+
+
+def _graphql_created_at(node: dict) -> str:
+    """Convert a GraphQL timestamp to the format of the REST API."""
+    return datetime.datetime.strptime(
+        node["createdAt"], "%Y-%m-%dT%H:%M:%SZ"
+    ).isoformat()
+
+
+def _graphql_author(node: dict) -> Optional[str]:
+    # the author is null if the account has been deleted
+    return node["author"]["login"] if node["author"] else None
+
+
+def _team_slug(team_name: str) -> str:
+    """Return the slug that GitHub most likely generates for a team name."""
+    return re.sub(r"[^a-z0-9_]+", "-", team_name.lower()).strip("-")
+
+
+def _pace_requests(
+    requester: github.Requester.Requester, pacer: ratelimit.RequestPacer
+) -> None:
+    """Send all requests of a PyGithub requester through a request pacer."""
+    request_json = requester.requestJson
+
+    def _request_json(
+        verb, url, parameters=None, headers=None, input=None, cnx=None
+    ):
+        return pacer.send(
+            verb,
+            lambda: request_json(verb, url, parameters, headers, input, cnx),
+            lambda response: (
+                response[0],
+                response[1],
+                response[2] if isinstance(response[2], str) else "",
+            ),
+        )
+
+    requester.requestJson = _request_json
+
+
+def _cache_conditional_requests(
+    requester: github.Requester.Requester,
+    cache: httpcache.ConditionalRequestCache,
+) -> None:
+    """Route the GET requests of a PyGithub requester through a conditional
+    request cache. All other requests are sent as usual.
+    """
+    request_json = requester.requestJson
+
+    def _request_json(
+        verb, url, parameters=None, headers=None, input=None, cnx=None
+    ):
+        if verb != "GET":
+            return request_json(verb, url, parameters, headers, input, cnx)
+
+        def _send(conditional_headers):
+            return request_json(
+                verb, url, parameters, conditional_headers, input, cnx
+            )
+
+        cache_url = (
+            url + "?" + urllib.parse.urlencode(sorted(parameters.items()))
+            if parameters
+            else url
+        )
+        return cache.get(cache_url, headers or {}, _send)
+
+    requester.requestJson = _request_json
+
+
 class GitHubAPI(plug.API):
     """A highly specialized GitHub API class for _repobee. The API is
     affiliated both with an organization, and with the whole GitHub
@@ -140,14 +335,48 @@ class GitHubAPI(plug.API):
                 "getting_started.html#configure-repobee-for-the-target"
                 "-organization-show-config-and-verify-settings"
             )
-        self._github = github.Github(login_or_token=token, base_url=base_url)
+        self._http_cache = httpcache.ConditionalRequestCache(
+            constants.HTTP_CACHE_DIR, scope="{} {}".format(base_url, token)
+        )
+        self._pacer = ratelimit.RequestPacer(
+            max_concurrent_writes=_MAX_CONCURRENCY
+        )
+        self._github = self._create_github(base_url, token)
         self._org_name = org_name
         self._base_url = base_url
+        self._graphql_url = re.sub(r"/v3$", "", base_url) + "/graphql"
+        self._graphql_available = True
+        # the worker threads that send concurrent requests, see _workers
+        self._executor = None
+        # objects that are private to a worker thread, see _thread_org
+        self._thread_local = threading.local()
+        # index of teams by name, which is complete if _all_teams_listed
+        self._teams = {}
+        self._all_teams_listed = False
+        # amount of teams in the organization, if it has been counted
+        self._team_count = None
+        # index of member logins by team id
+        self._team_members = {}
+        # index of repos by lowercase name (repo names are case insensitive),
+        # which is complete if _all_repos_listed
+        self._repos = {}
+        self._all_repos_listed = False
         self._token = token
         self._user = user
         with _try_api_request():
             self._org = self._github.get_organization(self._org_name)
 
+    def _create_github(self, base_url: str, token: str) -> github.Github:
+        """Create a Github instance whose requests are paced and cached."""
+        github_ = github.Github(login_or_token=token, base_url=base_url)
+        github_.per_page = _MAX_PAGE_SIZE
+        # the requester is private to PyGithub, which is therefore pinned to
+        # versions in which it is known to work
+        requester = github_._Github__requester
+        _pace_requests(requester, self._pacer)
+        _cache_conditional_requests(requester, self._http_cache)
+        return github_
+
     def __repr__(self):
         return "GitHubAPI(base_url={}, token={}, org_name={})".format(
             self._base_url, self._token, self._org_name
@@ -161,42 +390,103 @@ class GitHubAPI(plug.API):
     def token(self):
         return self._token
 
-    def _get_teams_in(
-        self, team_names: Iterable[str]
-    ) -> Generator[github.Team.Team, None, None]:
+    def _get_teams_in(self, team_names: Iterable[str]) -> List[_Team]:
         """Get all teams that match any team name in the team_names iterable.
+        Teams are looked up in the team index, which is completed with a
+        single listing of the organization's teams the first time that a
+        team is missing from it. If looking up the missing teams directly by
+        slug takes fewer requests than listing all teams, they are first
+        looked up by slug instead.
 
         Args:
             team_names: An iterable of team names.
         Returns:
-            An iterable of Team namedtuples of all teams that matched any of
+            A list of Team namedtuples of all teams that matched any of
             the team names.
         """
-        team_names = set(team_names)
-        with _try_api_request():
-            yield from (
-                team
-                for team in self.org.get_teams()
-                if team.name in team_names
+        team_names = list(dict.fromkeys(team_names))
+        missing = [name for name in team_names if name not in self._teams]
+        if missing and not self._all_teams_listed:
+            # a single team is never cheaper to list than to look up, so
+            # the teams are then not counted
+            listing_cost = (
+                self._team_listing_cost() if len(missing) > 1 else None
             )
+            if listing_cost is None or listing_cost >= len(missing):
+                for team_name in missing:
+                    self._lookup_team_by_slug(team_name)
+                missing = [name for name in missing if name not in self._teams]
+            if missing:
+                self._list_teams()
+        return [
+            self._teams[team_name]
+            for team_name in team_names
+            if team_name in self._teams
+        ]
+
+    def _list_teams(self) -> List[_Team]:
+        """Return all teams of the organization, which are only listed the
+        first time that this method is called.
+        """
+        if not self._all_teams_listed:
+            with _try_api_request():
+                self._teams = {
+                    team.name: team for team in self._org.get_teams()
+                }
+            self._all_teams_listed = True
+        return list(self._teams.values())
+
+    def _team_listing_cost(self) -> Optional[int]:
+        """Return the amount of requests needed to list all teams of the
+        organization, or None if it's not known. The teams are only counted
+        the first time that this method is called, which takes one request.
+        """
+        if self._team_count is None:
+            try:
+                self._team_count = self._org.get_teams().totalCount
+            except (github.GithubException, AttributeError, TypeError):
+                return None
+        return max(1, math.ceil(self._team_count / _MAX_PAGE_SIZE))
+
+    def _lookup_team_by_slug(self, team_name: str) -> None:
+        """Add a team to the team index if it can be found by slug."""
+        with _try_api_request(ignore_statuses=[404]):
+            team = self._org.get_team_by_slug(_team_slug(team_name))
+            # the slug of a renamed team may belong to another name
+            if team.name == team_name:
+                self._teams[team_name] = team
+
+    def _get_members(self, team: _Team) -> Set[str]:
+        """Return the logins of the members of a team, which are only
+        fetched the first time that they are needed.
+        """
+        if team.id not in self._team_members:
+            with _try_api_request():
+                self._team_members[team.id] = set(
+                    member.login for member in team.get_members()
+                )
+        return self._team_members[team.id]
 
     def get_teams(self) -> List[plug.Team]:
         """See :py:meth:`repobee_plug.API.get_teams`."""
         return [
             plug.Team(
                 name=t.name,
-                members=[m.login for m in t.get_members()],
+                members=sorted(self._get_members(t)),
                 id=t.id,
                 implementation=t,
             )
-            for t in self._org.get_teams()
+            for t in self._list_teams()
         ]
 
     def delete_teams(self, team_names: Iterable[str]) -> None:
         """See :py:meth:`repobee_plug.API.delete_teams`."""
+        team_names = list(team_names)
         deleted = set()  # only for logging
         for team in self._get_teams_in(team_names):
             team.delete()
+            del self._teams[team.name]
+            self._team_members.pop(team.id, None)
             deleted.add(team.name)
             LOGGER.info("Deleted team {}".format(team.name))
 
@@ -271,7 +561,7 @@ class GitHubAPI(plug.API):
             exception.UnexpectedException if anything but a 422 (team already
             exists) is raised when trying to create a team.
         """
-        existing_teams = list(self._org.get_teams())
+        existing_teams = self._list_teams()
         existing_team_names = set(team.name for team in existing_teams)
 
         required_team_names = set(team_names)
@@ -285,6 +575,7 @@ class GitHubAPI(plug.API):
                     team_name, permission=permission
                 )
                 LOGGER.info("Created team {}".format(team_name))
+                self._teams[team_name] = new_team
                 teams.append(new_team)
         return teams
 
@@ -298,7 +589,7 @@ class GitHubAPI(plug.API):
             team: A _Team object to which members should be added.
             members: An iterable of usernames.
         """
-        existing_members = set(member.login for member in team.get_members())
+        existing_members = self._get_members(team)
         missing_members = [
             member for member in members if member not in existing_members
         ]
@@ -328,31 +619,88 @@ class GitHubAPI(plug.API):
             users = self._get_users(members)
             for user in users:
                 team.add_membership(user)
+                if team.id in self._team_members:
+                    self._team_members[team.id].add(user.login)
 
     def create_repos(self, repos: Iterable[plug.Repo]):
-        """See :py:meth:`repobee_plug.API.create_repos`."""
-        repo_urls = []
-        for info in repos:
-            created = False
-            with _try_api_request(ignore_statuses=[422]):
-                kwargs = dict(
-                    description=info.description, private=info.private
-                )
-                if info.team_id:  # using falsy results in an exception
-                    kwargs["team_id"] = info.team_id
-                repo_urls.append(
-                    self._org.create_repo(info.name, **kwargs).html_url
-                )
-                LOGGER.info("Created {}/{}".format(self._org_name, info.name))
-                created = True
+        """See :py:meth:`repobee_plug.API.create_repos`.
 
-            if not created:
-                repo_urls.append(self._org.get_repo(info.name).html_url)
+        The existing repos of the organization are listed first, and only
+        the missing repos are created in up to ``api_max_concurrency`` worker
+        threads (see :py:func:`configure`), which is also the amount of
+        requests that create repos that the request pacer lets be in flight
+        at once.
+        """
+        repos = list(repos)
+        existing_repos = self._list_repos()
+
+        missing_repos = {}
+        for info in repos:
+            if info.name.lower() in existing_repos:
                 LOGGER.info(
                     "{}/{} already exists".format(self._org_name, info.name)
                 )
+            else:
+                missing_repos.setdefault(info.name.lower(), info)
+
+        self._repos.update(
+            zip(
+                missing_repos.keys(),
+                self._workers().map(self._create_repo, missing_repos.values()),
+            )
+        )
+
+        return [
+            self._insert_auth(self._repos[info.name.lower()].html_url)
+            for info in repos
+        ]
+
+    def _create_repo(self, info: plug.Repo) -> _Repo:
+        """Create a repo in the target organization. Executed in a worker
+        thread.
+
+        Returns:
+            the created repo.
+        """
+        org = self._thread_org()
+        with _try_api_request(ignore_statuses=[422]):
+            kwargs = dict(description=info.description, private=info.private)
+            if info.team_id:  # using falsy results in an exception
+                kwargs["team_id"] = info.team_id
+            repo = org.create_repo(info.name, **kwargs)
+            LOGGER.info("Created {}/{}".format(self._org_name, info.name))
+            return repo
+
+        # the repo was created after the existing repos were listed
+        with _try_api_request():
+            repo = org.get_repo(info.name)
+        LOGGER.info("{}/{} already exists".format(self._org_name, info.name))
+        return repo
+
+    def _workers(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Return the worker threads of this instance, which are started the
+        first time they are needed and reused for the lifetime of the
+        instance, such that each worker only sets up its organization (see
+        :py:meth:`_thread_org`) once.
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_MAX_CONCURRENCY
+            )
+        return self._executor
 
-        return [self._insert_auth(url) for url in repo_urls]
+    def _thread_org(self) -> github.Organization.Organization:
+        """Return the target organization, fetched with a Github instance
+        that is private to the calling thread. PyGithub objects share their
+        Github instance's connection, which is not thread safe.
+        """
+        if not hasattr(self._thread_local, "org"):
+            github_ = self._create_github(self._base_url, self._token)
+            with _try_api_request():
+                self._thread_local.org = github_.get_organization(
+                    self._org_name
+                )
+        return self._thread_local.org
 
     def get_repo_urls(
         self,
@@ -407,7 +755,120 @@ class GitHubAPI(plug.API):
         state: plug.IssueState = plug.IssueState.OPEN,
         title_regex: str = "",
     ) -> Generator[Tuple[str, ISSUE_GENERATOR], None, None]:
-        """See :py:meth:`repobee_plug.API.get_issues`."""
+        """See :py:meth:`repobee_plug.API.get_issues`.
+
+        The issues of up to _GRAPHQL_BATCH_SIZE repos are fetched in a single
+        GraphQL query. The REST API is used for repos with more issues than
+        fit in one page, and for all repos if the GraphQL API is unavailable.
+        Either way, pull requests are included like in the REST API, the
+        issues are ordered by creation date with the newest first, and the
+        implementation of each issue is a PyGithub issue.
+        """
+        repo_names = list(repo_names)
+        missing_repos = []
+        for batch in _batches(repo_names, _GRAPHQL_BATCH_SIZE):
+            try:
+                repo_nodes = self._query_repo_issues(batch, state)
+            except _GraphQLError:
+                yield from self._get_issues_with_rest(
+                    batch, state, title_regex
+                )
+                continue
+
+            for repo_name, node in zip(batch, repo_nodes):
+                if node is None:
+                    missing_repos.append(repo_name)
+                elif (
+                    node["issues"]["pageInfo"]["hasNextPage"]
+                    or node["pullRequests"]["pageInfo"]["hasNextPage"]
+                ):
+                    yield from self._get_issues_with_rest(
+                        [repo_name], state, title_regex
+                    )
+                else:
+                    issue_nodes = sorted(
+                        node["issues"]["nodes"]
+                        + node["pullRequests"]["nodes"],
+                        key=lambda issue: (
+                            issue["createdAt"],
+                            issue["number"],
+                        ),
+                        reverse=True,
+                    )
+                    yield node["name"], (
+                        plug.Issue(
+                            title=issue["title"],
+                            body=issue["body"],
+                            number=issue["number"],
+                            created_at=_graphql_created_at(issue),
+                            author=_graphql_author(issue),
+                            implementation=self._lazy_issue(
+                                node["name"], issue
+                            ),
+                        )
+                        for issue in issue_nodes
+                        if re.match(title_regex or "", issue["title"])
+                    )
+
+        if missing_repos:
+            LOGGER.warning(
+                "Can't find repos: {}".format(", ".join(missing_repos))
+            )
+
+    def _query_repo_issues(
+        self, repo_names: List[str], state: plug.IssueState
+    ) -> List[Optional[dict]]:
+        """Fetch the first page of issues of each repo with a GraphQL query.
+
+        Returns:
+            a repository node for each repo name, or None if the repo does
+            not exist.
+        """
+        query, variables = _graphql_query(_GRAPHQL_REPO_ISSUES, repo_names)
+        definitions = "".join(
+            ", ${}: String!".format(alias) for alias in variables
+        )
+        data = self._graphql(
+            "query($owner: String!, $states: [IssueState!], "
+            "$pullRequestStates: [PullRequestState!], "
+            "$order: IssueOrder{}) {{{}}}".format(definitions, query),
+            dict(
+                variables,
+                owner=self._org_name,
+                states=_GRAPHQL_ISSUE_STATE_MAPPING[state],
+                pullRequestStates=_GRAPHQL_PULL_REQUEST_STATE_MAPPING[state],
+                order=_GRAPHQL_ISSUE_ORDER,
+            ),
+        )
+        return [data[alias] for alias in variables]
+
+    def _lazy_issue(self, repo_name: str, node: dict) -> github.Issue.Issue:
+        """Create a PyGithub issue from a GraphQL issue or pull request node.
+        Attributes that are not in the node are fetched with the REST API
+        when they are first accessed.
+        """
+        return github.Issue.Issue(
+            self._github._Github__requester,
+            {},
+            dict(
+                url="{}/repos/{}/{}/issues/{}".format(
+                    self._base_url, self._org_name, repo_name, node["number"]
+                ),
+                number=node["number"],
+                title=node["title"],
+                body=node["body"],
+                created_at=node["createdAt"],
+                user=node["author"],
+            ),
+            completed=False,
+        )
+
+    def _get_issues_with_rest(
+        self,
+        repo_names: Iterable[str],
+        state: plug.IssueState,
+        title_regex: str,
+    ) -> Generator[Tuple[str, ISSUE_GENERATOR], None, None]:
         repos = self._get_repos_by_name(repo_names)
         raw_state = _ISSUE_STATE_MAPPING[state]
 
@@ -476,14 +937,10 @@ class GitHubAPI(plug.API):
         team_to_repos: Mapping[str, Iterable[str]],
         issue: Optional[plug.Issue] = None,
     ) -> None:
-        """See :py:meth:`repobee_plug.API.add_repos_to_review_teams`.
-        """
+        """See :py:meth:`repobee_plug.API.add_repos_to_review_teams`."""
         issue = issue or DEFAULT_REVIEW_ISSUE
         for team, repo in self._add_repos_to_teams(team_to_repos):
-            # TODO team.get_members() api request is a bit redundant, it
-            # can be solved in a more efficient way by passing in the
-            # allocations
-            reviewers = team.get_members()
+            reviewers = sorted(self._get_members(team))
             created_issue = repo.create_issue(
                 issue.title, body=issue.body, assignees=reviewers
             )
@@ -499,35 +956,68 @@ class GitHubAPI(plug.API):
         teams: Iterable[plug.Team],
         title_regex: str,
     ) -> Mapping[str, List[plug.Review]]:
-        """See :py:meth:`repobee_plug.API.get_review_progress`."""
+        """See :py:meth:`repobee_plug.API.get_review_progress`.
+
+        The members, repos and issues of up to _GRAPHQL_BATCH_SIZE review
+        teams are fetched in a single GraphQL query. The REST API is used
+        for teams with more members or issues than fit in one page, and for
+        all teams if the GraphQL API is unavailable.
+        """
         reviews = collections.defaultdict(list)
         review_team_impls = self._get_teams_in(review_team_names)
-        for review_team_impl in review_team_impls:
+        for review_team_impl, team_node in self._query_review_teams(
+            review_team_impls
+        ):
             with _try_api_request():
                 LOGGER.info("Processing {}".format(review_team_impl.name))
-                reviewers = set(
-                    m.login for m in review_team_impl.get_members()
-                )
+                if team_node:
+                    reviewers = set(
+                        m["login"] for m in team_node["members"]["nodes"]
+                    )
+                    self._team_members[review_team_impl.id] = reviewers
+                    repos = [
+                        (
+                            repo["name"],
+                            (
+                                (issue["title"], _graphql_author(issue))
+                                for issue in repo["issues"]["nodes"]
+                            ),
+                        )
+                        for repo in team_node["repositories"]["nodes"]
+                    ]
+                    repo_count = team_node["repositories"]["totalCount"]
+                else:
+                    reviewers = self._get_members(review_team_impl)
+                    repos = [
+                        (
+                            repo.name,
+                            (
+                                (issue.title, issue.user.login)
+                                for issue in repo.get_issues()
+                            ),
+                        )
+                        for repo in review_team_impl.get_repos()
+                    ]
+                    repo_count = len(repos)
                 review_teams = self._extract_review_teams(teams, reviewers)
-                repos = list(review_team_impl.get_repos())
-                if len(repos) != 1:
+                if repo_count != 1:
                     LOGGER.warning(
                         "Expected {} to have 1 associated repo, found {}."
-                        "Skipping...".format(review_team_impl.name, len(repos))
+                        "Skipping...".format(review_team_impl.name, repo_count)
                     )
                     continue
 
-                repo = repos[0]
+                repo_name, repo_issues = repos[0]
                 review_issue_authors = {
-                    issue.user.login
-                    for issue in repo.get_issues()
-                    if re.match(title_regex, issue.title)
+                    author
+                    for title, author in repo_issues
+                    if re.match(title_regex, title)
                 }
 
                 for team in review_teams:
                     reviews[str(team)].append(
                         plug.Review(
-                            repo=repo.name,
+                            repo=repo_name,
                             done=any(
                                 map(
                                     review_issue_authors.__contains__,
@@ -539,6 +1029,123 @@ class GitHubAPI(plug.API):
 
         return reviews
 
+    def _query_review_teams(
+        self, review_team_impls: List[_Team]
+    ) -> Generator[Tuple[_Team, Optional[dict]], None, None]:
+        """Fetch the members, repos and open issues of review teams with
+        GraphQL queries.
+
+        Returns:
+            a generator of (team, team node) tuples, where the team node is
+            None if the team must instead be processed with the REST API.
+        """
+        for batch in _batches(review_team_impls, _GRAPHQL_BATCH_SIZE):
+            try:
+                query, variables = _graphql_query(
+                    _GRAPHQL_REVIEW_TEAM,
+                    [team.slug for team in batch],
+                    outer="organization(login: $org) {{{}}}",
+                )
+                definitions = "".join(
+                    ", ${}: String!".format(alias) for alias in variables
+                )
+                data = self._graphql(
+                    "query($org: String!{}) {{{}}}".format(definitions, query),
+                    dict(variables, org=self._org_name),
+                )
+                team_nodes = [
+                    data["organization"][alias] for alias in variables
+                ]
+            except (_GraphQLError, KeyError, TypeError):
+                team_nodes = [None] * len(batch)
+
+            for team, node in zip(batch, team_nodes):
+                truncated = node and (
+                    node["members"]["pageInfo"]["hasNextPage"]
+                    or any(
+                        repo["issues"]["pageInfo"]["hasNextPage"]
+                        for repo in node["repositories"]["nodes"]
+                    )
+                )
+                yield team, None if truncated else node
+
+    def _graphql(self, query: str, variables: Mapping[str, object]) -> dict:
+        """Send a GraphQL query. Errors of type NOT_FOUND are ignored, as the
+        fields that they refer to are null.
+
+        Returns:
+            the data of the response.
+        Raises:
+            _GraphQLError if the GraphQL API is unavailable, or the query
+            can't be answered due to the schema of the GraphQL API or a lack
+            of permissions, in which case the GraphQL API is not used again
+            by this instance. Also raised if the query fails with a server
+            error or times out, in which case only this query should use the
+            REST API instead.
+            exception.APIError if the query fails for any other reason.
+        """
+        if not self._graphql_available:
+            raise _GraphQLError("the GraphQL API is unavailable")
+        requester = self._github._Github__requester
+        try:
+            with _try_api_request():
+                _, response = requester.requestJsonAndCheck(
+                    "POST",
+                    self._graphql_url,
+                    input=dict(query=query, variables=variables),
+                )
+        except exception.APIError as exc:
+            if exc.status in _GRAPHQL_UNAVAILABLE_STATUSES:
+                raise self._disable_graphql(str(exc)) from exc
+            if (exc.status or 0) >= 500 or isinstance(
+                exc.__context__, _GRAPHQL_TRANSIENT_ERRORS
+            ):
+                LOGGER.warning(
+                    "GraphQL query failed, using the REST API for it "
+                    "instead: {}".format(exc)
+                )
+                raise _GraphQLError(str(exc)) from exc
+            raise
+
+        errors = [
+            error
+            for error in response.get("errors") or []
+            if error.get("type") != "NOT_FOUND"
+        ]
+        data = response.get("data")
+        # errors without a type are validation errors, i.e. the query does
+        # not match the schema
+        if any(
+            error.get("type") in _GRAPHQL_PERMISSION_ERRORS
+            or not error.get("type")
+            for error in errors
+        ) or not isinstance(data, dict):
+            raise self._disable_graphql(
+                "; ".join(error.get("message", "") for error in errors)
+                or "malformed response"
+            )
+        if errors:
+            raise exception.APIError(
+                "GraphQL query failed: {}".format(
+                    "; ".join(error.get("message", "") for error in errors)
+                )
+            )
+        return data
+
+    def _disable_graphql(self, reason: str) -> _GraphQLError:
+        """Stop using the GraphQL API for this instance.
+
+        Returns:
+            an error to raise to make the caller use the REST API instead.
+        """
+        self._graphql_available = False
+        LOGGER.warning(
+            "GraphQL query failed, using the REST API instead: {}".format(
+                reason
+            )
+        )
+        return _GraphQLError(reason)
+
     def _extract_review_teams(self, teams, reviewers):
         review_teams = []
         for team in teams:
@@ -560,15 +1167,18 @@ class GitHubAPI(plug.API):
         Returns:
             a generator yielding each (team, repo) tuple in turn.
         """
-        team_names = set(team_to_repos.keys())
-        with _try_api_request():
-            teams = (
-                team
-                for team in self._org.get_teams()
-                if team.name in team_names
+        repos_by_name = {
+            repo.name: repo
+            for repo in self._get_repos_by_name(
+                itertools.chain.from_iterable(team_to_repos.values())
             )
-        for team in teams:
-            repos = self._get_repos_by_name(team_to_repos[team.name])
+        }
+        for team in self._get_teams_in(team_to_repos.keys()):
+            repos = [
+                repos_by_name[repo_name]
+                for repo_name in team_to_repos[team.name]
+                if repo_name in repos_by_name
+            ]
             for repo in repos:
                 LOGGER.info(
                     "Adding team {} to repo {} with '{}' permission".format(
@@ -585,25 +1195,68 @@ class GitHubAPI(plug.API):
         """Get all repos that match any of the names in repo_names. Unmatched
         names are ignored (in both directions).
 
+        Repos are looked up in the repo index, and like on GitHub, names
+        are case insensitive. Repos that are missing from it are fetched one
+        by one if that takes fewer requests than listing all repos of the
+        organization, and otherwise the index is completed with a listing.
+
         Args:
             repo_names: Names of repos to fetch.
 
         Returns:
             a generator of repo objects.
         """
-        repos = set()
-        for name in repo_names:
-            with _try_api_request(ignore_statuses=[404]):
-                repo = self._org.get_repo(name)
-                yield repo
-                repos.add(repo.name)
-
-        missing_repos = set(repo_names) - repos
+        repo_names = {name.lower(): name for name in repo_names}
+        missing = [key for key in repo_names if key not in self._repos]
+        if missing and not self._all_repos_listed:
+            listing_cost = self._repo_listing_cost()
+            if listing_cost is not None and listing_cost < len(missing):
+                self._list_repos()
+            else:
+                for key in missing:
+                    with _try_api_request(ignore_statuses=[404]):
+                        repo = self._org.get_repo(repo_names[key])
+                        self._repos[key] = repo
+
+        missing_repos = []
+        for key, name in repo_names.items():
+            if key in self._repos:
+                yield self._repos[key]
+            else:
+                missing_repos.append(name)
+
         if missing_repos:
             LOGGER.warning(
                 "Can't find repos: {}".format(", ".join(missing_repos))
             )
 
+    def _list_repos(self) -> Mapping[str, _Repo]:
+        """Return all repos of the organization by lowercase name, which are
+        only listed the first time that this method is called. The listed
+        repos are merged into the repo index, such that repos that were
+        fetched or created concurrently with the listing are kept.
+        """
+        if not self._all_repos_listed:
+            with _try_api_request():
+                self._repos.update(
+                    (repo.name.lower(), repo) for repo in self._org.get_repos()
+                )
+            self._all_repos_listed = True
+        return self._repos
+
+    def _repo_listing_cost(self) -> Optional[int]:
+        """Return the amount of requests needed to list all repos of the
+        organization, or None if it's not known.
+        """
+        try:
+            repo_count = int(self._org.public_repos) + int(
+                self._org.total_private_repos
+            )
+        except (TypeError, ValueError):
+            # the private repo count is only visible to members
+            return None
+        return max(1, math.ceil(repo_count / _MAX_PAGE_SIZE))
+
     def discover_repos(
         self, teams: Iterable[plug.Team]
     ) -> Generator[plug.Repo, None, None]:
@@ -718,6 +1371,24 @@ class GitHubAPI(plug.API):
 
 
 class DefaultAPIHooks(plug.Plugin):
+    def config_hook(self, config_parser: configparser.ConfigParser) -> None:
+        """Configure the maximum amount of concurrent API requests.
+
+        Args:
+            config_parser: the config parser after config has been read.
+        """
+        value = config_parser.get(
+            constants.DEFAULTS_SECTION_HDR,
+            "api_max_concurrency",
+            fallback=str(DEFAULT_MAX_CONCURRENCY),
+        )
+        if not value.isdigit() or int(value) < 1:
+            raise exception.FileError(
+                "config file has an invalid value for api_max_concurrency: "
+                "expected a positive integer, got '{}'".format(value)
+            )
+        configure(max_concurrency=int(value))
+
     def api_init_requires(self):
         return ("base_url", "token", "org_name", "user")
 
@@ -20,11 +20,13 @@ from typing import List, Iterable, Optional, Generator, Tuple, Mapping
 
 import daiquiri
 import gitlab
+import requests
 import requests.exceptions
 
 import repobee_plug as plug
 
 from _repobee import exception
+from _repobee import ratelimit
 from _repobee.ext.defaults.github import DEFAULT_REVIEW_ISSUE
 
 LOGGER = daiquiri.getLogger(__file__)
@@ -99,6 +101,26 @@ def _try_api_request(ignore_statuses: Optional[Iterable[int]] = None):
         ) from e
 
 
+def _pace_requests(
+    session: requests.Session, pacer: ratelimit.RequestPacer
+) -> None:
+    """Send all requests of a requests session through a request pacer."""
+    send = session.send
+
+    def _send(request, **kwargs):
+        return pacer.send(
+            request.method,
+            lambda: send(request, **kwargs),
+            lambda response: (
+                response.status_code,
+                response.headers,
+                response.text if response.status_code in (403, 429) else "",
+            ),
+        )
+
+    session.send = _send
+
+
 class GitLabAPI(plug.API):
     _User = collections.namedtuple("_User", ("id", "login"))
 
@@ -108,6 +130,7 @@ class GitLabAPI(plug.API):
         self._gitlab = gitlab.Gitlab(
             base_url, private_token=token, ssl_verify=self._ssl_verify()
         )
+        _pace_requests(self._gitlab.session, ratelimit.RequestPacer())
         self._group_name = org_name
         self._token = token
         self._base_url = base_url
@@ -15,6 +15,7 @@ import daiquiri
 import repobee_plug as plug
 
 from _repobee import formatters
+from _repobee import hookresults
 
 LOGGER = daiquiri.getLogger(__file__)
 
@@ -24,8 +25,14 @@ def callback(args: argparse.Namespace, api: plug.API) -> None:
     if not hook_results_file.exists():
         raise plug.PlugError("no such file: {}".format(str(hook_results_file)))
 
-    contents = hook_results_file.read_text(encoding=sys.getdefaultencoding())
-    hook_results_mapping = plug.json_to_result_mapping(contents)
+    if hook_results_file.suffix == ".jsonl":
+        # records left behind by a command that did not finish
+        hook_results_mapping = hookresults.read_records(hook_results_file)
+    else:
+        contents = hook_results_file.read_text(
+            encoding=sys.getdefaultencoding()
+        )
+        hook_results_mapping = plug.json_to_result_mapping(contents)
     selected_hook_results = _filter_hook_results(
         hook_results_mapping, args.students, args.master_repo_names
     )
@@ -6,32 +6,642 @@
 .. moduleauthor:: Simon Larsén
 """
 import asyncio
+import contextlib
+import enum
+import fcntl
+import hashlib
+import json
 import os
+import random
+import re
+import shutil
+import signal
 import subprocess
+import sys
+import time
 import collections
 import pathlib
 import daiquiri
-from typing import Iterable, List, Any, Callable
+from typing import (
+    Iterable,
+    List,
+    Any,
+    Callable,
+    Awaitable,
+    Tuple,
+    TypeVar,
+    Optional,
+    Mapping,
+    Iterator,
+    Dict,
+)
 
 from _repobee import exception
 from _repobee import util
+from _repobee import constants
 
 CONCURRENT_TASKS = 20
+MIN_CONCURRENT_TASKS = 1
+# the concurrency is only raised above the default if the user configures a
+# higher maximum, as hosting platforms may not tolerate more connections
+MAX_CONCURRENT_TASKS = CONCURRENT_TASKS
+# in megabytes
+DEFAULT_MIRROR_CACHE_SIZE = 5 * 1024
+DEFAULT_PUSH_TRIES = 3
+# in seconds
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+DEFAULT_TIMEOUT = 600
+TERMINATE_GRACE_PERIOD = 5.0
+# in seconds, how often to check if a lock held by another process is free
+_LOCK_POLL_INTERVAL = 0.1
+
+T = TypeVar("T")
 
 LOGGER = daiquiri.getLogger(__file__)
 
 Push = collections.namedtuple("Push", ("local_path", "repo_url", "branch"))
+Pull = collections.namedtuple("Pull", ("local_path", "repo_url", "branch"))
+
+
+class _FailureKind(enum.Enum):
+    """Kinds of failed git operations, as classified from git's stderr."""
+
+    # the remote branch has diverged, which is expected when students have
+    # pushed and says nothing about the state of the remote host
+    NON_FAST_FORWARD = "non-fast-forward"
+    # the remote host is throttling us
+    RATE_LIMIT = "rate-limit"
+    # the credentials are missing, invalid or lack the required permissions
+    AUTH = "auth"
+    # the remote host is overloaded or the connection failed
+    NETWORK = "network"
+    UNKNOWN = "unknown"
+
+
+# patterns in stderr output from git that identify failure kinds, in order of
+# precedence
+_FAILURE_PATTERNS = (
+    (
+        _FailureKind.NON_FAST_FORWARD,
+        re.compile(rb"\[rejected\]|non-fast-forward|fetch first"),
+    ),
+    (
+        _FailureKind.RATE_LIMIT,
+        re.compile(rb"\b429\b|too many requests|rate limit", re.IGNORECASE),
+    ),
+    (
+        _FailureKind.AUTH,
+        re.compile(
+            rb"\b(401|403)\b|authentication failed|access denied|"
+            rb"permission denied|could not read (username|password)|"
+            rb"invalid (username|credentials)|terminal prompts disabled",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        _FailureKind.NETWORK,
+        re.compile(
+            rb"error: 5\d\d|\b(500|502|503|504)\b|service unavailable|"
+            rb"timed out|connection reset|connection refused|"
+            rb"could not resolve host|failed to connect|"
+            rb"remote end hung up unexpectedly|early eof",
+            re.IGNORECASE,
+        ),
+    ),
+)
+# failures that retrying can't fix
+_PERMANENT_FAILURES = (_FailureKind.NON_FAST_FORWARD, _FailureKind.AUTH)
+
+# amount of bytes to read at a time from streamed output, and the maximum
+# amount of bytes to keep from the end of streamed stderr
+_STREAM_CHUNK_SIZE = 4096
+_MAX_STDERR_SIZE = 64 * 1024
+
+# progress output that git writes to stderr when run with --progress, which
+# is only used to tell that git is still making progress
+_PROGRESS_PATTERN = re.compile(
+    rb"(?:^|(?<=\r))(?:remote: )?"
+    rb"(?:(?:Enumerating|Counting|Compressing|Writing|Receiving|Resolving|"
+    rb"Unpacking) (?:objects|deltas)|Checking connectivity|Updating files|"
+    rb"Total \d+)[^\r\n]*(?:\r\n?|\n)",
+    re.M,
+)
+
+# trace2 events that git writes to stderr when GIT_TRACE2_EVENT=2, which
+# are used to time the generation of the packs that are sent by pushes
+_TRACE2_EVENT_PATTERN = re.compile(rb'^(remote: )?\{"event":.*$\n?', re.M)
+# names of the files and directories in which git stores loose objects
+_LOOSE_OBJECT_DIR_PATTERN = re.compile(r"^[0-9a-f]{2}$")
+_LOOSE_OBJECT_FILE_PATTERN = re.compile(r"^[0-9a-f]{38}([0-9a-f]{24})?$")
+
+# the pack-objects regions that make up pack generation, i.e. everything
+# except for writing the pack
+_PACK_GENERATION_REGIONS = ("enumerate-objects", "prepare-pack")
+
+
+class ConcurrencyController:
+    """Controller for the amount of git operations that are allowed to run
+    concurrently. The limit is adjusted at runtime with
+    additive-increase/multiplicative-decrease (AIMD):
+
+    * After ``limit`` consecutive operations have succeeded without latency
+      degrading, the limit is increased by one.
+    * When the remote host rejects an operation (e.g. HTTP 429/5xx or a
+      dropped connection), or when more than half of the operations in a
+      window of ``limit`` operations have failed, the limit is halved. After
+      a decrease, the next ``limit`` operations can't cause another decrease,
+      as they were likely in flight when the congestion occurred.
+
+    The controller only keeps numeric state, so the same instance can be used
+    across event loops, and what it learns in one call to e.g.
+    :py:func:`push` carries over to the next one.
+    """
+
+    # latency is considered degraded when the moving average exceeds the best
+    # moving average seen so far by this factor
+    LATENCY_DEGRADATION_FACTOR = 2.0
+    # smoothing factor for the exponentially weighted moving average latency
+    LATENCY_SMOOTHING = 0.2
+    MAX_ERROR_RATE = 0.5
+
+    def __init__(
+        self,
+        min_limit: int = MIN_CONCURRENT_TASKS,
+        max_limit: int = MAX_CONCURRENT_TASKS,
+        initial_limit: int = CONCURRENT_TASKS,
+    ):
+        if min_limit < 1:
+            raise ValueError("minimum concurrency must be larger than 0")
+        if min_limit > max_limit:
+            raise ValueError(
+                "minimum concurrency ({}) must not be larger than maximum "
+                "concurrency ({})".format(min_limit, max_limit)
+            )
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(max_limit, initial_limit))
+        self._avg_latency = None
+        self._best_avg_latency = None
+        self._consecutive_successes = 0
+        self._window_total = 0
+        self._window_failures = 0
+        self._cooldown = 0
+
+    def record_success(self, latency: float) -> None:
+        """Record that an operation succeeded.
+
+        Args:
+            latency: The time in seconds that the operation took.
+        """
+        self._record(failed=False, latency=latency)
+        self._consecutive_successes += 1
+        if self._latency_degraded():
+            self._consecutive_successes = 0
+        elif self._consecutive_successes >= self.limit:
+            self._set_limit(self.limit + 1)
+
+    def record_failure(self, exc: Exception, latency: float) -> None:
+        """Record that an operation failed.
+
+        Args:
+            exc: The exception that the operation raised.
+            latency: The time in seconds that the operation took.
+        """
+        self._consecutive_successes = 0
+        kind = _classify_failure(exc)
+        if kind == _FailureKind.NON_FAST_FORWARD:
+            self._record(failed=False, latency=latency)
+        elif kind in (_FailureKind.RATE_LIMIT, _FailureKind.NETWORK):
+            # the latency of a rejected operation is not representative
+            self._record(failed=True, latency=None)
+            self._decrease()
+        else:
+            self._record(failed=True, latency=latency)
+
+    def _record(self, failed: bool, latency: Optional[float]) -> None:
+        self._cooldown = max(0, self._cooldown - 1)
+        if latency is not None:
+            self._update_latency(latency)
+
+        self._window_total += 1
+        self._window_failures += int(failed)
+        if self._window_total >= self.limit:
+            error_rate = self._window_failures / self._window_total
+            self._window_total = self._window_failures = 0
+            if error_rate > self.MAX_ERROR_RATE:
+                self._decrease()
+
+    def _update_latency(self, latency: float) -> None:
+        if self._avg_latency is None:
+            self._avg_latency = latency
+        else:
+            self._avg_latency += self.LATENCY_SMOOTHING * (
+                latency - self._avg_latency
+            )
+        if (
+            self._best_avg_latency is None
+            or self._avg_latency < self._best_avg_latency
+        ):
+            self._best_avg_latency = self._avg_latency
+
+    def _latency_degraded(self) -> bool:
+        return (
+            self._best_avg_latency is not None
+            and self._avg_latency
+            > self.LATENCY_DEGRADATION_FACTOR * self._best_avg_latency
+        )
+
+    def _decrease(self) -> None:
+        if self._cooldown:
+            return
+        self._cooldown = self.limit
+        self._set_limit(self.limit // 2)
+
+    def _set_limit(self, limit: int) -> None:
+        limit = max(self.min_limit, min(self.max_limit, limit))
+        self._consecutive_successes = 0
+        if limit == self.limit:
+            return
+
+        if limit < self.limit:
+            LOGGER.info("Decreasing git concurrency to {}".format(limit))
+        else:
+            LOGGER.info("Increasing git concurrency to {}".format(limit))
+        self.limit = limit
+
+
+_CONCURRENCY = ConcurrencyController()
+
+
+class MirrorCache:
+    """A persistent on-disk cache of bare mirrors of remote repositories,
+    keyed by remote URL. Clones can borrow objects from a mirror (see the
+    ``reference`` argument of :py:func:`clone_single` and the
+    ``references`` argument of :py:func:`clone`) such that only objects that
+    are missing from the mirror need to be fetched over the network.
+
+    Remote URLs are never written to the mirrors (fetches are done directly
+    from the URL), as they may contain secure tokens.
+
+    Each mirror has two lock files. Using a mirror requires a shared use
+    lock, and evicting it requires an exclusive use lock, so a mirror is never
+    evicted while in use. Creating or updating a mirror also requires an
+    exclusive update lock, which does not block other processes from using
+    it. It is therefore safe for several RepoBee processes to use the cache
+    concurrently. When the total size of the cache exceeds the maximum size,
+    the least recently used mirrors that are not in use are evicted.
+    """
+
+    USE_LOCK_SUFFIX = ".lock"
+    UPDATE_LOCK_SUFFIX = ".update-lock"
+    MIRROR_SUFFIX = ".git"
+
+    def __init__(self, root: pathlib.Path, max_size: int):
+        """
+        Args:
+            root: Directory to put the cache in.
+            max_size: Maximum size of the cache in megabytes.
+        """
+        self.root = root
+        self.max_size = max_size
+
+    @contextlib.contextmanager
+    def mirrors(
+        self, urls: Iterable[str]
+    ) -> Iterator[Mapping[str, pathlib.Path]]:
+        """Create or update mirrors of the given remote repositories, and
+        keep them locked for use until the context is exited. The mirrors are
+        fetched concurrently, like any other git operation. Local
+        repositories are not mirrored, and neither are repositories that
+        can't be fetched.
+
+        Args:
+            urls: URLs to remote repositories.
+        Returns:
+            A context manager that yields a mapping from remote URL to path to
+            its mirror.
+        """
+        urls = [url for url in dict.fromkeys(urls) if not _is_local_url(url)]
+        with contextlib.ExitStack() as stack:
+            for url in urls:
+                stack.enter_context(
+                    self._lock(
+                        self._mirror_path(url),
+                        self.USE_LOCK_SUFFIX,
+                        exclusive=False,
+                    )
+                )
+            updated = {}
+            for exc in _run_async(
+                _execute_pool(self._update_mirror, urls, updated=updated)
+            ):
+                LOGGER.warning(str(exc))
+            yield {url: updated[url] for url in urls if url in updated}
+        self.evict()
 
+    @contextlib.contextmanager
+    def cached_mirrors(
+        self, urls: Iterable[str]
+    ) -> Iterator[Mapping[str, pathlib.Path]]:
+        """Lock the mirrors of the given remote repositories that are already
+        in the cache for use until the context is exited, without creating
+        or updating them.
 
-def _ensure_repo_dir_exists(repo_url: str, cwd: str) -> pathlib.Path:
+        Args:
+            urls: URLs to remote repositories.
+        Returns:
+            A context manager that yields a mapping from remote URL to path to
+            its mirror, for each URL that has a mirror.
+        """
+        urls = [url for url in dict.fromkeys(urls) if not _is_local_url(url)]
+        with contextlib.ExitStack() as stack:
+            mirrors = {}
+            for url in urls:
+                path = self._mirror_path(url)
+                if not path.is_dir():
+                    continue
+                stack.enter_context(
+                    self._lock(path, self.USE_LOCK_SUFFIX, exclusive=False)
+                )
+                # the mirror may have been evicted while waiting for the lock
+                if path.is_dir():
+                    mirrors[url] = path
+            yield mirrors
+
+    def evict(self) -> None:
+        """Evict the least recently used mirrors that are not in use until
+        the size of the cache is within the limit. The lock files of evicted
+        mirrors are removed along with them.
+        """
+        mirrors = self._mirrors_by_last_use()
+        sizes = {path: _dir_size(path) for path in mirrors}
+        total = sum(sizes.values())
+        max_bytes = self.max_size * 1024 * 1024
+
+        for path in mirrors:
+            if total <= max_bytes:
+                break
+            with self._lock(
+                path, self.USE_LOCK_SUFFIX, exclusive=True, blocking=False
+            ) as locked:
+                if not locked:
+                    continue
+                LOGGER.info(
+                    "Evicting {} from the mirror cache".format(path.name)
+                )
+                shutil.rmtree(str(path), ignore_errors=True)
+                self._remove_lock_files(path)
+                total -= sizes[path]
+
+        self._remove_orphaned_lock_files()
+
+    async def _update_mirror(
+        self, url: str, updated: Dict[str, pathlib.Path]
+    ) -> None:
+        """Create or update the mirror of url, and add it to updated when
+        done. The caller must hold the use lock of the mirror.
+        """
+        path = self._mirror_path(url)
+        while True:
+            with self._lock(
+                path, self.UPDATE_LOCK_SUFFIX, exclusive=True, blocking=False
+            ) as locked:
+                if locked:
+                    await self._fetch_mirror(url, path)
+                    updated[url] = path
+                    return
+            # another process is updating the mirror
+            await asyncio.sleep(_LOCK_POLL_INTERVAL)
+
+    async def _fetch_mirror(self, url: str, path: pathlib.Path) -> None:
+        if not path.is_dir():
+            path.mkdir(parents=True)
+            await _run_streamed(["git", "init", "--bare", "-q"], cwd=str(path))
+
+        LOGGER.info("Updating mirror of {}".format(util.repo_name(url)))
+        rc, stderr = await _run_streamed(
+            [
+                "git",
+                "fetch",
+                "--prune",
+                "--progress",
+                url,
+                "+refs/heads/*:refs/heads/*",
+                "+refs/tags/*:refs/tags/*",
+            ],
+            cwd=str(path),
+        )
+        if rc != 0:
+            raise exception.GitError(
+                "Failed to update mirror of {}".format(util.repo_name(url)),
+                rc,
+                stderr,
+            )
+
+        # the modification time of the mirror directory marks its last use
+        os.utime(str(path))
+
+    def _remove_lock_files(self, path: pathlib.Path) -> None:
+        """Remove the lock files of the mirror at path. The caller must hold
+        the exclusive use lock, such that nobody holds the update lock.
+        """
+        for suffix in (self.UPDATE_LOCK_SUFFIX, self.USE_LOCK_SUFFIX):
+            with contextlib.suppress(FileNotFoundError):
+                path.with_name(path.name + suffix).unlink()
+
+    def _remove_orphaned_lock_files(self) -> None:
+        """Remove lock files of mirrors that don't exist and are not about to
+        be created.
+        """
+        for lock_path in self.root.glob(
+            "*" + self.MIRROR_SUFFIX + self.USE_LOCK_SUFFIX
+        ):
+            path = lock_path.with_name(
+                lock_path.name[: -len(self.USE_LOCK_SUFFIX)]
+            )
+            if path.exists():
+                continue
+            with self._lock(
+                path, self.USE_LOCK_SUFFIX, exclusive=True, blocking=False
+            ) as locked:
+                if locked and not path.exists():
+                    self._remove_lock_files(path)
+
+    def _mirror_path(self, url: str) -> pathlib.Path:
+        key = hashlib.sha256(
+            _strip_credentials(url).encode("utf8")
+        ).hexdigest()[:16]
+        return self.root / "{}-{}{}".format(
+            util.repo_name(url), key, self.MIRROR_SUFFIX
+        )
+
+    def _mirrors_by_last_use(self) -> List[pathlib.Path]:
+        if not self.root.is_dir():
+            return []
+        mirrors = [
+            path
+            for path in self.root.glob("*" + self.MIRROR_SUFFIX)
+            if path.is_dir()
+        ]
+        return sorted(mirrors, key=lambda path: path.stat().st_mtime)
+
+    @contextlib.contextmanager
+    def _lock(
+        self,
+        path: pathlib.Path,
+        suffix: str,
+        exclusive: bool,
+        blocking: bool = True,
+    ) -> Iterator[bool]:
+        """Lock the lock file with the given suffix for the mirror at path.
+        Yields True if the lock was acquired, which is always the case if
+        blocking is True.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        lock_path = path.with_name(path.name + suffix)
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+
+        while True:
+            lock_file = open(str(lock_path), "a")
+            try:
+                fcntl.flock(lock_file, operation)
+            except BlockingIOError:
+                lock_file.close()
+                yield False
+                return
+            if util.is_same_file(lock_file, lock_path):
+                break
+            # the lock file was removed by an eviction while waiting for it,
+            # so the lock must be taken on a new lock file
+            lock_file.close()
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+
+def _is_shallow(repo_path: str) -> bool:
+    return (pathlib.Path(repo_path) / ".git" / "shallow").exists()
+
+
+def _is_local_url(url: str) -> bool:
+    return url.startswith("file://")
+
+
+def _strip_credentials(url: str) -> str:
+    return re.sub("://.*?@", "://", url)
+
+
+def _dir_size(path: pathlib.Path) -> int:
+    return sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, _, filenames in os.walk(str(path))
+        for filename in filenames
+    )
+
+
+_MIRROR_CACHE = MirrorCache(
+    constants.MIRROR_CACHE_DIR, DEFAULT_MIRROR_CACHE_SIZE
+)
+_PUSH_TRIES = DEFAULT_PUSH_TRIES
+_TIMEOUT = DEFAULT_TIMEOUT
+
+
+def mirror_cache() -> MirrorCache:
+    """Return the mirror cache, as configured by :py:func:`configure`."""
+    return _MIRROR_CACHE
+
+
+def configure(
+    min_concurrency: int = MIN_CONCURRENT_TASKS,
+    max_concurrency: int = MAX_CONCURRENT_TASKS,
+    mirror_cache_size: int = DEFAULT_MIRROR_CACHE_SIZE,
+    push_tries: int = DEFAULT_PUSH_TRIES,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> None:
+    """Configure how git operations are executed. Typically called with the
+    git settings from the config file.
+
+    Args:
+        min_concurrency: The minimum amount of concurrent git operations.
+        max_concurrency: The maximum amount of concurrent git operations. The
+            actual amount of concurrent operations is adjusted at runtime
+            within these limits, see :py:class:`ConcurrencyController`.
+        mirror_cache_size: Maximum size of the :py:class:`MirrorCache` in
+            megabytes.
+        push_tries: The default amount of times to try each push, see
+            :py:func:`push`.
+        timeout: The maximum amount of seconds that a single asynchronous git
+            operation may run without making any progress before it is
+            terminated and counted as failed. If 0, git operations never time
+            out.
+    """
+    global _CONCURRENCY, _MIRROR_CACHE, _PUSH_TRIES, _TIMEOUT
+    if push_tries < 1:
+        raise ValueError("push_tries must be larger than 0")
+    if timeout < 0:
+        raise ValueError("timeout must not be negative")
+    _CONCURRENCY = ConcurrencyController(
+        min_limit=min_concurrency, max_limit=max_concurrency
+    )
+    _MIRROR_CACHE = MirrorCache(constants.MIRROR_CACHE_DIR, mirror_cache_size)
+    _PUSH_TRIES = push_tries
+    _TIMEOUT = timeout
+    LOGGER.debug(
+        "Git concurrency limits set to [{}, {}]".format(
+            min_concurrency, max_concurrency
+        )
+    )
+
+
+def _classify_failure(exc: Exception) -> _FailureKind:
+    """Classify a failed git operation by the stderr output from git."""
+    if isinstance(exc, exception.GitError):
+        for kind, pattern in _FAILURE_PATTERNS:
+            if pattern.search(exc.stderr):
+                return kind
+    return _FailureKind.UNKNOWN
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """Check if a failed git operation may succeed if retried. Only errors
+    from git itself are retried.
+    """
+    return (
+        isinstance(exc, exception.GitError)
+        and _classify_failure(exc) not in _PERMANENT_FAILURES
+    )
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Return how long to wait before retrying an operation after the given
+    attempt failed, with exponential backoff and full jitter.
+    """
+    return random.uniform(
+        0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    )
+
+
+def _ensure_repo_dir_exists(
+    repo_url: str, cwd: str, reference: Optional[pathlib.Path] = None
+) -> pathlib.Path:
     """Checks if a dir for the repo url exists, and if it does not, creates it.
     Also initializez (or reinitializes, if it alrady exists) as a git repo.
+    If a reference repository is given, it is added as an alternate object
+    store of the repo.
     """
     repo_name = util.repo_name(repo_url)
     dirpath = pathlib.Path(cwd) / repo_name
     if not dirpath.exists():
         dirpath.mkdir()
     _git_init(dirpath)
+    if reference:
+        _add_alternate(dirpath, reference)
     return dirpath
 
 
@@ -39,11 +649,112 @@ def _git_init(dirpath):
     captured_run(["git", "init"], cwd=str(dirpath))
 
 
-def _pull_clone(repo_url: str, branch: str = "", cwd: str = "."):
+async def _ensure_repo_dir_exists_async(
+    repo_url: str, cwd: str, reference: Optional[pathlib.Path] = None
+) -> pathlib.Path:
+    """Same as :py:func:`_ensure_repo_dir_exists`, but asynchronously."""
+    dirpath = pathlib.Path(cwd) / util.repo_name(repo_url)
+    await _git_init_async(dirpath)
+    if reference:
+        _add_alternate(dirpath, reference)
+    return dirpath
+
+
+async def _git_init_async(dirpath: pathlib.Path) -> None:
+    """Initialize (or reinitialize) a git repo at dirpath. git creates the
+    directory if it does not exist.
+    """
+    await _run_streamed(["git", "init", "-q", str(dirpath)])
+
+
+def _add_alternate(dirpath: pathlib.Path, reference: pathlib.Path) -> None:
+    """Let the repo at dirpath borrow objects from the reference repository,
+    like ``git clone --reference`` does.
+    """
+    alternates = dirpath / ".git" / "objects" / "info" / "alternates"
+    alternates.parent.mkdir(parents=True, exist_ok=True)
+    alternates.write_text(
+        str(_objects_dir(reference)) + "\n",
+        encoding=sys.getdefaultencoding(),
+    )
+
+
+def _objects_dir(repo_path: pathlib.Path) -> pathlib.Path:
+    dot_git = repo_path / ".git"
+    return (dot_git if dot_git.is_dir() else repo_path).resolve() / "objects"
+
+
+async def _dissociate_async(dirpath: pathlib.Path) -> None:
+    """Stop using the alternate object stores of the repo, like ``git clone
+    --dissociate`` does. The borrowed object files are hardlinked into the
+    repo, which does not copy any data as git never modifies object files. If
+    that is not possible (e.g. if an alternate is on another filesystem), the
+    repo is repacked instead, which copies all objects.
+    """
+    alternates = dirpath / ".git" / "objects" / "info" / "alternates"
+    if not alternates.exists():
+        return
+
+    try:
+        for alternate in alternates.read_text(
+            encoding=sys.getdefaultencoding()
+        ).splitlines():
+            _link_object_files(
+                pathlib.Path(alternate), dirpath / ".git" / "objects"
+            )
+    except OSError as exc:
+        LOGGER.debug(
+            "Could not link objects into {}, repacking: {}".format(
+                dirpath.name, exc
+            )
+        )
+        rc, stderr = await _run_streamed(
+            "git repack -a -d -q".split(), cwd=str(dirpath)
+        )
+        if rc != 0:
+            raise exception.GitError(
+                "Failed to dissociate {} from its reference".format(
+                    dirpath.name
+                ),
+                rc,
+                stderr,
+            )
+    alternates.unlink()
+
+
+def _link_object_files(src: pathlib.Path, dst: pathlib.Path) -> None:
+    """Hardlink all packs and loose objects in the object store at src into
+    the object store at dst. Packs are linked before their indexes, as git
+    ignores an index without a pack but not the other way around.
+    """
+    for pack in sorted((src / "pack").glob("pack-*.pack")):
+        for path in (pack, pack.with_suffix(".idx")):
+            _link(path, dst / "pack" / path.name)
+
+    for dirpath in src.iterdir():
+        if not _LOOSE_OBJECT_DIR_PATTERN.match(dirpath.name):
+            continue
+        for path in dirpath.iterdir():
+            if _LOOSE_OBJECT_FILE_PATTERN.match(path.name):
+                _link(path, dst / dirpath.name / path.name)
+
+
+def _link(src: pathlib.Path, dst: pathlib.Path) -> None:
+    dst.parent.mkdir(exist_ok=True)
+    with contextlib.suppress(FileExistsError):
+        os.link(str(src), str(dst))
+
+
+def _pull_clone(
+    repo_url: str,
+    branch: str = "",
+    cwd: str = ".",
+    reference: Optional[pathlib.Path] = None,
+):
     """Simulate a clone with a pull to avoid writing remotes (that could
     include secure tokens) to disk.
     """
-    dirpath = _ensure_repo_dir_exists(repo_url, cwd)
+    dirpath = _ensure_repo_dir_exists(repo_url, cwd, reference)
 
     pull_command = "git pull {} {}".format(repo_url, branch).strip().split()
 
@@ -51,31 +762,92 @@ def _pull_clone(repo_url: str, branch: str = "", cwd: str = "."):
     return rc, stderr
 
 
-async def _pull_clone_async(repo_url: str, branch: str = "", cwd: str = "."):
-    """Same as _pull_clone, but asynchronously."""
-    dirpath = _ensure_repo_dir_exists(repo_url, cwd)
+async def _pull_clone_async(
+    repo_url: str,
+    branch: str = "",
+    cwd: str = ".",
+    reference: Optional[pathlib.Path] = None,
+    depth: Optional[int] = None,
+    filter_spec: Optional[str] = None,
+    dissociate: bool = True,
+):
+    """Same as _pull_clone, but asynchronously. If a reference is given and
+    dissociate is True, the clone is dissociated from it after pulling, so the
+    clone does not depend on the reference. If a depth or filter_spec is given,
+    the clone is shallow and/or partial.
+    """
+    dirpath = await _ensure_repo_dir_exists_async(repo_url, cwd, reference)
+
+    if depth or filter_spec:
+        rc, stderr = await _partial_pull_async(
+            dirpath, repo_url, branch, depth, filter_spec
+        )
+    else:
+        pull_command = (
+            "git pull --progress {} {}".format(repo_url, branch)
+            .strip()
+            .split()
+        )
+        rc, stderr = await _run_streamed(pull_command, cwd=str(dirpath))
+
+    if rc == 0 and reference and dissociate:
+        await _dissociate_async(dirpath)
+    return rc, stderr
 
-    pull_command = "git pull {} {}".format(repo_url, branch).strip().split()
 
-    proc = await asyncio.create_subprocess_exec(
-        *pull_command,
-        cwd=str(dirpath),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
+async def _partial_pull_async(
+    dirpath: pathlib.Path,
+    repo_url: str,
+    branch: str,
+    depth: Optional[int],
+    filter_spec: Optional[str],
+) -> Tuple[int, bytes]:
+    """Pull with limited history depth and/or an object filter. git pull does
+    not support object filters, so this fetches and then fast-forwards.
+
+    git records the url of a partial clone's promisor remote in the repo
+    config, so the url is passed to git without credentials and is only
+    rewritten to the url with credentials through the command line config.
+    """
+    stripped_url = _strip_credentials(repo_url)
+    config = (
+        []
+        if stripped_url == repo_url
+        else ["-c", "url.{}.insteadOf={}".format(repo_url, stripped_url)]
     )
-    _, stderr = await proc.communicate()
-    return proc.returncode, stderr
+    fetch_options = (["--depth", str(depth)] if depth else []) + (
+        ["--filter", filter_spec] if filter_spec else []
+    )
+    commands = [
+        ["git", *config, "fetch", "--progress", *fetch_options, stripped_url]
+        + ([branch] if branch else []),
+        ["git", *config, "merge", "--ff-only", "FETCH_HEAD"],
+    ]
+
+    for command in commands:
+        rc, stderr = await _run_streamed(command, cwd=str(dirpath))
+        if rc != 0:
+            break
+    return rc, stderr
 
 
 def captured_run(*args, **kwargs):
-    """Run a subprocess and capture the output."""
+    """Run a subprocess and capture the output. git is not allowed to prompt
+    for credentials.
+    """
+    kwargs.setdefault("env", _git_env())
     proc = subprocess.run(
         *args, **kwargs, stdout=subprocess.PIPE, stderr=subprocess.PIPE
     )
     return proc.returncode, proc.stdout, proc.stderr
 
 
-def clone_single(repo_url: str, branch: str = "", cwd: str = "."):
+def clone_single(
+    repo_url: str,
+    branch: str = "",
+    cwd: str = ".",
+    reference: Optional[pathlib.Path] = None,
+):
     """Clone a git repository.
 
     Args:
@@ -83,23 +855,43 @@ def clone_single(repo_url: str, branch: str = "", cwd: str = "."):
             https://<host>/<owner>/<repo>.
         branch: The branch to clone.
         cwd: Working directory. Defaults to the current directory.
+        reference: Path to a local repository to borrow objects from, such
+            that only objects missing from it are fetched. The clone depends
+            on the reference for as long as it exists.
     """
-    rc, stderr = _pull_clone(repo_url, branch, cwd)
+    rc, stderr = _pull_clone(repo_url, branch, cwd, reference)
     if rc != 0:
         raise exception.CloneFailedError(
             "Failed to clone", rc, stderr, repo_url
         )
 
 
-async def _clone_async(repo_url: str, branch: str = "", cwd="."):
+async def _clone_async(
+    repo_url: str,
+    branch: str = "",
+    cwd=".",
+    references: Optional[Mapping[str, pathlib.Path]] = None,
+    depth: Optional[int] = None,
+    filter_spec: Optional[str] = None,
+    dissociate: bool = True,
+):
     """Clone git repositories asynchronously.
 
     Args:
         repo_url: A url to clone.
         branch: Which branch to clone.
         cwd: Working directory.
+        references: An optional mapping from repo url to a local repository
+            to borrow objects from while cloning.
+        depth: If given, only the last depth commits are cloned.
+        filter_spec: If given, an object filter for a partial clone.
+        dissociate: Whether or not to dissociate the clone from its
+            reference when done.
     """
-    rc, stderr = await _pull_clone_async(repo_url, branch, cwd)
+    reference = (references or {}).get(repo_url)
+    rc, stderr = await _pull_clone_async(
+        repo_url, branch, cwd, reference, depth, filter_spec, dissociate
+    )
 
     if rc != 0:
         raise exception.CloneFailedError(
@@ -112,12 +904,35 @@ async def _clone_async(repo_url: str, branch: str = "", cwd="."):
         LOGGER.info("Cloned into {}".format(repo_url))
 
 
-def clone(repo_urls: Iterable[str], cwd: str = ".") -> List[Exception]:
+def clone(
+    repo_urls: Iterable[str],
+    cwd: str = ".",
+    references: Optional[Mapping[str, pathlib.Path]] = None,
+    depth: Optional[int] = None,
+    filter_spec: Optional[str] = None,
+    on_success: Optional[Callable[[str], None]] = None,
+) -> List[Exception]:
     """Clone all repos asynchronously.
 
     Args:
         repo_urls: URLs to repos to clone.
         cwd: Working directory. Defaults to the current directory.
+        references: An optional mapping from repo url to a local repository
+            (typically a mirror from the :py:class:`MirrorCache`) to borrow
+            objects from, such that only objects missing from the reference
+            are fetched from the remote. The clones are dissociated from their
+            references when done.
+        depth: If given, the clones are shallow and only contain the last
+            depth commits.
+        filter_spec: If given, the clones are partial and only contain the
+            objects that pass the filter (e.g. ``blob:none``), along with the
+            objects needed to check out the cloned branch. Missing objects are
+            fetched lazily by git, which requires that the remote can be
+            accessed without credentials.
+        on_success: An optional function to call with the url of each repo
+            as soon as cloning it has succeeded. It is called after the clone
+            has released its slot in the pool, and should return quickly, as
+            no other clone makes progress while it runs.
 
     Returns:
         URLs from which cloning failed.
@@ -125,25 +940,197 @@ def clone(repo_urls: Iterable[str], cwd: str = ".") -> List[Exception]:
     # TODO valdate repo_urls
     return [
         exc.url
-        for exc in _batch_execution(_clone_async, repo_urls, cwd=cwd)
+        for exc in _batch_execution(
+            _clone_async,
+            repo_urls,
+            on_success=on_success,
+            cwd=cwd,
+            references=references,
+            depth=depth,
+            filter_spec=filter_spec,
+        )
         if isinstance(exc, exception.CloneFailedError)
     ]
 
 
-async def _push_async(pt: Push):
+def clone_all(
+    repo_urls: Iterable[str],
+    cwd: str = ".",
+    references: Optional[Mapping[str, pathlib.Path]] = None,
+) -> None:
+    """Clone all repos asynchronously, and abort as soon as any clone fails.
+    Unlike with :py:func:`clone`, the clones are not dissociated from their
+    references, and so depend on them for as long as they exist.
+
+    Args:
+        repo_urls: URLs to repos to clone.
+        cwd: Working directory. Defaults to the current directory.
+        references: An optional mapping from repo url to a local repository
+            to borrow objects from.
+    Raises:
+        exception.CloneFailedError: If any clone fails. Clones that are in
+            progress are then cancelled, and no further clones are started.
+    """
+    _run_async(
+        _execute_pool(
+            _clone_async,
+            repo_urls,
+            cwd=cwd,
+            references=references,
+            dissociate=False,
+            fail_fast=True,
+        )
+    )
+
+
+def head(repo_path: str) -> Optional[str]:
+    """Return the commit SHA that HEAD points to in the repo, or None if it
+    does not point to a commit (e.g. if the repo is empty).
+
+    Args:
+        repo_path: Path to a local repository.
+    """
+    return _rev_parse(repo_path, "HEAD")
+
+
+def clean_tree(repo_path: str) -> Optional[str]:
+    """Return the SHA of the tree that HEAD points to in the repo, provided
+    that the working tree is clean. Files that are ignored by git do not
+    count as changes.
+
+    Args:
+        repo_path: Path to a local repository.
+    Returns:
+        the SHA of the tree, or None if the working tree has modified, staged
+        or untracked files, or if HEAD does not point to a commit.
+    """
+    cwd = os.path.abspath(repo_path)
+    rc, stdout, _ = captured_run(["git", "status", "--porcelain"], cwd=cwd)
+    if rc != 0 or stdout.strip():
+        return None
+    rc, stdout, _ = captured_run(
+        ["git", "rev-parse", "--verify", "--quiet", "HEAD^{tree}"], cwd=cwd
+    )
+    return stdout.decode(sys.getdefaultencoding()).strip() if rc == 0 else None
+
+
+def _rev_parse(repo_path: str, rev: str) -> Optional[str]:
+    """Return the commit SHA that rev points to in the repo, or None if it
+    does not point to a commit.
+    """
+    rc, stdout, _ = captured_run(
+        ["git", "rev-parse", "--verify", "--quiet", rev + "^{commit}"],
+        cwd=os.path.abspath(repo_path),
+    )
+    return stdout.decode(sys.getdefaultencoding()).strip() if rc == 0 else None
+
+
+async def _head_async(repo_path: str) -> Optional[str]:
+    """Same as :py:func:`head`, but asynchronously."""
+    proc = await _start_process(
+        "git rev-parse --verify --quiet HEAD".split(),
+        cwd=os.path.abspath(repo_path),
+    )
+    stdout, _ = await _communicate(proc)
+    if proc.returncode != 0:
+        return None
+    return stdout.decode(sys.getdefaultencoding()).strip()
+
+
+async def _pull_async(
+    pt: Pull,
+    heads: Dict[str, Tuple[Optional[str], Optional[str]]],
+    unshallow: bool = False,
+):
+    """Fast-forward an existing local repo to the state of the remote, without
+    writing the remote to disk. The commit SHAs of HEAD before and after
+    pulling are recorded in heads, with the repo_url as key.
+
+    Args:
+        pt: A Pull namedtuple.
+        heads: A mapping to record the old and new HEAD of the repo in.
+        unshallow: If True, the full history is fetched into shallow repos.
+    """
+    old_head = await _head_async(pt.local_path)
+    unshallow_option = (
+        "--unshallow" if unshallow and _is_shallow(pt.local_path) else ""
+    )
+    command = (
+        "git pull --ff-only --progress {} {} {}".format(
+            unshallow_option, pt.repo_url, pt.branch
+        )
+        .strip()
+        .split()
+    )
+    proc = await _start_process(command, cwd=os.path.abspath(pt.local_path))
+    _, stderr = await _communicate(proc)
+
+    if proc.returncode != 0:
+        raise exception.PullFailedError(
+            "Failed to pull from {}".format(pt.repo_url),
+            proc.returncode,
+            stderr,
+            pt.repo_url,
+        )
+
+    new_head = await _head_async(pt.local_path)
+    heads[pt.repo_url] = (old_head, new_head)
+    if old_head == new_head:
+        LOGGER.info("{} is up-to-date".format(pt.repo_url))
+    else:
+        LOGGER.info("Pulled from {} {}".format(pt.repo_url, pt.branch))
+
+
+def pull(
+    pull_tuples: Iterable[Pull], unshallow: bool = False
+) -> Tuple[Mapping[str, Tuple[Optional[str], Optional[str]]], List[str]]:
+    """Fast-forward all local repos defined in pull_tuples to the state of
+    their remotes asynchronously. Amount of concurrent tasks is limited by the
+    :py:class:`ConcurrencyController`. Repos that have diverged from their
+    remotes are not touched.
+
+    Args:
+        pull_tuples: Pull namedtuples defining local and remote repos.
+        unshallow: If True, the full history is fetched into any shallow
+            repos.
+
+    Returns:
+        a tuple with a mapping from repo url to the commit SHAs of HEAD before
+        and after pulling, and a list of urls from which pulls failed with
+        exception.PullFailedError. Other errors are only logged.
+    """
+    heads = {}
+    fail_urls = [
+        exc.url
+        for exc in _batch_execution(
+            _pull_async, pull_tuples, heads=heads, unshallow=unshallow
+        )
+        if isinstance(exc, exception.PullFailedError)
+    ]
+    return heads, fail_urls
+
+
+async def _push_async(pt: Push, pack_times: Optional[Dict[str, float]] = None):
     """Asynchronous call to git push, pushing directly to the repo_url and branch.
 
     Args:
         pt: A Push namedtuple.
+        pack_times: An optional mapping to record the time git spent
+            generating the pack for the push in, with the repo_url as key.
     """
-    command = ["git", "push", pt.repo_url, pt.branch]
-    proc = await asyncio.create_subprocess_exec(
-        *command,
-        cwd=os.path.abspath(pt.local_path),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
+    command = ["git", "push", "--progress", pt.repo_url, pt.branch]
+    env = _git_env()
+    env.setdefault("GIT_TRACE2_EVENT", "2")
+    proc = await _start_process(
+        command, cwd=os.path.abspath(pt.local_path), env=env
     )
-    _, stderr = await proc.communicate()
+    _, stderr = await _communicate(proc)
+    pack_time, stderr = _extract_pack_generation_time(stderr)
+    if pack_time is not None and pack_times is not None:
+        pack_times[pt.repo_url] = pack_time
+        LOGGER.debug(
+            "Generated pack for {} in {:.3f}s".format(pt.repo_url, pack_time)
+        )
 
     if proc.returncode != 0:
         raise exception.PushFailedError(
@@ -158,109 +1145,554 @@ async def _push_async(pt: Push):
         LOGGER.info("Pushed files to {} {}".format(pt.repo_url, pt.branch))
 
 
-def _push_no_retry(push_tuples: Iterable[Push]) -> List[str]:
-    """Push to all repos defined in push_tuples asynchronously. Amount of
-    concurrent tasks is limited by CONCURRENT_TASKS.
+def _extract_pack_generation_time(
+    stderr: bytes,
+) -> Tuple[Optional[float], bytes]:
+    """Extract the time that git spent enumerating objects and computing
+    deltas for the pack sent by a push from the trace2 events in its stderr.
+
+    Returns:
+        the pack generation time in seconds, or None if there were no such
+        events (e.g. if git is too old to emit them), and stderr without any
+        trace2 events.
+    """
+    pack_time = None
+    for match in _TRACE2_EVENT_PATTERN.finditer(stderr):
+        if match.group(1):  # event from the remote end
+            continue
+        try:
+            event = json.loads(match.group().decode("utf8"))
+        except ValueError:
+            continue
+        if (
+            event.get("event") == "region_leave"
+            and event.get("category") == "pack-objects"
+            and event.get("label") in _PACK_GENERATION_REGIONS
+        ):
+            pack_time = (pack_time or 0) + event["t_rel"]
+    return pack_time, _TRACE2_EVENT_PATTERN.sub(b"", stderr)
+
 
-    Pushes once and only once to each repo.
+def push(
+    push_tuples: Iterable[Push],
+    tries: Optional[int] = None,
+    on_success: Optional[Callable[[Push], None]] = None,
+) -> List[str]:
+    """Push to all repos defined in push_tuples asynchronously. Amount of
+    concurrent tasks is limited by the :py:class:`ConcurrencyController`.
+    Each push is tried a maximum of ``tries`` times (i.e. pushing is
+    _retried_ ``tries - 1`` times). Failed pushes are retried individually
+    after an exponential backoff with jitter, unless the failure is permanent
+    (e.g. authentication failed or the push was rejected as non-fast-forward).
 
     Args:
         push_tuples: Push namedtuples defining local and remote repos.
+        tries: Amount of times to try to push (including initial push).
+            Defaults to the amount set with :py:func:`configure`.
+        on_success: An optional function to call with each push tuple as soon
+            as pushing it has succeeded.
 
     Returns:
         urls to which pushes failed with exception.PushFailedError. Other
         errors are only logged.
     """
-    return [
+    tries = _PUSH_TRIES if tries is None else tries
+    if tries < 1:
+        raise ValueError("tries must be larger than 0")
+
+    pack_times = {}
+    failed_urls = [
         exc.url
-        for exc in _batch_execution(_push_async, push_tuples)
+        for exc in _batch_execution(
+            _push_async,
+            push_tuples,
+            tries=tries,
+            on_success=on_success,
+            pack_times=pack_times,
+        )
         if isinstance(exc, exception.PushFailedError)
     ]
+    if failed_urls:
+        LOGGER.warning("{} pushes failed ...".format(len(failed_urls)))
 
+    _log_pack_generation_times(pack_times)
+    return failed_urls
 
-def push(push_tuples: Iterable[Push], tries: int = 3) -> List[str]:
-    """Push to all repos defined in push_tuples asynchronously. Amount of
-    concurrent tasks is limited by CONCURRENT_TASKS. Pushing to repos is tried
-    a maximum of ``tries`` times (i.e. pushing is _retried_ ``tries - 1``
-    times.)
+
+def partition_up_to_date(
+    push_tuples: Iterable[Push],
+) -> Tuple[List[Push], List[Push]]:
+    """Find out which of the pushes defined in push_tuples would be no-ops, by
+    comparing the remote branch of each push (as reported by ``git
+    ls-remote``) to the local branch. A push is a no-op if the remote branch
+    already contains the local branch, e.g. when students have committed on
+    top of it. The remotes are queried asynchronously, and the amount of
+    concurrent queries is limited by the :py:class:`ConcurrencyController`.
 
     Args:
         push_tuples: Push namedtuples defining local and remote repos.
-        tries: Amount of times to try to push (including initial push).
 
     Returns:
-        urls to which pushes failed with exception.PushFailedError. Other
-        errors are only logged.
+        a tuple with the push tuples that need to be pushed, and the push
+        tuples whose remote branch points to the local branch or to a
+        descendant of it. Whether a remote branch is a descendant can only be
+        determined if the commit it points to is in the local repo, so pushes
+        to remote branches that point to unknown commits are assumed to be
+        needed, as are pushes to remotes that cannot be queried.
     """
-    if tries < 1:
-        raise ValueError("tries must be larger than 0")
-    # confusing, but failed_pts needs an initial value
-    failed_pts = list(push_tuples)
-    for i in range(tries):
-        LOGGER.info("Pushing, attempt {}/{}".format(i + 1, tries))
-        failed_urls = set(_push_no_retry(failed_pts))
-        failed_pts = [pt for pt in push_tuples if pt.repo_url in failed_urls]
-        if not failed_pts:
-            break
-        LOGGER.warning("{} pushes failed ...".format(len(failed_pts)))
+    push_tuples = list(push_tuples)
+    remote_shas = {}
+    exceptions = _run_async(
+        _execute_pool(_ls_remote_async, push_tuples, remote_shas=remote_shas)
+    )
+    for exc in exceptions:
+        LOGGER.warning("{}{}Pushing anyway".format(exc, os.linesep))
+
+    local_shas = {}
+    to_push = []
+    up_to_date = []
+    for pt in push_tuples:
+        src, _ = _split_refspec(pt.branch)
+        key = (pt.local_path, src)
+        if key not in local_shas:
+            local_shas[key] = _rev_parse(pt.local_path, src)
+        local_sha = local_shas[key]
+        remote_sha = remote_shas.get(pt)
+        if (
+            local_sha is not None
+            and remote_sha is not None
+            and (
+                remote_sha == local_sha
+                or _is_ancestor(pt.local_path, local_sha, remote_sha)
+            )
+        ):
+            up_to_date.append(pt)
+        else:
+            to_push.append(pt)
+    return to_push, up_to_date
+
+
+def _is_ancestor(repo_path: str, ancestor: str, descendant: str) -> bool:
+    """Return True if both commits are in the repo, and ancestor is an
+    ancestor of descendant.
+    """
+    rc, _, _ = captured_run(
+        ["git", "merge-base", "--is-ancestor", ancestor, descendant],
+        cwd=os.path.abspath(repo_path),
+    )
+    return rc == 0
+
+
+def _split_refspec(refspec: str) -> Tuple[str, str]:
+    """Split a push refspec into the local ref and the fully qualified remote
+    ref.
+    """
+    src, _, dst = refspec.partition(":")
+    dst = dst or src
+    if not dst.startswith("refs/"):
+        dst = "refs/heads/" + dst
+    return src, dst
+
+
+async def _ls_remote_async(pt: Push, remote_shas: Dict[Push, str]):
+    """Record the commit SHA that the remote branch of the push points to in
+    remote_shas, with the push tuple as key. Nothing is recorded if the remote
+    branch does not exist.
+
+    Args:
+        pt: A Push namedtuple.
+        remote_shas: A mapping to record the remote SHA in.
+    """
+    _, remote_ref = _split_refspec(pt.branch)
+    proc = await _start_process(
+        ["git", "ls-remote", pt.repo_url, remote_ref],
+        cwd=os.path.abspath(pt.local_path),
+    )
+    stdout, stderr = await _communicate(proc)
+
+    if proc.returncode != 0:
+        raise exception.GitError(
+            "Failed to query {}".format(pt.repo_url), proc.returncode, stderr
+        )
+
+    for line in stdout.decode(sys.getdefaultencoding()).splitlines():
+        sha, _, ref = line.partition("\t")
+        if ref == remote_ref:
+            remote_shas[pt] = sha
+
+
+def _log_pack_generation_times(pack_times: Mapping[str, float]) -> None:
+    if not pack_times:
+        return
+    times = sorted(pack_times.values())
+    LOGGER.info(
+        "Pack generation time per push: median {:.3f}s, max {:.3f}s, "
+        "total {:.3f}s over {} pushes".format(
+            times[len(times) // 2], times[-1], sum(times), len(times)
+        )
+    )
+
+
+def repack_for_push(repo_paths: Iterable[str]) -> None:
+    """Repack each repo into a single pack with a reachability bitmap, and
+    enable bitmaps and pack reuse for it. Pushing a repo prepared like this to
+    many remotes lets git enumerate objects with the bitmap and reuse the
+    existing deltas, instead of recomputing both for every single push.
 
-    return [pt.repo_url for pt in failed_pts]
+    Failing to repack is not an error, as it only makes pushes slower.
+
+    Args:
+        repo_paths: Paths to local repositories.
+    """
+    for repo_path in repo_paths:
+        cwd = os.path.abspath(repo_path)
+        start = time.monotonic()
+        rc, _, stderr = captured_run(
+            "git repack -a -d -q --write-bitmap-index".split(), cwd=cwd
+        )
+        if rc != 0:
+            LOGGER.warning(
+                str(
+                    exception.GitError(
+                        "Failed to repack {}".format(repo_path), rc, stderr
+                    )
+                )
+            )
+            continue
+
+        for option in ("pack.useBitmaps", "pack.allowPackReuse"):
+            captured_run(["git", "config", option, "true"], cwd=cwd)
+        LOGGER.info(
+            "Repacked {} for pushing in {:.2f}s".format(
+                os.path.basename(cwd), time.monotonic() - start
+            )
+        )
 
 
 def _batch_execution(
-    batch_func: Callable[[Iterable[Any], Any], List[asyncio.Task]],
+    batch_func: Callable[..., Awaitable[Any]],
     arg_list: Iterable[Any],
     *batch_func_args,
+    tries: int = 1,
+    on_success: Optional[Callable[[Any], None]] = None,
     **batch_func_kwargs
 ) -> List[Exception]:
-    """Take a batch function (any function whos first argument is an iterable)
-    and send in send in CONCURRENT_TASKS amount of arguments from the arg_list
-    until it is exhausted. The batch_func_kwargs are provided on each call.
+    """Take a coroutine function and call it once for each argument in the
+    arg_list, with the batch_func_args and batch_func_kwargs provided on each
+    call. The amount of calls in flight at any one time is limited by the
+    :py:class:`ConcurrencyController`, and a new call is started as soon as
+    any previous call finishes (i.e. this is a sliding window, not a sequence
+    of fixed-size batches).
+
+    Calls that fail with a retryable git error are retried in the same pool
+    after an exponential backoff with jitter. A call does not occupy a slot in
+    the pool while it is waiting to be retried.
 
     Args:
-        batch_func: A function that takes an iterable as a first argument and
-            returns
-        a list of asyncio.Task objects.
-        arg_list: A list of objects that are of the same type as the
-        batch_func's first argument.
+        batch_func: A coroutine function that takes an element of arg_list as
+            its first argument.
+        arg_list: An iterable of arguments for the batch_func. It is consumed
+            lazily.
+        batch_func_args: Additional positional arguments to the batch_func.
+        tries: The maximum amount of times to call batch_func with each
+            argument.
+        on_success: An optional function to call with each argument for
+            which batch_func succeeded. It is called after the call has
+            released its slot in the pool, and is not included in the
+            duration of the call that the :py:class:`ConcurrencyController`
+            measures.
         batch_func_kwargs: Additional keyword arguments to the batch_func.
 
     Returns:
-        a list of exceptions raised in the tasks returned by the batch
-        function.
+        a list of exceptions raised by the last calls to batch_func, in the
+        same order as the arguments that caused them.
     """
-    completed_tasks = []
-    args_iter = iter(arg_list)
-
-    loop = asyncio.get_event_loop()
-    has_more_jobs = True
-    while has_more_jobs:
-        args = []
-        for _ in range(CONCURRENT_TASKS):
-            try:
-                args.append(next(args_iter))
-            except StopIteration:
-                has_more_jobs = False
-
-        tasks = [
-            loop.create_task(
-                batch_func(arg, *batch_func_args, **batch_func_kwargs)
-            )
-            for arg in args
-        ]
-        # if
-        # a) arg_list was empty
-        # or
-        # b) len(arg_list) % CONCURRENT_TASKS == 0
-        # the last iteration will have no tasks
-        if tasks:
-            loop.run_until_complete(asyncio.wait(tasks))
-            completed_tasks += tasks
-
-    exceptions = [
-        task.exception() for task in completed_tasks if task.exception()
-    ]
+    exceptions = _run_async(
+        _execute_pool(
+            batch_func,
+            arg_list,
+            *batch_func_args,
+            tries=tries,
+            on_success=on_success,
+            **batch_func_kwargs
+        )
+    )
     for exc in exceptions:
         LOGGER.error(str(exc))
 
     return exceptions
+
+
+async def _execute_pool(
+    func: Callable[..., Awaitable[Any]],
+    arg_list: Iterable[Any],
+    *func_args,
+    tries: int = 1,
+    fail_fast: bool = False,
+    on_success: Optional[Callable[[Any], None]] = None,
+    **func_kwargs
+) -> List[Exception]:
+    """Execute func on each argument in arg_list with bounded concurrency. See
+    :py:func:`_batch_execution` for details. If fail_fast is True, no more
+    calls are started after a call has failed, and the exception of the first
+    failed call is raised instead of returned.
+    """
+    controller = _CONCURRENCY
+    slot_freed = asyncio.Condition()
+    in_flight = 0
+
+    async def _acquire_slot():
+        nonlocal in_flight
+        async with slot_freed:
+            await slot_freed.wait_for(lambda: in_flight < controller.limit)
+            in_flight += 1
+
+    async def _release_slot():
+        nonlocal in_flight
+        async with slot_freed:
+            in_flight -= 1
+            slot_freed.notify_all()
+
+    async def _run_one(arg):
+        """Run func on arg, which has already acquired a slot."""
+        for attempt in range(1, tries + 1):
+            if attempt > 1:
+                await _acquire_slot()
+            start = time.monotonic()
+            try:
+                await func(arg, *func_args, **func_kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                controller.record_failure(exc, time.monotonic() - start)
+                if attempt == tries or not _is_retryable(exc):
+                    raise
+                delay = _backoff_delay(attempt)
+                LOGGER.warning(
+                    "{}{}Retrying in {:.1f}s (attempt {}/{})".format(
+                        exc, os.linesep, delay, attempt + 1, tries
+                    )
+                )
+            else:
+                controller.record_success(time.monotonic() - start)
+                break
+            finally:
+                await _release_slot()
+            await asyncio.sleep(delay)
+        if on_success:
+            on_success(arg)
+
+    LOGGER.info(
+        "Running git operations with concurrency {}".format(controller.limit)
+    )
+    failed = False
+
+    def _check_failure(task):
+        nonlocal failed
+        failed = failed or (not task.cancelled() and bool(task.exception()))
+
+    tasks = []
+    for arg in arg_list:
+        await _acquire_slot()
+        if fail_fast and failed:
+            await _release_slot()
+            break
+        task = asyncio.ensure_future(_run_one(arg))
+        task.add_done_callback(_check_failure)
+        tasks.append(task)
+
+    results = await asyncio.gather(*tasks, return_exceptions=not fail_fast)
+    return [res for res in results if isinstance(res, Exception)]
+
+
+def _run_async(coro: Awaitable[T]) -> T:
+    """Run the coroutine to completion in a new event loop, and close the loop
+    when done. If execution is interrupted (e.g. by a KeyboardInterrupt), all
+    tasks that are still pending are cancelled before the loop is closed,
+    which in turn terminates any git processes they are waiting for.
+
+    This is equivalent to ``asyncio.run``, which is not available in Python
+    3.6.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        try:
+            _cancel_pending_tasks(loop)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+def _cancel_pending_tasks(loop: asyncio.AbstractEventLoop) -> None:
+    all_tasks = getattr(asyncio, "all_tasks", None) or asyncio.Task.all_tasks
+    pending = [task for task in all_tasks(loop) if not task.done()]
+    if not pending:
+        return
+
+    for task in pending:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+
+def _git_env() -> Dict[str, str]:
+    """Return the environment for git processes. git is not allowed to prompt
+    for credentials, as there is nobody to answer the prompt.
+    """
+    env = dict(os.environ)
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    return env
+
+
+async def _start_process(
+    command: List[str],
+    cwd: Optional[str] = None,
+    env: Optional[Mapping[str, str]] = None,
+    stdout: int = subprocess.PIPE,
+) -> asyncio.subprocess.Process:
+    """Start a process asynchronously with stderr piped. The process is put in
+    a new process group, so it can be terminated along with any processes it
+    spawns (e.g. the ssh or https transport of git).
+
+    Args:
+        command: The command to run.
+        cwd: Working directory of the command.
+        env: Environment of the command. Defaults to the one from
+            :py:func:`_git_env`.
+        stdout: Where to send stdout.
+    Returns:
+        the started process.
+    """
+    return await asyncio.create_subprocess_exec(
+        *command,
+        cwd=cwd,
+        env=_git_env() if env is None else env,
+        stdout=stdout,
+        stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+
+
+async def _run_streamed(
+    command: List[str], cwd: Optional[str] = None
+) -> Tuple[int, bytes]:
+    """Run a command asynchronously with stdout discarded, and stderr
+    streamed as it is written instead of buffered in full. Only the tail of
+    stderr is kept, which is where git puts its error messages. The command
+    is subject to the same timeout as :py:func:`_communicate`, and if the
+    waiting task is cancelled, the process is killed.
+
+    Args:
+        command: The command to run.
+        cwd: Working directory of the command.
+    Returns:
+        the return code of the command and the tail of its stderr.
+    """
+    proc = await _start_process(command, cwd=cwd, stdout=subprocess.DEVNULL)
+    _, stderr = await _communicate(proc, max_stderr_size=_MAX_STDERR_SIZE)
+    return proc.returncode, stderr
+
+
+async def _communicate(
+    proc: asyncio.subprocess.Process, max_stderr_size: Optional[int] = None
+) -> Tuple[bytes, bytes]:
+    """Wait for the process to finish and return its output, without git's
+    progress output. If the process does not write any output for as long as
+    the timeout set with :py:func:`configure`, it is considered hung and is
+    terminated, and the returned stderr explains that it timed out. Commands
+    that transfer data should therefore be run with ``--progress``, such that
+    they are not terminated while they are still making progress. If the
+    waiting task is cancelled, the process is killed.
+
+    Args:
+        proc: A process started with :py:func:`_start_process`.
+        max_stderr_size: If given, only this many bytes are kept from the end
+            of stderr.
+    Returns:
+        stdout and stderr of the process.
+    """
+    stdout = bytearray()
+    stderr = bytearray()
+    last_output = time.monotonic()
+
+    async def _read(stream, output, max_size=None):
+        nonlocal last_output
+        while stream is not None:
+            chunk = await stream.read(_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            last_output = time.monotonic()
+            output.extend(chunk)
+            if max_size is not None:
+                del output[:-max_size]
+
+    async def _read_all():
+        await asyncio.gather(
+            _read(proc.stdout, stdout),
+            _read(proc.stderr, stderr, max_stderr_size),
+        )
+        await proc.wait()
+
+    task = asyncio.ensure_future(_read_all())
+    try:
+        while _TIMEOUT and not task.done():
+            remaining = last_output + _TIMEOUT - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait([task], timeout=remaining)
+        await task
+    except asyncio.TimeoutError:
+        await _cancel(task)
+        await _terminate(proc)
+        stderr.extend(_timeout_message())
+    except asyncio.CancelledError:
+        await _cancel(task)
+        await _kill(proc)
+        raise
+    return bytes(stdout), _PROGRESS_PATTERN.sub(b"", bytes(stderr))
+
+
+async def _cancel(task: asyncio.Future) -> None:
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+def _timeout_message() -> bytes:
+    # "timed out" classifies the failure as a (retryable) network failure
+    return "\nfatal: git timed out after {}s without any progress".format(
+        _TIMEOUT
+    ).encode(sys.getdefaultencoding())
+
+
+async def _terminate(proc: asyncio.subprocess.Process) -> None:
+    """Terminate the process group of the process with SIGTERM, and escalate
+    to SIGKILL if the process has not exited after
+    :py:const:`TERMINATE_GRACE_PERIOD` seconds.
+    """
+    if proc.returncode is not None:
+        return
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), TERMINATE_GRACE_PERIOD)
+    except asyncio.TimeoutError:
+        LOGGER.warning(
+            "Process {} ignored SIGTERM, killing it".format(proc.pid)
+        )
+        await _kill(proc)
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    """Kill the process group of the process with SIGKILL."""
+    if proc.returncode is not None:
+        return
+    _signal_group(proc, signal.SIGKILL)
+    await proc.wait()
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(proc.pid, sig)
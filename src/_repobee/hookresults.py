@@ -0,0 +1,208 @@
+"""Incremental storage of hook results.
+
+.. module:: hookresults
+    :synopsis: Streaming writer of hook results to JSON Lines files, and
+        compaction of such files into the hook results JSON format.
+
+.. moduleauthor:: Simon Larsén
+"""
+import json
+import os
+import pathlib
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Mapping, Tuple
+
+import daiquiri
+
+import repobee_plug as plug
+
+LOGGER = daiquiri.getLogger(__file__)
+
+# the default amount of seconds between fsyncs of a records file
+FSYNC_INTERVAL = 5.0
+
+_INDENT = " " * 4
+
+
+class HookResultsWriter:
+    """Writes hook results to a JSON Lines file as they become available,
+    with one record per line. A record contains the results of one or more
+    hooks for a single repo, and there may be several records for the same
+    repo. Each record is flushed when it is written, and the file is
+    fsync'd at most every fsync_interval seconds, and when the writer is
+    closed.
+
+    The records file is created when the first record is written. Use
+    :py:func:`compact` to convert it into the hook results JSON format, or
+    :py:func:`read_records` to read it directly.
+    """
+
+    def __init__(
+        self, path: pathlib.Path, fsync_interval: float = FSYNC_INTERVAL
+    ):
+        """
+        Args:
+            path: Path to the records file. Any existing file is overwritten.
+            fsync_interval: Minimum amount of seconds between fsyncs.
+        """
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.written = set()
+        self._file = None
+        self._last_fsync = 0.0
+
+    def write(self, repo_name: str, results: List[plug.Result]) -> None:
+        """Write a record of hook results for a repo. Nothing is written if
+        there are no results.
+
+        Args:
+            repo_name: Name of the repo.
+            results: Results of hooks that acted on the repo.
+        """
+        if not results:
+            return
+        if self._file is None:
+            self._file = open(str(self.path), mode="w", encoding="utf8")
+            self._last_fsync = time.monotonic()
+
+        record = dict(repo=repo_name, results=_results_to_dict(results))
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.written.add(repo_name)
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self._fsync()
+
+    def close(self) -> None:
+        """Flush and fsync the records file, and then close it."""
+        if self._file is not None:
+            self._fsync()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "HookResultsWriter":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _fsync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+
+def compact(records_path: pathlib.Path, dst: pathlib.Path) -> int:
+    """Merge the records in a records file into a hook results JSON file, in
+    the format of :py:func:`repobee_plug.result_mapping_to_json`. The
+    results of a hook in a later record replace those of a hook with the same
+    name in an earlier record for the same repo. Only the results of one repo
+    are kept in memory at a time, and dst is replaced atomically.
+
+    Args:
+        records_path: Path to a records file written by a
+            :py:class:`HookResultsWriter`.
+        dst: Path to write the hook results JSON file to.
+    Returns:
+        the amount of repos in the hook results file.
+    """
+    offsets = _record_offsets(records_path)
+    with open(
+        str(records_path), mode="r", encoding="utf8"
+    ) as records, tempfile.NamedTemporaryFile(
+        mode="w",
+        encoding="utf8",
+        dir=str(dst.parent),
+        prefix=".{}-".format(dst.name),
+        delete=False,
+    ) as file:
+        file.write("{" if offsets else "{}")
+        for i, (repo_name, repo_offsets) in enumerate(offsets.items()):
+            hooks = {}
+            for offset in repo_offsets:
+                records.seek(offset)
+                hooks.update(json.loads(records.readline())["results"])
+            file.write(
+                "{}\n{}{}: {}".format(
+                    "," if i else "",
+                    _INDENT,
+                    json.dumps(repo_name, ensure_ascii=False),
+                    json.dumps(hooks, indent=4, ensure_ascii=False).replace(
+                        "\n", "\n" + _INDENT
+                    ),
+                )
+            )
+        file.write("\n}" if offsets else "")
+    os.replace(file.name, str(dst))
+    return len(offsets)
+
+
+def read_records(
+    records_path: pathlib.Path,
+) -> Mapping[str, List[plug.Result]]:
+    """Read the records in a records file into a hook results mapping, merged
+    in the same way as by :py:func:`compact`.
+
+    Args:
+        records_path: Path to a records file written by a
+            :py:class:`HookResultsWriter`.
+    Returns:
+        a mapping from repo name to hook results.
+    """
+    mapping = {}
+    for _, record in _read_records(records_path):
+        mapping.setdefault(record["repo"], {}).update(record["results"])
+    return {
+        repo_name: [
+            plug.Result(
+                name=name,
+                status=plug.Status(value["status"]),
+                msg=value["msg"],
+                data=value["data"],
+            )
+            for name, value in hooks.items()
+        ]
+        for repo_name, hooks in mapping.items()
+    }
+
+
+def _results_to_dict(results: List[plug.Result]) -> Dict[str, Any]:
+    return {
+        res.name: {
+            "status": res.status.value,
+            "msg": res.msg,
+            "data": res.data,
+        }
+        for res in results
+    }
+
+
+def _record_offsets(records_path: pathlib.Path) -> Dict[str, List[int]]:
+    """Return the offsets of the records of each repo, in the order that the
+    repos first appear.
+    """
+    offsets = {}
+    for offset, record in _read_records(records_path):
+        offsets.setdefault(record["repo"], []).append(offset)
+    return offsets
+
+
+def _read_records(
+    records_path: pathlib.Path,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield each record in the file along with its offset. A last line that
+    was only partially written (e.g. due to a crash) is skipped.
+    """
+    with open(str(records_path), mode="r", encoding="utf8") as file:
+        offset = file.tell()
+        line = file.readline()
+        while line:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                LOGGER.warning(
+                    "Ignoring corrupt record in {}".format(records_path)
+                )
+            else:
+                yield offset, record
+            offset = file.tell()
+            line = file.readline()
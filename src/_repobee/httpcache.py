@@ -0,0 +1,175 @@
+"""Persistent cache of HTTP responses for conditional requests.
+
+.. module:: httpcache
+    :synopsis: On-disk cache of HTTP responses, which are revalidated with
+        conditional requests instead of being downloaded again.
+
+.. moduleauthor:: Simon Larsén
+"""
+import hashlib
+import json
+import pathlib
+import threading
+from typing import Callable, Mapping, Optional, Tuple, Union
+
+import daiquiri
+
+from _repobee import diskcache
+
+LOGGER = daiquiri.getLogger(__file__)
+
+# default maximum size of the cache in megabytes
+DEFAULT_HTTP_CACHE_SIZE = 50
+
+# status, headers and body of an HTTP response
+Response = Tuple[int, Mapping[str, str], Union[str, bytes]]
+
+# request headers that select the representation of a response, such as API
+# previews, and therefore must be part of the cache key
+_KEY_HEADERS = ("accept",)
+
+# hits and misses of all caches in this process since stats were last logged
+_total_hits = 0
+_total_misses = 0
+_stats_lock = threading.Lock()
+
+
+def log_stats() -> None:
+    """Log the amount of hits and misses of all caches in this process since
+    this function was last called. This should be called once when a command
+    has finished.
+    """
+    global _total_hits, _total_misses
+    with _stats_lock:
+        hits, misses = _total_hits, _total_misses
+        _total_hits = _total_misses = 0
+    if hits or misses:
+        LOGGER.info("HTTP cache: {} hits, {} misses".format(hits, misses))
+
+
+class ConditionalRequestCache(diskcache.DiskCache):
+    """An on-disk cache of responses to GET requests. A response is cached if
+    it has an ``ETag`` or ``Last-Modified`` header, and a later request for
+    the same url is then made conditional with ``If-None-Match`` or
+    ``If-Modified-Since``. If the server responds with ``304 Not Modified``,
+    the cached response is used instead. Such responses do not count against
+    the rate limit of the GitHub API.
+
+    Responses are keyed by url, by the request headers that select the
+    representation of the response (e.g. ``Accept``), and by a scope, which
+    should identify the credentials that the requests are made with, as
+    different credentials may see different responses. See
+    :py:class:`~_repobee.diskcache.DiskCache` for how entries are stored and
+    evicted.
+    """
+
+    DESCRIPTION = "HTTP cache"
+
+    def __init__(
+        self,
+        root: pathlib.Path,
+        scope: str,
+        max_size: int = DEFAULT_HTTP_CACHE_SIZE,
+    ):
+        """
+        Args:
+            root: Directory to put the cache in.
+            scope: A string that identifies the credentials that requests
+                are made with. It is only stored hashed.
+            max_size: Maximum size of the cache in megabytes.
+        """
+        super().__init__(root, max_size)
+        self.hits = 0
+        self.misses = 0
+        self._scope = hashlib.sha256(scope.encode("utf8")).hexdigest()
+
+    def get(
+        self,
+        url: str,
+        headers: Mapping[str, str],
+        send: Callable[[Mapping[str, str]], Response],
+    ) -> Response:
+        """Send a GET request through the cache.
+
+        Args:
+            url: The url of the request, including any query parameters.
+            headers: Headers of the request.
+            send: A function that sends the request with the given headers
+                and returns the response.
+        Returns:
+            the response, which is the cached response if the server
+            responded with ``304 Not Modified``.
+        """
+        key = self._key(url, headers)
+        entry = self._read(key)
+        headers = dict(headers)
+        if entry:
+            if entry["headers"].get("etag"):
+                headers["If-None-Match"] = entry["headers"]["etag"]
+            if entry["headers"].get("last-modified"):
+                headers["If-Modified-Since"] = entry["headers"][
+                    "last-modified"
+                ]
+
+        status, response_headers, body = send(headers)
+        response_headers = {k.lower(): v for k, v in response_headers.items()}
+        if status == 304 and entry:
+            self._count(hit=True)
+            self._touch_entry(key)
+            return (
+                entry["status"],
+                dict(entry["headers"], **response_headers),
+                entry["body"],
+            )
+
+        self._count(hit=False)
+        if status == 200 and (
+            "etag" in response_headers or "last-modified" in response_headers
+        ):
+            if isinstance(body, bytes):
+                body = body.decode("utf8")
+            self._grow(
+                self._write_entry(
+                    key,
+                    json.dumps(
+                        dict(
+                            status=status, headers=response_headers, body=body
+                        )
+                    ),
+                )
+            )
+        return status, response_headers, body
+
+    def _count(self, hit: bool) -> None:
+        global _total_hits, _total_misses
+        with _stats_lock:
+            if hit:
+                self.hits += 1
+                _total_hits += 1
+            else:
+                self.misses += 1
+                _total_misses += 1
+
+    def _key(self, url: str, headers: Mapping[str, str]) -> str:
+        lowercase_headers = {k.lower(): v for k, v in headers.items()}
+        key_headers = [lowercase_headers.get(name) for name in _KEY_HEADERS]
+        return hashlib.sha256(
+            json.dumps([self._scope, url, key_headers]).encode("utf8")
+        ).hexdigest()
+
+    def _read(self, key: str) -> Optional[dict]:
+        try:
+            content = self._read_entry(key)
+            if content is None:
+                return None
+            entry = json.loads(content)
+            if not isinstance(entry["headers"], dict):
+                raise TypeError("headers must be a dict")
+            return entry
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            LOGGER.warning(
+                "Ignoring corrupt HTTP cache entry {}: {}".format(
+                    self._entry_path(key), exc
+                )
+            )
+            return None
@@ -0,0 +1,151 @@
+"""Journals of completed steps in long-running commands.
+
+.. module:: journal
+    :synopsis: Append-only journals that let interrupted commands resume where
+        they left off.
+
+.. moduleauthor:: Simon Larsén
+"""
+import hashlib
+import json
+import os
+import pathlib
+import time
+from typing import Iterable, Mapping, Dict, Any
+
+import daiquiri
+
+from _repobee import constants
+
+LOGGER = daiquiri.getLogger(__file__)
+
+
+class Journal:
+    """An append-only journal of the steps that a command has completed. Each
+    step is recorded as a line of JSON, and is flushed to the operating system
+    before :py:meth:`record` returns, so a journal survives the command
+    crashing or being interrupted at any point. Syncing to disk is slow, so
+    the journal is only fsync'd at most once per SYNC_INTERVAL seconds and
+    when :py:meth:`sync` is called, and records made since the last sync may
+    be lost if the operating system crashes. A partially written last line
+    is discarded when the journal is resumed.
+
+    Secure tokens must never be recorded, so repos are recorded by name and
+    not by URL.
+    """
+
+    TEAM_ENSURED = "team-ensured"
+    REPO_CREATED = "repo-created"
+    PUSH_SUCCEEDED = "push-succeeded"
+
+    # in seconds
+    SYNC_INTERVAL = 1.0
+
+    def __init__(self, path: pathlib.Path, resume: bool = False):
+        """
+        Args:
+            path: Path to the journal file.
+            resume: If True, the steps in an existing journal at path are
+                considered completed. Otherwise, any existing journal is
+                discarded.
+        """
+        self.path = path
+        self._completed = {}
+        self._last_sync = time.monotonic()
+        self._unsynced = False
+        if resume:
+            self._load()
+        elif path.exists():
+            path.unlink()
+
+    @classmethod
+    def for_command(
+        cls, command: str, arguments: Iterable[str], resume: bool = False
+    ) -> "Journal":
+        """Return the journal for a command invoked with the given arguments.
+        The journal is located in :py:const:`constants.JOURNAL_DIR`, and its
+        name is derived from a digest of the arguments, such that the same
+        invocation always maps to the same journal.
+
+        Args:
+            command: Name of the command.
+            arguments: Arguments that identify the invocation of the command.
+                The order of the arguments does not matter.
+            resume: See :py:meth:`__init__`.
+        Returns:
+            a journal for the command.
+        """
+        digest = hashlib.sha1(
+            "\n".join(sorted(arguments)).encode("utf8")
+        ).hexdigest()
+        path = constants.JOURNAL_DIR / "{}-{}.jsonl".format(command, digest)
+        journal = cls(path, resume=resume)
+        if resume and not journal._completed:
+            LOGGER.info("No journal to resume from, starting from scratch")
+        return journal
+
+    def completed(self, step: str) -> Mapping[str, Dict[str, Any]]:
+        """Return the completed instances of the step.
+
+        Args:
+            step: Name of a step.
+        Returns:
+            a mapping from the key of each completed instance of the step to
+            the data recorded with it.
+        """
+        return dict(self._completed.get(step, {}))
+
+    def record(self, step: str, key: str, **data: Any) -> None:
+        """Record that an instance of a step has been completed.
+
+        Args:
+            step: Name of the step.
+            key: A key that identifies the instance of the step, e.g. the name
+                of a repo.
+            data: Additional data about the step. Must be JSON serializable.
+        """
+        line = json.dumps(dict(step=step, key=key, data=data))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self.path), mode="a", encoding="utf8") as file:
+            file.write(line + "\n")
+            file.flush()
+            self._unsynced = True
+            if time.monotonic() - self._last_sync >= self.SYNC_INTERVAL:
+                self._sync(file)
+        self._completed.setdefault(step, {})[key] = data
+
+    def sync(self) -> None:
+        """Sync all recorded steps to disk."""
+        if self._unsynced and self.path.exists():
+            with open(str(self.path), mode="a", encoding="utf8") as file:
+                self._sync(file)
+
+    def _sync(self, file) -> None:
+        os.fsync(file.fileno())
+        self._last_sync = time.monotonic()
+        self._unsynced = False
+
+    def remove(self) -> None:
+        """Remove the journal from disk."""
+        if self.path.exists():
+            self.path.unlink()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        content = self.path.read_text(encoding="utf8")
+        if content and not content.endswith("\n"):
+            # the last line was only partially written, so cut it off to
+            # allow appending to the journal
+            content = content[: content.rfind("\n") + 1]
+            self.path.write_text(content, encoding="utf8")
+
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                LOGGER.warning("Ignoring corrupt line in {}".format(self.path))
+                continue
+            self._completed.setdefault(entry["step"], {})[entry["key"]] = (
+                entry["data"]
+            )
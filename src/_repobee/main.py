@@ -18,6 +18,8 @@ import _repobee.cli.preparser
 from _repobee import plugin
 from _repobee import exception
 from _repobee import config
+from _repobee import git
+from _repobee import httpcache
 from _repobee.cli.preparser import separate_args
 
 LOGGER = daiquiri.getLogger(__file__)
@@ -60,6 +62,7 @@ def main(sys_args: List[str]):
             plugin.initialize_plugins(plugin_names, allow_filepath=True)
 
         config.execute_config_hooks(config_file)
+        git.configure(**config.get_git_settings(config_file))
         ext_commands = plug.manager.hook.create_extension_command()
         parsed_args, api = _repobee.cli.parsing.handle_args(
             app_args,
@@ -94,6 +97,7 @@ def main(sys_args: List[str]):
             LOGGER.error("{.__class__.__name__}: {}".format(exc, str(exc)))
         sys.exit(1)
     finally:
+        httpcache.log_stats()
         plugin.unregister_all_plugins()
 
 
@@ -9,22 +9,39 @@ Module containing plugin system utility functions and classes.
 """
 import collections
 import contextlib
-import shutil
-import tempfile
 import pkgutil
 import pathlib
 import importlib
 import hashlib
+import multiprocessing
+import multiprocessing.pool
 import os
+import pickle
+import queue
 import sys
+import threading
+import time
 from types import ModuleType
-from typing import List, Optional, Iterable, Mapping, Union
+from typing import (
+    List,
+    Optional,
+    Iterable,
+    Iterator,
+    Mapping,
+    Union,
+    Dict,
+    Tuple,
+    Callable,
+)
 
 import daiquiri
 
 import _repobee
 import _repobee.ext.defaults
 from _repobee import exception
+from _repobee import snapshot
+from _repobee import taskcache
+from _repobee import util
 
 import repobee_plug as plug
 
@@ -362,7 +379,12 @@ def get_module_names(pkg: ModuleType) -> List[str]:
 
 
 def execute_clone_tasks(
-    repo_names: List[str], api: plug.API, cwd: Optional[pathlib.Path] = None
+    repo_names: List[str],
+    api: plug.API,
+    cwd: Optional[pathlib.Path] = None,
+    jobs: int = 1,
+    cache: Optional[taskcache.TaskCache] = None,
+    on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
 ) -> Mapping[str, List[plug.Result]]:
     """Execute clone tasks, if there are any, and return the results.
 
@@ -370,15 +392,55 @@ def execute_clone_tasks(
         repo_names: Names of the repositories to execute clone tasks on.
         api: An instance of the platform API.
         cwd: Directory in which to find the repos.
+        jobs: Amount of processes to execute the tasks in. See
+            :py:func:`_execute_tasks`.
+        cache: An optional cache of task results to look up results in and
+            store results to.
+        on_results: An optional callback that is called with the name and
+            results of each repo as soon as they are available.
     Returns:
         A mapping from repo name to hook result.
     """
     tasks = plug.manager.hook.clone_task()
-    return _execute_tasks(repo_names, tasks, api, cwd)
+    return _execute_tasks(repo_names, tasks, api, cwd, jobs, cache, on_results)
+
+
+def clone_task_pipeline(
+    api: plug.API,
+    cwd: Optional[pathlib.Path] = None,
+    jobs: int = 1,
+    cache: Optional[taskcache.TaskCache] = None,
+    on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
+) -> "TaskPipeline":
+    """Return a pipeline that executes clone tasks on repos as they are handed
+    over to it. See :py:func:`execute_clone_tasks` for the arguments.
+
+    Returns:
+        A :py:class:`TaskPipeline` for the clone tasks.
+    """
+    return TaskPipeline(
+        plug.manager.hook.clone_task(), api, cwd, jobs, cache, on_results
+    )
+
+
+def clone_tasks_require_full_history() -> bool:
+    """Check if any clone task requires the full history of the repos it acts
+    upon.
+
+    Returns:
+        True if any clone task requires full history.
+    """
+    return any(
+        task.requires_full_history for task in plug.manager.hook.clone_task()
+    )
 
 
 def execute_setup_tasks(
-    repo_names: List[str], api: plug.API, cwd: Optional[pathlib.Path] = None
+    repo_names: List[str],
+    api: plug.API,
+    cwd: Optional[pathlib.Path] = None,
+    jobs: int = 1,
+    on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
 ) -> Mapping[str, List[plug.Result]]:
     """Execute setup tasks, if there are any, and return the results.
 
@@ -386,11 +448,272 @@ def execute_setup_tasks(
         repo_names: Names of the repositories to execute setup tasks on.
         api: An instance of the platform API.
         cwd: Directory in which to find the repos.
+        jobs: Amount of processes to execute the tasks in. See
+            :py:func:`_execute_tasks`.
+        on_results: An optional callback that is called with the name and
+            results of each repo as soon as they are available.
     Returns:
         A mapping from repo name to hook result.
     """
     tasks = plug.manager.hook.setup_task()
-    return _execute_tasks(repo_names, tasks, api, cwd)
+    return _execute_tasks(
+        repo_names, tasks, api, cwd, jobs, on_results=on_results
+    )
+
+
+class TaskPipeline:
+    """Executes tasks on repos as soon as the repos are handed over to it with
+    :py:meth:`put`. Handing over a repo only puts it on a bounded queue, from
+    which a consumer thread takes the repos one at a time, looks up their
+    cached results and snapshots them. If jobs is 1, the consumer thread then
+    executes the tasks on each repo in this process, like
+    :py:func:`_execute_tasks` does. Otherwise, it submits the parallel safe
+    tasks to a pool of worker processes without waiting for them, and
+    collects their outcomes whenever it takes another repo and when the
+    pipeline is exited. Tasks that can't be executed in the worker processes
+    are executed in this process when the pipeline is exited.
+
+    If the queue is full, handing over a repo blocks until the consumer
+    thread has taken a repo from it, so repos are not handed over faster than
+    tasks can be executed on them.
+
+    The pipeline must be used as a context manager. Exiting the context waits
+    for tasks to be executed on all repos that were handed over, and then
+    raises the first exception raised by a task, after which tasks are not
+    executed on any more repos. If the context is exited with an exception,
+    tasks that have not yet been executed are abandoned.
+    """
+
+    # the amount of repos that may wait to be taken by the consumer thread
+    QUEUE_SIZE = 16
+
+    def __init__(
+        self,
+        tasks: Iterable[plug.Task],
+        api: plug.API,
+        cwd: Optional[pathlib.Path] = None,
+        jobs: int = 1,
+        cache: Optional[taskcache.TaskCache] = None,
+        on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
+    ):
+        """
+        Args:
+            tasks: The tasks to execute.
+            api: An instance of the platform API.
+            cwd: Directory in which to find the repos.
+            jobs: Amount of worker processes to execute the tasks in. If 1,
+                the tasks are executed in this process.
+            cache: An optional cache of task results.
+            on_results: An optional callback that is called with the name and
+                results of each repo as soon as they are available. It is
+                called from the consumer thread.
+        """
+        self.results = {}
+        self._tasks = list(tasks)
+        self._task_ids = [task_id(task) for task in self._tasks]
+        self._api = api
+        self._cwd = cwd or pathlib.Path(".")
+        self._jobs = jobs
+        self._cache = cache
+        self._on_results = on_results
+        self._error = None
+        self._abandoned = False
+        self._pool = None
+        self._scratch_dir = None
+        self._copies_root = None
+        self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._consumer = None
+        # repo path -> (snapshot path, task outcomes so far, cached task
+        # outcomes, async results)
+        self._in_progress = collections.OrderedDict()
+        self._executed = {}
+        self._executed_paths = []
+
+    def put(self, repo_name: str) -> None:
+        """Hand over a repo. Returns without waiting for any tasks to be
+        executed, but blocks while the queue of handed over repos is full.
+
+        Args:
+            repo_name: Name of the repo.
+        """
+        if self._tasks:
+            self._queue.put(repo_name)
+
+    def __enter__(self) -> "TaskPipeline":
+        if self._tasks:
+            self._scratch_dir = util.scratch_dir("tasks", self._cwd)
+            self._copies_root = self._scratch_dir.__enter__()
+            if self._jobs > 1:
+                self._pool = _TaskPool(self._tasks, self._api, self._jobs)
+            self._consumer = threading.Thread(
+                target=self._consume, name="task-pipeline", daemon=True
+            )
+            self._consumer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if self._consumer is not None:
+                self._abandoned = exc_type is not None
+                self._queue.put(None)
+                self._consumer.join()
+            if exc_type is None:
+                self._collect(wait=True)
+                self._execute_remaining()
+                if self._cache and self._executed:
+                    self._cache.store(
+                        self._executed_paths, self._task_ids, self._executed
+                    )
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+            if self._scratch_dir is not None:
+                self._scratch_dir.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and self._error is not None:
+            raise self._error
+
+    def _consume(self) -> None:
+        """Process the handed over repos until the pipeline is exited.
+        Executed in the consumer thread.
+        """
+        while True:
+            repo_name = self._queue.get()
+            if repo_name is None:
+                return
+            if self._abandoned or self._error is not None:
+                continue
+            try:
+                self._process(repo_name)
+            except Exception as exc:
+                self._error = exc
+
+    def _process(self, repo_name: str) -> None:
+        """Look up the cached results of a repo and snapshot it, and then
+        execute its tasks in this process or submit them to the worker
+        processes.
+        """
+        if self._pool is not None:
+            self._collect(wait=False)
+            if self._error is not None:
+                return
+
+        path = (self._cwd / repo_name).absolute()
+        outcomes = (
+            self._cache.lookup([path], self._task_ids) if self._cache else {}
+        )
+        if len(outcomes) == len(self._tasks):
+            self._report(path.name, outcomes)
+            return
+
+        copy = self._copies_root / path.name
+        snapshot.create(path, copy)
+        async_results = (
+            {
+                index: self._pool.submit(index, copy)
+                for index in range(len(self._tasks))
+                if (path.name, index) not in outcomes
+                and index in self._pool.task_indices
+            }
+            if self._pool is not None
+            else {}
+        )
+        self._in_progress[path] = (
+            copy,
+            outcomes,
+            set(outcomes),
+            async_results,
+        )
+        if self._pool is None:
+            self._execute_in_process(path)
+
+    def _collect(self, wait: bool) -> None:
+        """Collect the outcomes of tasks executed in the worker processes,
+        and report the results of repos on which all tasks have been
+        executed. If wait is False, only outcomes that are ready are
+        collected.
+        """
+        for path, (_, outcomes, _, async_results) in list(
+            self._in_progress.items()
+        ):
+            for index, async_result in list(async_results.items()):
+                if not wait and not async_result.ready():
+                    continue
+                del async_results[index]
+                try:
+                    executed, outcome = _get_worker_outcome(
+                        self._tasks[index], async_result
+                    )
+                except plug.PlugError as exc:
+                    self._error = self._error or exc
+                    continue
+                if executed:
+                    outcomes[path.name, index] = outcome
+            if self._error is None and len(outcomes) == len(self._tasks):
+                self._finish(path, outcomes)
+
+    def _execute_remaining(self) -> None:
+        """Execute the tasks that could not be executed in the worker
+        processes.
+        """
+        for path in list(self._in_progress):
+            if self._error is not None:
+                return
+            self._execute_in_process(path)
+
+    def _execute_in_process(self, path: pathlib.Path) -> None:
+        """Execute the tasks that have no outcome yet on a repo in this
+        process, and report its results.
+        """
+        copy, outcomes, _, _ = self._in_progress[path]
+        LOGGER.info("Processing {}".format(path.name))
+        for index, task in enumerate(self._tasks):
+            if (path.name, index) in outcomes:
+                continue
+            try:
+                with _convert_task_exceptions(task):
+                    outcomes[path.name, index] = task.act(copy, self._api)
+            except plug.PlugError as exc:
+                self._error = exc
+                return
+        self._finish(path, outcomes)
+
+    def _finish(
+        self,
+        path: pathlib.Path,
+        outcomes: Dict[Tuple[str, int], Optional[plug.Result]],
+    ) -> None:
+        _, _, cached, _ = self._in_progress.pop(path)
+        self._executed.update(
+            (key, outcome)
+            for key, outcome in outcomes.items()
+            if key not in cached
+        )
+        self._executed_paths.append(path)
+        self._report(path.name, outcomes)
+
+    def _report(
+        self,
+        repo_name: str,
+        outcomes: Dict[Tuple[str, int], Optional[plug.Result]],
+    ) -> None:
+        results = _ordered_results(repo_name, len(self._tasks), outcomes)
+        if results:
+            self.results[repo_name] = results
+        if self._on_results:
+            self._on_results(repo_name, results)
+
+
+def _ordered_results(
+    repo_name: str,
+    num_tasks: int,
+    outcomes: Dict[Tuple[str, int], Optional[plug.Result]],
+) -> List[plug.Result]:
+    """Return the results of the tasks on a repo, ordered by task."""
+    return [
+        outcomes[repo_name, index]
+        for index in range(num_tasks)
+        if outcomes[repo_name, index]
+    ]
 
 
 def _execute_tasks(
@@ -398,32 +721,319 @@ def _execute_tasks(
     tasks: Iterable[plug.Task],
     api: plug.API,
     cwd: Optional[pathlib.Path],
+    jobs: int = 1,
+    cache: Optional[taskcache.TaskCache] = None,
+    on_results: Optional[Callable[[str, List[plug.Result]], None]] = None,
 ) -> Mapping[str, List[plug.Result]]:
-    """Execute plugin tasks on the provided repos."""
+    """Execute plugin tasks on the provided repos. If jobs is greater than 1,
+    each task that is parallel safe is executed on each repo in a pool of that
+    many processes, and the remaining tasks are executed one at a time
+    afterwards. The results for each repo are ordered by task regardless. If
+    a cache is given, tasks are only executed on repos for which the cache
+    does not have their results. If on_results is given, it is called with
+    the name and results of each repo as soon as all tasks have been executed
+    on it.
+    """
     if not tasks:
         return {}
+    tasks = list(tasks)
     cwd = cwd or pathlib.Path(".")
+    repo_names = set(repo_names)
     repo_paths = [f.absolute() for f in cwd.glob("*") if f.name in repo_names]
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        copies_root = pathlib.Path(tmpdir)
-        repo_copies = []
-        for path in repo_paths:
-            copy = copies_root / path.name
-            shutil.copytree(str(path), str(copy))
-            repo_copies.append(copy)
+    task_ids = [task_id(task) for task in tasks]
+    outcomes = cache.lookup(repo_paths, task_ids) if cache else {}
+    pending = [
+        (path, index)
+        for path in repo_paths
+        for index in range(len(tasks))
+        if (path.name, index) not in outcomes
+    ]
+
+    results = collections.defaultdict(list)
+
+    def _add_results(repo_name: str) -> None:
+        results[repo_name] = _ordered_results(repo_name, len(tasks), outcomes)
+        if on_results:
+            on_results(repo_name, results[repo_name])
+
+    pending_repo_names = set(path.name for path, _ in pending)
+    for path in repo_paths:
+        if path.name not in pending_repo_names:
+            _add_results(path.name)
+
+    executed = {}
+    for repo_name, repo_outcomes in _execute_pending_tasks(
+        pending, tasks, api, cwd, jobs
+    ):
+        executed.update(repo_outcomes)
+        outcomes.update(repo_outcomes)
+        _add_results(repo_name)
+    if cache and executed:
+        cache.store(repo_paths, task_ids, executed)
+
+    return {
+        path.name: results[path.name]
+        for path in repo_paths
+        if results[path.name]
+    }
+
+
+def task_id(task: plug.Task) -> Optional[str]:
+    """Return a string that identifies the task and the version of the plugin
+    that defines it.
+
+    Args:
+        task: A task.
+    Returns:
+        the identity of the task, or None if the version of its plugin can't
+        be resolved.
+    """
+    module = sys.modules.get(task.act.__module__)
+    if module is None:
+        return None
+    version = (
+        resolve_plugin_version(module)
+        if module.__package__
+        else getattr(module, "__version__", None)
+    )
+    if version is None:
+        return None
+    return "{}.{}@{}".format(
+        task.act.__module__, task.act.__qualname__, version
+    )
+
+
+def _execute_pending_tasks(
+    pending: List[Tuple[pathlib.Path, int]],
+    tasks: List[plug.Task],
+    api: plug.API,
+    cwd: pathlib.Path,
+    jobs: int,
+) -> Iterator[Tuple[str, Dict[Tuple[str, int], Optional[plug.Result]]]]:
+    """Execute each task on a snapshot of each repo, as given by the pending
+    (repo path, task index) pairs. Yields the name of each repo along with
+    the outcomes of its tasks as soon as all of its pending tasks have been
+    executed.
+    """
+    if not pending:
+        return
+    # the snapshots are put on the same filesystem as the repos, so they can
+    # share data with them
+    with util.scratch_dir("tasks", cwd) as copies_root:
+        repo_copies = {}
+        strategies = collections.Counter()
+        start = time.monotonic()
+        for path, _ in pending:
+            if path not in repo_copies:
+                copy = copies_root / path.name
+                strategies[snapshot.create(path, copy)] += 1
+                repo_copies[path] = copy
+        LOGGER.info(
+            "Snapshotted {} repos in {:.2f}s ({})".format(
+                len(repo_copies),
+                time.monotonic() - start,
+                ", ".join(
+                    "{} {}".format(count, strategy.value)
+                    for strategy, count in strategies.items()
+                ),
+            )
+        )
+        pending = [(repo_copies[path], index) for path, index in pending]
 
         LOGGER.info("Executing tasks ...")
-        results = collections.defaultdict(list)
-        for path in repo_copies:
+        if jobs > 1:
+            yield from _execute_tasks_in_parallel(pending, tasks, api, jobs)
+            return
+
+        for path, indices in _group_by_path(pending):
             LOGGER.info("Processing {}".format(path.name))
+            outcomes = {}
+            for index in indices:
+                with _convert_task_exceptions(tasks[index]):
+                    outcomes[path.name, index] = tasks[index].act(path, api)
+            yield path.name, outcomes
+
+
+def _group_by_path(
+    pending: List[Tuple[pathlib.Path, int]],
+) -> List[Tuple[pathlib.Path, List[int]]]:
+    """Group (repo path, task index) pairs by repo path, in order."""
+    groups = collections.OrderedDict()
+    for path, index in pending:
+        groups.setdefault(path, []).append(index)
+    return list(groups.items())
+
+
+def _execute_tasks_in_parallel(
+    pending: List[Tuple[pathlib.Path, int]],
+    tasks: List[plug.Task],
+    api: plug.API,
+    jobs: int,
+) -> Iterator[Tuple[str, Dict[Tuple[str, int], Optional[plug.Result]]]]:
+    """Execute the tasks that can be executed in a pool of worker processes
+    there, and then the rest of the tasks in this process. Outcomes are
+    yielded like by :py:func:`_execute_pending_tasks`.
+    """
+    with _TaskPool(tasks, api, jobs) as pool:
+        async_results = {
+            (path, index): pool.submit(index, path)
+            for path, index in pending
+            if index in pool.task_indices
+        }
+        LOGGER.info(
+            "Executing {} of {} tasks in {} processes".format(
+                len(async_results), len(pending), jobs
+            )
+        )
+        deferred = []
+        for path, indices in _group_by_path(pending):
+            outcomes = {}
+            for index in indices:
+                if (path, index) not in async_results:
+                    continue
+                executed, outcome = _get_worker_outcome(
+                    tasks[index], async_results[path, index]
+                )
+                if executed:
+                    outcomes[path.name, index] = outcome
+            if len(outcomes) == len(indices):
+                yield path.name, outcomes
+            else:
+                deferred.append((path, indices, outcomes))
+
+    for path, indices, outcomes in deferred:
+        for index in indices:
+            if (path.name, index) not in outcomes:
+                with _convert_task_exceptions(tasks[index]):
+                    outcomes[path.name, index] = tasks[index].act(path, api)
+        yield path.name, outcomes
+
+
+def _get_worker_outcome(
+    task: plug.Task, async_result: multiprocessing.pool.AsyncResult
+) -> Tuple[bool, Optional[plug.Result]]:
+    """Wait for the outcome of a task that was submitted to a
+    :py:class:`_TaskPool`. Returns whether the task was executed in the
+    worker process along with its outcome. If it was not, it must be executed
+    in this process instead.
+    """
+    with _convert_task_exceptions(task):
+        try:
+            return True, async_result.get()
+        except _TransferError as exc:
+            LOGGER.info(
+                "Can't execute a task from the module '{}' in a worker "
+                "process, executing it in this process: {}".format(
+                    task.act.__module__, exc
+                )
+            )
+            return False, None
 
-            for task in tasks:
-                with _convert_task_exceptions(task):
-                    res = task.act(path, api)
-                if res:
-                    results[path.name].append(res)
-    return results
+
+class _TaskPool:
+    """A pool of worker processes that execute parallel safe tasks. The
+    workers are started fresh instead of being forked, so they share no state
+    with this process. The tasks' act callbacks and the API instance are
+    instead sent to the workers pickled, and an API instance is re-created in
+    each worker (see :py:meth:`repobee_plug.API.__reduce__`). Tasks that can't
+    be pickled are not executed in the pool, and neither is any task if the
+    API instance can't be pickled.
+    """
+
+    def __init__(self, tasks: List[plug.Task], api: plug.API, jobs: int):
+        """
+        Args:
+            tasks: The tasks to execute.
+            api: An instance of the platform API.
+            jobs: Amount of worker processes.
+        """
+        pickled_api = _try_pickle(api)
+        acts = {}
+        if pickled_api is not None:
+            for index, task in enumerate(tasks):
+                pickled_act = task.parallel_safe and _try_pickle(task.act)
+                if pickled_act:
+                    acts[index] = pickled_act
+        self.task_indices = frozenset(acts)
+        self._pool = None
+        if acts:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            self._pool = context.Pool(
+                processes=jobs,
+                initializer=_init_task_worker,
+                initargs=(acts, pickled_api),
+            )
+
+    def submit(
+        self, task_index: int, path: pathlib.Path
+    ) -> multiprocessing.pool.AsyncResult:
+        """Execute a task on a repo in a worker process.
+
+        Args:
+            task_index: Index of a task in :py:attr:`task_indices`.
+            path: Path to the repo.
+        Returns:
+            the eventual outcome of the task. Getting it raises
+            :py:class:`_TransferError` if the task could not be executed in
+            the worker process.
+        """
+        return self._pool.apply_async(_act_in_worker, (task_index, path))
+
+    def close(self) -> None:
+        """Terminate the worker processes."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+
+    def __enter__(self) -> "_TaskPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+class _TransferError(Exception):
+    """Raised in a worker process when a task or the API instance can't be
+    unpickled there.
+    """
+
+
+def _try_pickle(obj: object) -> Optional[bytes]:
+    try:
+        return pickle.dumps(obj)
+    except Exception as exc:
+        LOGGER.debug("Can't pickle {!r}: {}".format(obj, exc))
+        return None
+
+
+# the pickled act callbacks and API instance of a worker process in a task
+# pool, and the ones that have been unpickled so far
+_WORKER_STATE = None
+
+
+def _init_task_worker(acts: Dict[int, bytes], api: bytes) -> None:
+    global _WORKER_STATE
+    _WORKER_STATE = (acts, api, {})
+
+
+def _act_in_worker(
+    task_index: int, path: pathlib.Path
+) -> Optional[plug.Result]:
+    acts, api, unpickled = _WORKER_STATE
+    try:
+        # the API instance is created lazily, as creating it may require
+        # network requests
+        if "api" not in unpickled:
+            unpickled["api"] = pickle.loads(api)
+        if task_index not in unpickled:
+            unpickled[task_index] = pickle.loads(acts[task_index])
+    except Exception as exc:
+        raise _TransferError(str(exc)) from None
+    return unpickled[task_index](path, unpickled["api"])
 
 
 @contextlib.contextmanager
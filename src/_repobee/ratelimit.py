@@ -0,0 +1,253 @@
+"""Pacing of requests to the REST APIs of hosting platforms.
+
+.. module:: ratelimit
+    :synopsis: A request pacer that keeps API requests within the rate limits
+        reported by GitHub and GitLab.
+
+.. moduleauthor:: Simon Larsén
+"""
+import datetime
+import threading
+import time
+from typing import Callable, Mapping, Optional
+
+import daiquiri
+
+LOGGER = daiquiri.getLogger(__file__)
+
+# requests are paced when less than this fraction of the rate limit remains
+DEFAULT_PACING_THRESHOLD = 0.2
+# minimum amount of seconds between requests that create or modify content,
+# after a secondary rate limit has been hit
+SECONDARY_LIMIT_INTERVAL = 1.0
+# amount of seconds to wait after hitting a rate limit that does not report
+# when it resets
+DEFAULT_RETRY_DELAY = 60.0
+# maximum amount of times to retry a rate limited request
+MAX_RETRIES = 5
+
+_SAFE_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+_SECONDARY_LIMIT_MESSAGES = ("secondary rate limit", "abuse detection")
+
+
+class RequestPacer:
+    """Paces requests so that the rate limit lasts until it resets. The
+    remaining requests and the reset time are read from the rate limit headers
+    of each response, which are ``X-RateLimit-*`` on GitHub and
+    ``RateLimit-*`` on GitLab. Requests are sent without delay until less
+    than a fraction of the limit remains, after which they are spread evenly
+    over the time until the reset. If the limit is exhausted anyway, requests
+    wait until the reset.
+
+    A rate limited response (429, or 403 with an exhausted limit or a
+    secondary rate limit message) is retried after the delay given by its
+    ``Retry-After`` header, or otherwise after the reset. The delay applies to
+    all requests, and not only to the one that was rate limited. At most
+    max_concurrent_writes requests that create or modify content are in
+    flight at once, as GitHub's secondary rate limits are mostly hit by
+    concurrent writes, and after a secondary rate limit has been hit, they
+    are also kept at least SECONDARY_LIMIT_INTERVAL seconds apart.
+
+    Only GitHub's core rate limit is paced, but requests that hit any of its
+    other limits (e.g. for GraphQL) are still retried. A pacer is thread
+    safe, and should be shared by all requests that count against the same
+    rate limit.
+    """
+
+    def __init__(
+        self,
+        pacing_threshold: float = DEFAULT_PACING_THRESHOLD,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+        max_concurrent_writes: int = 1,
+    ):
+        """
+        Args:
+            pacing_threshold: Requests are paced when less than this fraction
+                of the rate limit remains.
+            clock: A function that returns the current time in seconds since
+                the epoch.
+            sleep: A function that sleeps for the given amount of seconds.
+            max_concurrent_writes: Maximum amount of requests that create or
+                modify content to have in flight at once.
+        """
+        self.pacing_threshold = pacing_threshold
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # acquired while a request that creates or modifies content is in
+        # flight, but not while it waits to be sent or retried
+        self._write_slots = threading.BoundedSemaphore(max_concurrent_writes)
+        self._limit = None
+        self._remaining = None
+        self._reset = None
+        self._next_request = 0.0
+        # only used after a secondary rate limit has been hit
+        self._next_write = 0.0
+        self._pacing = False
+        self._secondary_limited = False
+
+    def send(
+        self,
+        method: str,
+        send: Callable[[], object],
+        inspect: Callable[[object], tuple],
+    ) -> object:
+        """Send a request when the rate limit allows it, and retry it if it
+        is rate limited.
+
+        Args:
+            method: The HTTP method of the request.
+            send: A function that sends the request and returns the response.
+            inspect: A function that takes a response and returns its status,
+                its headers and a message that may describe a rate limit.
+        Returns:
+            the response of the last attempt.
+        """
+        retries = 0
+        while True:
+            self.wait(method)
+            if method.upper() in _SAFE_METHODS:
+                response = send()
+            else:
+                with self._write_slots:
+                    response = send()
+            delay = self.update(*inspect(response))
+            if delay is None or retries == MAX_RETRIES:
+                return response
+            retries += 1
+            LOGGER.warning(
+                "Rate limited by the API, retrying in {:.0f} seconds".format(
+                    delay
+                )
+            )
+
+    def wait(self, method: str) -> None:
+        """Wait until the next request may be sent.
+
+        Args:
+            method: The HTTP method of the request.
+        """
+        with self._lock:
+            now = self._clock()
+            interval = self._interval(now)
+            start = max(now, self._next_request)
+            if self._remaining is not None and self._remaining <= 0:
+                if self._reset and self._reset > start:
+                    LOGGER.warning(
+                        "Rate limit exhausted, waiting until it resets at "
+                        "{}".format(_format_time(self._reset))
+                    )
+                    start = self._reset
+                self._remaining = None
+            elif self._remaining is not None:
+                self._remaining -= 1
+            self._next_request = start + interval
+            if self._secondary_limited and method.upper() not in _SAFE_METHODS:
+                start = max(start, self._next_write)
+                self._next_write = start + SECONDARY_LIMIT_INTERVAL
+
+        if start > now:
+            self._sleep(start - now)
+
+    def update(
+        self, status: int, headers: Mapping[str, str], message: str = ""
+    ) -> Optional[float]:
+        """Update the state of the rate limit from a response.
+
+        Args:
+            status: The status code of the response.
+            headers: The headers of the response.
+            message: The body of the response, or some part of it that may
+                describe a rate limit.
+        Returns:
+            the amount of seconds to wait before retrying the request if it
+            was rate limited, otherwise None.
+        """
+        headers = {key.lower(): value for key, value in headers.items()}
+        limit = _header_int(headers, "x-ratelimit-limit", "ratelimit-limit")
+        remaining = _header_int(
+            headers, "x-ratelimit-remaining", "ratelimit-remaining"
+        )
+        reset = _header_int(headers, "x-ratelimit-reset", "ratelimit-reset")
+        retry_after = _header_int(headers, "retry-after")
+
+        # GitHub has separate limits for e.g. search and GraphQL
+        resource = headers.get("x-ratelimit-resource", "core")
+
+        with self._lock:
+            now = self._clock()
+            if remaining is not None and resource == "core":
+                self._limit = limit
+                self._remaining = remaining
+                self._reset = reset
+
+            secondary = status == 403 and any(
+                msg in (message or "").lower()
+                for msg in _SECONDARY_LIMIT_MESSAGES
+            )
+            if secondary and not self._secondary_limited:
+                LOGGER.warning(
+                    "Hit a secondary rate limit, spacing out requests that "
+                    "create or modify content by {:.0f} seconds".format(
+                        SECONDARY_LIMIT_INTERVAL
+                    )
+                )
+                self._secondary_limited = True
+
+            limited = (
+                status == 429
+                or secondary
+                or (status == 403 and (remaining == 0 or retry_after))
+            )
+            if not limited:
+                return None
+            if retry_after is not None:
+                delay = float(retry_after)
+            elif reset is not None and reset > now:
+                delay = reset - now
+            else:
+                delay = DEFAULT_RETRY_DELAY
+            # the next call to wait sleeps until the delay has passed
+            self._next_request = max(self._next_request, now + delay)
+            self._remaining = None
+            return delay
+
+    def _interval(self, now: float) -> float:
+        """Return the amount of seconds to leave between requests, and log
+        when pacing starts or stops.
+        """
+        pacing = bool(
+            self._limit
+            and self._remaining
+            and self._reset
+            and self._reset > now
+            and self._remaining < self._limit * self.pacing_threshold
+        )
+        if pacing != self._pacing:
+            self._pacing = pacing
+            if pacing:
+                LOGGER.warning(
+                    "{} of {} API requests remain until the rate limit resets "
+                    "at {}, pacing requests".format(
+                        self._remaining,
+                        self._limit,
+                        _format_time(self._reset),
+                    )
+                )
+            else:
+                LOGGER.info("Stopped pacing API requests")
+        return (self._reset - now) / self._remaining if pacing else 0.0
+
+
+def _header_int(headers: Mapping[str, str], *names: str) -> Optional[int]:
+    for name in names:
+        try:
+            return int(headers[name])
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
@@ -0,0 +1,127 @@
+"""Snapshots of repositories for plugin tasks to act upon.
+
+.. module:: snapshot
+    :synopsis: Cheap copies of repositories that can be modified without
+        affecting the originals.
+
+.. moduleauthor:: Simon Larsén
+"""
+import enum
+import os
+import pathlib
+import re
+import shutil
+import sys
+import tempfile
+
+import daiquiri
+
+from _repobee import git
+
+LOGGER = daiquiri.getLogger(__file__)
+
+# names of the directories in a git object store that only contain object
+# files, which git never modifies after writing them
+_OBJECT_DIR_PATTERN = re.compile(r"^([0-9a-f]{2}|pack)$")
+
+# whether or not cp can make reflinks on a filesystem, by device id
+_REFLINK_SUPPORT = {}
+
+
+class Strategy(enum.Enum):
+    """Strategies for creating snapshots, from cheapest to most expensive."""
+
+    # copy-on-write copies of all files, which share data blocks with the
+    # originals until either is modified
+    REFLINK = "reflink"
+    # a copy of a git repository that shares its object files through
+    # hardlinks
+    HARDLINK = "hardlink"
+    # a full copy
+    COPY = "copy"
+
+
+def create(src: pathlib.Path, dst: pathlib.Path) -> Strategy:
+    """Create a snapshot of the directory at src. Modifying the snapshot never
+    affects the original. The cheapest applicable strategy is used:
+
+    1. :py:attr:`Strategy.REFLINK` if the filesystem supports reflinks (e.g.
+       Btrfs or XFS on Linux).
+    2. :py:attr:`Strategy.HARDLINK` if src is a git repository.
+    3. :py:attr:`Strategy.COPY` otherwise.
+
+    Args:
+        src: Path to the directory to snapshot.
+        dst: Path to put the snapshot at. Must not exist, and should be on the
+            same filesystem as src for the cheaper strategies to apply.
+    Returns:
+        the strategy that was used.
+    """
+    if _reflink_supported(dst.parent) and _reflink(src, dst):
+        return Strategy.REFLINK
+    if _hardlink(src, dst):
+        return Strategy.HARDLINK
+    shutil.copytree(str(src), str(dst), symlinks=True)
+    return Strategy.COPY
+
+
+def _reflink_supported(dirpath: pathlib.Path) -> bool:
+    """Check if cp can make reflinks in the directory, by trying to reflink a
+    file in it. The result is cached per filesystem.
+    """
+    device = dirpath.stat().st_dev
+    if device not in _REFLINK_SUPPORT:
+        with tempfile.TemporaryDirectory(dir=str(dirpath)) as tmpdir:
+            probe = pathlib.Path(tmpdir) / "probe"
+            probe.write_bytes(b"probe")
+            rc, _, _ = git.captured_run(
+                ["cp", "--reflink=always", str(probe), str(probe) + "-copy"]
+            )
+        _REFLINK_SUPPORT[device] = rc == 0
+        LOGGER.debug(
+            "Reflinks {}supported on device {}".format(
+                "" if rc == 0 else "not ", device
+            )
+        )
+    return _REFLINK_SUPPORT[device]
+
+
+def _reflink(src: pathlib.Path, dst: pathlib.Path) -> bool:
+    rc, _, stderr = git.captured_run(
+        ["cp", "-a", "--reflink=always", str(src), str(dst)]
+    )
+    if rc != 0:
+        LOGGER.debug(
+            "Failed to reflink {}: {}".format(
+                src, stderr.decode(sys.getdefaultencoding())
+            )
+        )
+        shutil.rmtree(str(dst), ignore_errors=True)
+    return rc == 0
+
+
+def _hardlink(src: pathlib.Path, dst: pathlib.Path) -> bool:
+    """Snapshot a git repository by copying it with all files in its object
+    store hardlinked instead of copied. git never modifies object files (it
+    only creates and deletes them), so sharing them is safe.
+    """
+    objects_dir = src / ".git" / "objects"
+    if not objects_dir.is_dir():
+        return False
+
+    def _link_objects(src_file: str, dst_file: str) -> None:
+        path = pathlib.Path(src_file)
+        if path.parent.parent == objects_dir and _OBJECT_DIR_PATTERN.match(
+            path.parent.name
+        ):
+            try:
+                os.link(src_file, dst_file)
+                return
+            except OSError:  # e.g. if dst is on another filesystem
+                pass
+        shutil.copy2(src_file, dst_file)
+
+    shutil.copytree(
+        str(src), str(dst), symlinks=True, copy_function=_link_objects
+    )
+    return True
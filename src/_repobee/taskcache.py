@@ -0,0 +1,170 @@
+"""Persistent cache of plugin task results.
+
+.. module:: taskcache
+    :synopsis: On-disk cache of task results for repos that have not changed
+        since the tasks last acted on them.
+
+.. moduleauthor:: Simon Larsén
+"""
+import hashlib
+import json
+import pathlib
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import daiquiri
+
+import repobee_plug as plug
+
+from _repobee import diskcache
+from _repobee import git
+
+LOGGER = daiquiri.getLogger(__file__)
+
+# default maximum size of the cache in megabytes
+DEFAULT_TASK_CACHE_SIZE = 100
+
+
+class TaskCache(diskcache.DiskCache):
+    """An on-disk cache of task results. A result is keyed by the name of the
+    repo that the task acted upon and the tree that its HEAD pointed to, the
+    identity of the task (including the version of its plugin), and a digest
+    of the configuration that the task was executed with. Results are only
+    cached for repos with clean working trees, and results with status
+    :py:attr:`repobee_plug.Status.ERROR` are never cached, as they may be
+    caused by transient problems.
+
+    See :py:class:`~_repobee.diskcache.DiskCache` for how entries are stored
+    and evicted.
+    """
+
+    DESCRIPTION = "task cache"
+
+    def __init__(
+        self,
+        root: pathlib.Path,
+        config_digest: str,
+        max_size: int = DEFAULT_TASK_CACHE_SIZE,
+    ):
+        """
+        Args:
+            root: Directory to put the cache in.
+            config_digest: A digest of all configuration that may affect the
+                results of the tasks.
+            max_size: Maximum size of the cache in megabytes.
+        """
+        super().__init__(root, max_size)
+        self.config_digest = config_digest
+        self._trees = {}
+
+    def lookup(
+        self, repo_paths: List[pathlib.Path], task_ids: List[Optional[str]]
+    ) -> Dict[Tuple[str, int], Optional[plug.Result]]:
+        """Look up cached results.
+
+        Args:
+            repo_paths: Paths to repos.
+            task_ids: Identities of tasks, as returned by
+                :py:func:`_repobee.plugin.task_id`. None for tasks that
+                can't be cached.
+        Returns:
+            a mapping from (repo name, index of task in task_ids) to the
+            cached result, for all cached results.
+        """
+        hits = {}
+        for (path, index), key in self._keys(repo_paths, task_ids).items():
+            try:
+                content = self._read_entry(key)
+                if content is None:
+                    continue
+                hits[path.name, index] = _deserialize(content)
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                LOGGER.warning(
+                    "Ignoring corrupt task cache entry {}: {}".format(
+                        self._entry_path(key), exc
+                    )
+                )
+                continue
+            self._touch_entry(key)
+        LOGGER.info("Found {} cached task results".format(len(hits)))
+        return hits
+
+    def store(
+        self,
+        repo_paths: List[pathlib.Path],
+        task_ids: List[Optional[str]],
+        outcomes: Mapping[Tuple[str, int], Optional[plug.Result]],
+    ) -> None:
+        """Store results in the cache, and then evict the least recently used
+        entries if the cache has grown beyond its size limit.
+
+        Args:
+            repo_paths: Paths to repos.
+            task_ids: Identities of tasks, see :py:meth:`lookup`.
+            outcomes: A mapping from (repo name, index of task in task_ids) to
+                the result of executing the task on the repo.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for (path, index), key in self._keys(repo_paths, task_ids).items():
+            if (path.name, index) not in outcomes:
+                continue
+            result = outcomes[path.name, index]
+            if result and result.status == plug.Status.ERROR:
+                continue
+            try:
+                content = _serialize(result)
+            except (TypeError, ValueError):
+                LOGGER.debug(
+                    "Result of {} on {} is not JSON serializable".format(
+                        task_ids[index], path.name
+                    )
+                )
+                continue
+            written += self._write_entry(key, content)
+        if written:
+            self._grow(written)
+
+    def _keys(
+        self, repo_paths: List[pathlib.Path], task_ids: List[Optional[str]]
+    ) -> Dict[Tuple[pathlib.Path, int], str]:
+        keys = {}
+        for path in repo_paths:
+            if path not in self._trees:
+                self._trees[path] = git.clean_tree(str(path))
+            tree = self._trees[path]
+            if tree is None:
+                continue
+            for index, task_id in enumerate(task_ids):
+                if task_id is None:
+                    continue
+                keys[path, index] = hashlib.sha256(
+                    json.dumps(
+                        [path.name, tree, task_id, self.config_digest]
+                    ).encode("utf8")
+                ).hexdigest()
+        return keys
+
+
+def _serialize(result: Optional[plug.Result]) -> str:
+    if result is None:
+        return json.dumps(None)
+    return json.dumps(
+        dict(
+            name=result.name,
+            status=result.status.value,
+            msg=result.msg,
+            data=result.data,
+        )
+    )
+
+
+def _deserialize(content: str) -> Optional[plug.Result]:
+    result = json.loads(content)
+    if result is None:
+        return None
+    return plug.Result(
+        name=result["name"],
+        status=plug.Status(result["status"]),
+        msg=result["msg"],
+        data=result["data"],
+    )
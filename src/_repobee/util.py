@@ -6,17 +6,33 @@
 
 .. moduleauthor:: Simon Larsén
 """
+import contextlib
+import fcntl
 import os
 import sys
 import pathlib
 import shutil
 import tempfile
-from typing import Iterable, Generator, Union, Callable, TypeVar
+import urllib.parse
+from typing import (
+    Iterable,
+    Generator,
+    Iterator,
+    Optional,
+    Union,
+    Callable,
+    TypeVar,
+)
 
 import repobee_plug as plug
 
+from _repobee import constants
+
 T = TypeVar("T")
 
+SCRATCH_DIR_PREFIX = ".repobee-"
+_SCRATCH_LOCK_SUFFIX = ".lock"
+
 
 def read_issue(issue_path: str) -> plug.Issue:
     """Attempt to read an issue from a textfile. The first line of the file
@@ -54,6 +70,22 @@ def is_git_repo(path: str) -> bool:
     return os.path.isdir(path) and ".git" in os.listdir(path)
 
 
+def local_repo_path(repo_url: str) -> Optional[pathlib.Path]:
+    """Get the path to the local repo that a file url points to.
+
+    Args:
+        repo_url: A url to a repo.
+    Returns:
+        the path to the local repo, or None if the url is not a file url or
+        does not point to a git repo.
+    """
+    parsed = urllib.parse.urlparse(repo_url)
+    if parsed.scheme != "file":
+        return None
+    path = pathlib.Path(urllib.parse.unquote(parsed.path))
+    return path if is_git_repo(str(path)) else None
+
+
 def _ends_with_ext(
     path: Union[str, pathlib.Path], extensions: Iterable[str]
 ) -> bool:
@@ -82,20 +114,138 @@ def find_files_by_extension(
 
 def atomic_write(content: str, dst: pathlib.Path) -> None:
     """Write the given contents to the destination "atomically". Achieved by
-    writin in a temporary directory and then moving the file to the
-    destination.
+    writing to a temporary file in the same directory as the destination,
+    and then renaming it to the destination. Readers of the destination thus
+    see either the old file or the new one, but never a partially written
+    file.
 
     Args:
         content: The content to write to the new file.
         dst: Path to the file.
     """
-    with tempfile.TemporaryDirectory() as tmpdir:
-        with tempfile.NamedTemporaryFile(
-            delete=False, dir=tmpdir, mode="w"
-        ) as file:
-            file.write(content)
+    with tempfile.NamedTemporaryFile(
+        mode="w",
+        encoding="utf8",
+        dir=str(dst.parent),
+        prefix=".",
+        suffix=".tmp",
+        delete=False,
+    ) as file:
+        file.write(content)
+    try:
+        os.replace(file.name, str(dst))
+    except OSError:
+        os.unlink(file.name)
+        raise
+
 
-        shutil.move(file.name, str(dst))
+def is_scratch_dir(path: Union[str, pathlib.Path]) -> bool:
+    """Check if a path is a scratch directory created by
+    :py:func:`scratch_dir`, or the lock file of one.
+
+    Args:
+        path: A path.
+    Returns:
+        True if the path is a scratch directory or its lock file.
+    """
+    return pathlib.Path(path).name.startswith(SCRATCH_DIR_PREFIX)
+
+
+@contextlib.contextmanager
+def scratch_dir(kind: str, near: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Create a temporary directory on the same filesystem as near, such that
+    files can be renamed or hardlinked between the two. The directory is
+    created in :py:const:`constants.SCRATCH_DIR` if that is on the same
+    filesystem as near, and otherwise as a hidden directory in near. It is
+    removed on exit.
+
+    A scratch directory is locked while it is in use, and any unlocked
+    scratch directory that a killed process left behind is removed the next
+    time a scratch directory is created in the same place.
+
+    Args:
+        kind: What the directory is used for, which is part of its name.
+        near: Path to an existing directory.
+    Returns:
+        a context manager that yields the path to the scratch directory.
+    """
+    near = near.resolve()
+    root = constants.SCRATCH_DIR
+    root.mkdir(parents=True, exist_ok=True)
+    if root.stat().st_dev != near.stat().st_dev:
+        root = near
+    remove_stale_scratch_dirs(root)
+
+    while True:
+        fd, lock_name = tempfile.mkstemp(
+            prefix="{}{}-".format(SCRATCH_DIR_PREFIX, kind),
+            suffix=_SCRATCH_LOCK_SUFFIX,
+            dir=str(root),
+        )
+        lock_file = os.fdopen(fd, "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        lock_path = pathlib.Path(lock_name)
+        if is_same_file(lock_file, lock_path):
+            break
+        # another process removed the lock file as stale before it was locked
+        lock_file.close()
+
+    path = lock_path.with_name(lock_path.name[: -len(_SCRATCH_LOCK_SUFFIX)])
+    try:
+        path.mkdir()
+        yield path
+    finally:
+        _remove_scratch_dir(path, lock_path)
+        lock_file.close()
+
+
+def remove_stale_scratch_dirs(root: pathlib.Path) -> None:
+    """Remove the scratch directories in root that are not in use.
+
+    Args:
+        root: Path to a directory in which scratch directories are created.
+    """
+    for lock_path in root.glob(
+        SCRATCH_DIR_PREFIX + "*" + _SCRATCH_LOCK_SUFFIX
+    ):
+        with open(str(lock_path), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            if is_same_file(lock_file, lock_path):
+                _remove_scratch_dir(
+                    lock_path.with_name(
+                        lock_path.name[: -len(_SCRATCH_LOCK_SUFFIX)]
+                    ),
+                    lock_path,
+                )
+
+
+def _remove_scratch_dir(path: pathlib.Path, lock_path: pathlib.Path) -> None:
+    """Remove a scratch directory and its lock file. The caller must hold the
+    lock.
+    """
+    shutil.rmtree(str(path), ignore_errors=True)
+    with contextlib.suppress(FileNotFoundError):
+        lock_path.unlink()
+
+
+def is_same_file(file, path: pathlib.Path) -> bool:
+    """Check if an open file is the file at the given path.
+
+    Args:
+        file: An open file.
+        path: A path.
+    Returns:
+        True if path exists and refers to the same file as file.
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return False
+    fstat = os.fstat(file.fileno())
+    return (stat.st_dev, stat.st_ino) == (fstat.st_dev, fstat.st_ino)
 
 
 def call_if_defined(func: Callable[..., T], *args, **kwargs) -> T:
@@ -474,6 +474,19 @@ class APIMeta(type):
                 check_parameters(method, implemented_methods[method_name])
         return super().__new__(mcs, name, bases, attrdict)
 
+    def __call__(cls, *args, **kwargs):
+        """Create an instance of the API, and remember the arguments that it
+        was created with such that it can be re-created (see
+        :py:meth:`API.__reduce__`).
+        """
+        instance = super().__call__(*args, **kwargs)
+        instance._init_args = (args, kwargs)
+        return instance
+
+
+def _create_api(cls, args, kwargs):
+    return cls(*args, **kwargs)
+
 
 class API(APISpec, metaclass=APIMeta):
     """API base class that all API implementations should inherit from. This
@@ -488,3 +501,10 @@ class API(APISpec, metaclass=APIMeta):
        that simply raise a :py:class:`NotImplementedError`. There is no
        requirement to implement any of them.
     """
+
+    def __reduce__(self):
+        """An API instance holds connections to the platform, which can't be
+        shared with other processes. When pickled, it is instead re-created
+        from the arguments it was created with once it is unpickled.
+        """
+        return _create_api, (type(self),) + self._init_args
@@ -17,7 +17,15 @@ from repobee_plug._apimeta import API
 
 class Task(
     collections.namedtuple(
-        "Task", ("act", "add_option", "handle_args", "persist_changes")
+        "Task",
+        (
+            "act",
+            "add_option",
+            "handle_args",
+            "persist_changes",
+            "requires_full_history",
+            "parallel_safe",
+        ),
     )
 ):
     """A data structure for describing a task. Tasks are operations that
@@ -88,9 +96,17 @@ class Task(
         add_option: Optional[Callable[[ArgumentParser], None]] = None,
         handle_args: Optional[Callable[[Namespace], None]] = None,
         persist_changes: bool = False,
+        requires_full_history: bool = False,
+        parallel_safe: bool = True,
     ):
         return super().__new__(
-            cls, act, add_option, handle_args, persist_changes
+            cls,
+            act,
+            add_option,
+            handle_args,
+            persist_changes,
+            requires_full_history,
+            parallel_safe,
         )
 
     # The init method is just added for documentation purposes
@@ -100,6 +116,8 @@ class Task(
         add_option: Optional[Callable[[ArgumentParser], None]] = None,
         handle_args: Optional[Callable[[Namespace], None]] = None,
         persist_changes: bool = False,
+        requires_full_history: bool = False,
+        parallel_safe: bool = True,
     ):
         """
         Args:
@@ -115,5 +133,21 @@ class Task(
                 different things in different contexts (e.g.  whether the task
                 is executed in a clone context or in a setup context), and may
                 not be supported for all contexts.
+            requires_full_history: If True, the task requires the full history
+                of the repository it acts upon, and shallow or partial clones
+                are not used when it is in scope.
+            parallel_safe: If False, the task is never executed in parallel
+                with other tasks, even if parallel execution of tasks is
+                enabled, and is always executed in RepoBee's own process.
+                Tasks that are executed in parallel are executed in separate
+                worker processes that are started fresh, so a task that for
+                example relies on state shared between calls to ``act``, or
+                on state set up by ``handle_args``, should set this to False.
+                The ``act`` callback of a parallel task is sent to the
+                workers by pickling it, so it must be defined at the top
+                level of a module, and a task with an ``act`` callback that
+                can't be pickled is executed in RepoBee's own process. Each
+                worker uses its own instance of the platform API, which is
+                created the first time a task is executed in it.
         """
         super().__init__()
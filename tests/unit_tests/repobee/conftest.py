@@ -10,6 +10,7 @@ import pytest
 import _repobee.constants
 import _repobee.config
 import _repobee.plugin
+import _repobee.git
 
 import constants
 
@@ -65,6 +66,64 @@ def unregister_plugins():
     _repobee.plugin.unregister_all_plugins()
 
 
+@pytest.fixture(autouse=True)
+def journal_dir(mocker, tmpdir):
+    """Journals are persistent, so they must never be written to the real
+    journal directory in unit tests.
+    """
+    path = pathlib.Path(str(tmpdir)) / "journals"
+    mocker.patch("_repobee.constants.JOURNAL_DIR", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def task_cache_dir(mocker, tmpdir):
+    """The task cache is persistent, so it must never be written to the real
+    cache directory in unit tests.
+    """
+    path = pathlib.Path(str(tmpdir)) / "tasks"
+    mocker.patch("_repobee.constants.TASK_CACHE_DIR", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def http_cache_dir(mocker, tmpdir):
+    """The HTTP cache is persistent, so it must never be written to the real
+    cache directory in unit tests.
+    """
+    path = pathlib.Path(str(tmpdir)) / "http"
+    mocker.patch("_repobee.constants.HTTP_CACHE_DIR", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def scratch_dir(mocker, tmpdir):
+    """Scratch directories must never be created in the real cache directory
+    in unit tests.
+    """
+    path = pathlib.Path(str(tmpdir)) / "scratch"
+    mocker.patch("_repobee.constants.SCRATCH_DIR", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def mirror_cache_mock(mocker):
+    """The mirror cache is persistent, so it must never be used in unit tests.
+    This mock behaves like an empty cache that can't mirror anything.
+    """
+    mock = MagicMock(spec=_repobee.git.MirrorCache)
+    mock.mirrors.return_value.__enter__.return_value = {}
+    mock.cached_mirrors.return_value.__enter__.return_value = {}
+    mocker.patch("_repobee.git._MIRROR_CACHE", mock)
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(mocker):
+    """Failed git operations should be retried without delay in unit tests."""
+    mocker.patch("_repobee.git.RETRY_BASE_DELAY", 0)
+
+
 @pytest.fixture(autouse=True)
 def mock_getenv(mocker):
     def _side_effect(name):
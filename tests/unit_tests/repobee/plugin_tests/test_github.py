@@ -1,12 +1,21 @@
+import concurrent.futures
+import configparser
+import importlib
+import inspect
 import random
 import itertools
+import sys
+import time
 import pytest
+import requests.exceptions
+from unittest import mock
 from unittest.mock import MagicMock, PropertyMock, call
 
 import github
 
 import repobee_plug as plug
 
+import _repobee.constants
 import _repobee.ext.defaults.github as github_plugin
 from _repobee import exception
 from _repobee.ext.defaults.github import REQUIRED_TOKEN_SCOPES
@@ -70,6 +79,14 @@ CLOSED_ISSUES = [
 ]
 
 
+class PaginatedList(list):
+    """A list with the totalCount attribute of PyGithub's paginated lists."""
+
+    @property
+    def totalCount(self):
+        return len(self)
+
+
 def raise_404(*args, **kwargs):
     raise GithubException("Couldn't find something", 404)
 
@@ -144,6 +161,10 @@ def happy_github(mocker, monkeypatch, teams_and_members):
             raise_404()
 
     github_instance.get_user.side_effect = get_user
+    # the GraphQL API is unavailable unless a test says otherwise
+    github_instance._Github__requester.requestJsonAndCheck.side_effect = (
+        NOT_FOUND_EXCEPTION
+    )
     monkeypatch.setattr(github, "GithubException", GithubException)
     mocker.patch(
         "github.Github",
@@ -195,7 +216,7 @@ def no_teams(organization):
         if team_id in ids_to_teams
         else raise_404()
     )
-    organization.get_teams.side_effect = lambda: list(teams_)
+    organization.get_teams.side_effect = lambda: PaginatedList(teams_)
     teams_ = []
 
     def create_team(name, permission):
@@ -437,11 +458,11 @@ class TestCreateRepos:
         api.create_repos(repo_infos)
 
         assert repos
-        api.org.create_repo.assert_has_calls(expected_calls)
+        api.org.create_repo.assert_has_calls(expected_calls, any_order=True)
 
     def test_skips_existing_repos(self, no_repos, repo_infos, api):
-        """Assert that create_repo is called with all repos even when there are
-        exceptions.
+        """Assert that create_repo is only called with repos that don't
+        already exist.
         """
         expected_calls = [
             call(
@@ -450,15 +471,35 @@ class TestCreateRepos:
                 private=info.private,
                 team_id=info.team_id,
             )
-            for info in repo_infos
+            for info in repo_infos[1:]
         ]
         # create one repo in advance
         api.create_repos(repo_infos[:1])
+        api.org.create_repo.reset_mock()
 
         # start test
         api.create_repos(repo_infos)
 
-        api.org.create_repo.assert_has_calls(expected_calls)
+        api.org.create_repo.assert_has_calls(expected_calls, any_order=True)
+        assert api.org.create_repo.call_count == len(expected_calls)
+
+    def test_gets_repo_created_after_listing(
+        self, no_repos, repo_infos, organization, api
+    ):
+        """A 422 response means that the repo was created by someone else
+        after the existing repos were listed, in which case it should be
+        fetched instead.
+        """
+        organization.get_repos.side_effect = lambda: []
+        organization.create_repo(repo_infos[0].name)
+
+        urls = api.create_repos(repo_infos[:2])
+
+        assert urls == [
+            api._insert_auth(generate_repo_url(info.name, ORG_NAME))
+            for info in repo_infos[:2]
+        ]
+        api.org.get_repo.assert_called_once_with(repo_infos[0].name)
 
     @pytest.mark.parametrize(
         "unexpected_exception",
@@ -489,6 +530,23 @@ class TestCreateRepos:
         for url in actual_urls:
             assert TOKEN in url
 
+    def test_returns_urls_in_input_order(self, no_repos, repo_infos, api):
+        """Some repos exist and some are created, and some creations finish
+        before others that started earlier.
+        """
+        api.create_repos(repo_infos[1::2])
+        create_repo = api.org.create_repo.side_effect
+        api.org.create_repo.side_effect = lambda name, **kwargs: (
+            time.sleep(0.01 if name == repo_infos[0].name else 0),
+            create_repo(name, **kwargs),
+        )[1]
+        expected_urls = [
+            api._insert_auth(generate_repo_url(info.name, ORG_NAME))
+            for info in repo_infos
+        ]
+
+        assert api.create_repos(repo_infos) == expected_urls
+
     def test_create_repos_without_team_id(self, api):
         """If there is no team id specified for the repo, then
         github.Organization.create_repo must be called without the team_id
@@ -507,6 +565,56 @@ class TestCreateRepos:
             repo.name, description=repo.description, private=repo.private
         )
 
+    def test_uses_configured_amount_of_workers(
+        self, happy_github, organization, no_repos, repo_infos, monkeypatch
+    ):
+        # restore the setting after the test
+        monkeypatch.setattr(
+            github_plugin, "_MAX_CONCURRENCY", github_plugin._MAX_CONCURRENCY
+        )
+        config_parser = configparser.ConfigParser()
+        config_parser[_repobee.constants.DEFAULTS_SECTION_HDR] = dict(
+            api_max_concurrency="3"
+        )
+        github_plugin.DefaultAPIHooks().config_hook(config_parser)
+        ratelimit = MagicMock(wraps=github_plugin.ratelimit)
+        monkeypatch.setattr(github_plugin, "ratelimit", ratelimit)
+        executor = MagicMock(wraps=concurrent.futures.ThreadPoolExecutor)
+        monkeypatch.setattr(
+            github_plugin.concurrent.futures, "ThreadPoolExecutor", executor
+        )
+        api = github_plugin.GitHubAPI(BASE_URL, TOKEN, ORG_NAME, USER)
+
+        api.create_repos(repo_infos)
+
+        executor.assert_called_once_with(max_workers=3)
+        ratelimit.RequestPacer.assert_called_once_with(max_concurrent_writes=3)
+
+    def test_reuses_workers_across_calls(
+        self, no_repos, repo_infos, api, mocker
+    ):
+        executor = mocker.patch(
+            "concurrent.futures.ThreadPoolExecutor",
+            wraps=concurrent.futures.ThreadPoolExecutor,
+        )
+
+        api.create_repos(repo_infos[:1])
+        api.create_repos(repo_infos[1:])
+
+        assert executor.call_count == 1
+
+    @pytest.mark.parametrize("value", ["0", "-1", "many"])
+    def test_invalid_amount_of_workers_raises(self, value):
+        config_parser = configparser.ConfigParser()
+        config_parser[_repobee.constants.DEFAULTS_SECTION_HDR] = dict(
+            api_max_concurrency=value
+        )
+
+        with pytest.raises(exception.FileError) as exc_info:
+            github_plugin.DefaultAPIHooks().config_hook(config_parser)
+
+        assert "api_max_concurrency" in str(exc_info.value)
+
 
 class TestGetRepoUrls:
     """Tests for get_repo_urls."""
@@ -935,3 +1043,661 @@ class TestGetPeerReviewProgress:
         api.get_review_progress(
             review_team_names, review_student_teams, "peer"
         )
+
+
+class TestPyGithubInternals:
+    """The requests of PyGithub are paced and cached by wrapping its private
+    requester, and PyGithub objects are created from GraphQL responses.
+    These tests fail if the installed version of PyGithub no longer works
+    like that.
+    """
+
+    @pytest.fixture
+    def real_github(self):
+        # the github module is mocked for all unit tests, so the real one is
+        # imported for the duration of the test
+        with mock.patch.dict(sys.modules):
+            for name in list(sys.modules):
+                if name == "github" or name.startswith("github."):
+                    del sys.modules[name]
+            yield importlib.import_module("github")
+
+    @pytest.fixture
+    def requester(self, real_github):
+        github_ = real_github.Github(login_or_token=TOKEN, base_url=BASE_URL)
+        return github_._Github__requester
+
+    def test_has_request_json(self, requester):
+        assert list(inspect.signature(requester.requestJson).parameters) == [
+            "verb",
+            "url",
+            "parameters",
+            "headers",
+            "input",
+            "cnx",
+        ]
+
+    def test_has_request_json_and_check(self, requester):
+        assert list(
+            inspect.signature(requester.requestJsonAndCheck).parameters
+        ) == ["verb", "url", "parameters", "headers", "input"]
+
+    def test_paginated_lists_can_be_counted(self, real_github):
+        assert isinstance(
+            real_github.PaginatedList.PaginatedList.totalCount, property
+        )
+
+    def test_lazy_issue_is_completed_with_rest_api(
+        self, real_github, requester, monkeypatch
+    ):
+        monkeypatch.setattr(github_plugin, "github", real_github)
+        api = MagicMock(_base_url=BASE_URL, _org_name=ORG_NAME)
+        api._github._Github__requester = requester
+        node = dict(
+            title="Title",
+            body="Body",
+            number=3,
+            createdAt="2020-01-03T10:00:00Z",
+            author=dict(login="slarse"),
+        )
+        url = "{}/repos/{}/repo/issues/3".format(BASE_URL, ORG_NAME)
+
+        with mock.patch.object(
+            requester,
+            "requestJsonAndCheck",
+            return_value=({}, dict(url=url, html_url="https://html")),
+        ) as request_json:
+            issue = github_plugin.GitHubAPI._lazy_issue(api, "repo", node)
+            assert (issue.title, issue.number, issue.user.login) == (
+                "Title",
+                3,
+                "slarse",
+            )
+            assert issue.created_at.isoformat() == "2020-01-03T10:00:00"
+            assert not request_json.called
+
+            assert issue.html_url == "https://html"
+            request_json.assert_called_once_with("GET", url)
+
+
+class TestCacheConditionalRequests:
+    """Tests for routing requests through the conditional request cache."""
+
+    @pytest.fixture
+    def requester(self):
+        requester = MagicMock()
+        requester.requestJson.side_effect = (
+            lambda verb, url, params, headers, *_: (
+                (304, {}, None)
+                if headers.get("If-None-Match") == '"abc"'
+                else (200, {"ETag": '"abc"'}, '{"id": 1}')
+            )
+        )
+        return requester
+
+    def test_get_requests_are_cached(self, requester, http_cache_dir):
+        request_json = requester.requestJson
+        cache = github_plugin.httpcache.ConditionalRequestCache(
+            http_cache_dir, scope=TOKEN
+        )
+        github_plugin._cache_conditional_requests(requester, cache)
+
+        for _ in range(2):
+            response = requester.requestJson(
+                "GET", "/orgs/some-org", {"page": 2}, {"Accept": "json"}
+            )
+
+        assert response == (200, {"etag": '"abc"'}, '{"id": 1}')
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert request_json.call_args_list[-1] == call(
+            "GET",
+            "/orgs/some-org",
+            {"page": 2},
+            {"Accept": "json", "If-None-Match": '"abc"'},
+            None,
+            None,
+        )
+
+    def test_other_requests_are_not_cached(self, requester, http_cache_dir):
+        cache = github_plugin.httpcache.ConditionalRequestCache(
+            http_cache_dir, scope=TOKEN
+        )
+        github_plugin._cache_conditional_requests(requester, cache)
+
+        for _ in range(2):
+            requester.requestJson("POST", "/orgs/some-org/teams", None, {})
+
+        assert (cache.hits, cache.misses) == (0, 0)
+        assert not http_cache_dir.exists()
+
+
+def graphql_issue(issue):
+    return dict(
+        title=issue.title,
+        body=issue.body,
+        number=issue.number,
+        createdAt=issue.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        author=dict(login=issue.author),
+    )
+
+
+def graphql_response(data, not_found=(), errors=()):
+    errors = [
+        dict(type="NOT_FOUND", path=[alias]) for alias in not_found
+    ] + list(errors)
+    return {}, dict(data=data, errors=errors)
+
+
+def graphql_connection(nodes, has_next_page=False):
+    return dict(pageInfo=dict(hasNextPage=has_next_page), nodes=nodes)
+
+
+class TestGraphQLReads:
+    """Tests for reading issues and review progress with GraphQL."""
+
+    @pytest.fixture
+    def request_json(self, happy_github):
+        request_json = happy_github._Github__requester.requestJsonAndCheck
+        request_json.side_effect = None
+        return request_json
+
+    def test_get_issues_in_single_query(
+        self, repos, issues, request_json, organization, api
+    ):
+        repo_names = [repo.name for repo in repos][:2]
+        request_json.return_value = graphql_response(
+            dict(
+                v0=dict(
+                    name=repo_names[0],
+                    issues=graphql_connection(
+                        [graphql_issue(i) for i in OPEN_ISSUES]
+                    ),
+                    pullRequests=graphql_connection([]),
+                ),
+                v1=None,
+            ),
+            not_found=["v1"],
+        )
+        organization.get_repo.reset_mock()
+
+        name_issues_pairs = [
+            (repo_name, list(issues))
+            for repo_name, issues in api.get_issues(
+                repo_names, title_regex="close"
+            )
+        ]
+
+        assert request_json.call_count == 1
+        _, kwargs = request_json.call_args
+        assert kwargs["input"]["variables"]["v0"] == repo_names[0]
+        assert kwargs["input"]["variables"]["states"] == ["OPEN"]
+        assert kwargs["input"]["variables"]["pullRequestStates"] == ["OPEN"]
+        assert not organization.get_repo.called
+        ((repo_name, found_issues),) = name_issues_pairs
+        assert repo_name == repo_names[0]
+        assert [issue.to_dict() for issue in found_issues] == [
+            plug.Issue(
+                *CLOSE_ISSUE[:3],
+                CLOSE_ISSUE.created_at.isoformat(),
+                CLOSE_ISSUE.author
+            ).to_dict()
+        ]
+
+    def test_get_issues_uses_rest_for_repo_with_many_issues(
+        self, repos, issues, request_json, api
+    ):
+        repo_name = repos[0].name
+        request_json.return_value = graphql_response(
+            dict(
+                v0=dict(
+                    name=repo_name,
+                    issues=graphql_connection([], has_next_page=True),
+                    pullRequests=graphql_connection([]),
+                )
+            )
+        )
+
+        ((_, found_issues),) = list(api.get_issues([repo_name]))
+
+        assert len(list(found_issues)) == len(OPEN_ISSUES)
+
+    def test_get_issues_includes_pull_requests_ordered_like_rest(
+        self, repos, request_json, api
+    ):
+        repo_name = repos[0].name
+        old_issue, new_issue, pull_request = [
+            dict(
+                title="Title {}".format(number),
+                body="Body",
+                number=number,
+                createdAt=created_at,
+                author=dict(login="slarse"),
+            )
+            for number, created_at in [
+                (1, "2020-01-01T10:00:00Z"),
+                (3, "2020-01-03T10:00:00Z"),
+                (2, "2020-01-02T10:00:00Z"),
+            ]
+        ]
+        request_json.return_value = graphql_response(
+            dict(
+                v0=dict(
+                    name=repo_name,
+                    issues=graphql_connection([old_issue, new_issue]),
+                    pullRequests=graphql_connection([pull_request]),
+                )
+            )
+        )
+
+        ((_, found_issues),) = list(
+            api.get_issues([repo_name], state=plug.IssueState.CLOSED)
+        )
+
+        assert [issue.number for issue in found_issues] == [3, 2, 1]
+        _, kwargs = request_json.call_args
+        assert kwargs["input"]["variables"]["pullRequestStates"] == [
+            "CLOSED",
+            "MERGED",
+        ]
+        assert kwargs["input"]["variables"]["order"] == dict(
+            field="CREATED_AT", direction="DESC"
+        )
+
+    def test_issue_implementations_are_lazy_pygithub_issues(
+        self, repos, request_json, api
+    ):
+        repo_name = repos[0].name
+        node = dict(
+            title="Title",
+            body="Body",
+            number=3,
+            createdAt="2020-01-03T10:00:00Z",
+            author=dict(login="slarse"),
+        )
+        request_json.return_value = graphql_response(
+            dict(
+                v0=dict(
+                    name=repo_name,
+                    issues=graphql_connection([node]),
+                    pullRequests=graphql_connection([]),
+                )
+            )
+        )
+        issue_class = github_plugin.github.Issue.Issue
+        issue_class.reset_mock()
+
+        ((_, (issue,)),) = [
+            (name, list(issues))
+            for name, issues in api.get_issues([repo_name])
+        ]
+
+        assert issue.implementation == issue_class.return_value
+        args, kwargs = issue_class.call_args
+        _, _, attributes = args
+        assert attributes["url"] == "{}/repos/{}/{}/issues/3".format(
+            BASE_URL, ORG_NAME, repo_name
+        )
+        assert attributes["user"] == dict(login="slarse")
+        assert kwargs == dict(completed=False)
+
+    @pytest.mark.parametrize(
+        "failure",
+        [
+            NOT_FOUND_EXCEPTION,
+            graphql_response(
+                None, errors=[dict(message="Field 'x' doesn't exist")]
+            ),
+            graphql_response(
+                None,
+                errors=[dict(type="INSUFFICIENT_SCOPES", message="No scope")],
+            ),
+        ],
+        ids=["unavailable", "schema-error", "permission-error"],
+    )
+    def test_falls_back_to_rest_only_once(
+        self, repos, issues, request_json, api, failure
+    ):
+        if isinstance(failure, Exception):
+            request_json.side_effect = failure
+        else:
+            request_json.return_value = failure
+        repo_names = [repo.name for repo in repos]
+
+        for _ in range(2):
+            name_issues_pairs = list(api.get_issues(repo_names))
+
+        assert request_json.call_count == 1
+        assert len(name_issues_pairs) == len(repo_names)
+
+    @pytest.mark.parametrize(
+        "failure",
+        [
+            SERVER_ERROR,
+            GithubException(msg=None, status=502),
+            GithubException(msg=None, status=504),
+            requests.exceptions.ReadTimeout("Read timed out"),
+        ],
+        ids=["500", "502", "504", "timeout"],
+    )
+    def test_falls_back_to_rest_on_transient_failures(
+        self, repos, issues, request_json, api, failure
+    ):
+        request_json.side_effect = failure
+        repo_names = [repo.name for repo in repos]
+
+        for _ in range(2):
+            name_issues_pairs = list(api.get_issues(repo_names))
+
+        assert len(name_issues_pairs) == len(repo_names)
+        # GraphQL is tried again for the next query
+        assert request_json.call_count == 2
+
+    def test_other_failures_are_raised_without_disabling_graphql(
+        self, repos, issues, request_json, api
+    ):
+        request_json.side_effect = VALIDATION_ERROR
+        repo_names = [repo.name for repo in repos]
+
+        for _ in range(2):
+            with pytest.raises(exception.APIError):
+                list(api.get_issues(repo_names))
+
+        assert request_json.call_count == 2
+
+    def test_get_review_progress_in_single_query(
+        self, review_student_teams, review_teams, teams, request_json, api
+    ):
+        review_team_names = list(review_teams.keys())[:2]
+        ham, spam = review_student_teams[:2]
+        request_json.return_value = graphql_response(
+            dict(
+                organization=dict(
+                    v0=dict(
+                        members=dict(
+                            pageInfo=dict(hasNextPage=False),
+                            nodes=[dict(login="spam")],
+                        ),
+                        repositories=dict(
+                            totalCount=1,
+                            nodes=[
+                                dict(
+                                    name="ham-week-1",
+                                    issues=dict(
+                                        pageInfo=dict(hasNextPage=False),
+                                        nodes=[
+                                            dict(
+                                                title="Peer review",
+                                                author=dict(login="spam"),
+                                            )
+                                        ],
+                                    ),
+                                )
+                            ],
+                        ),
+                    ),
+                    v1=dict(
+                        members=dict(
+                            pageInfo=dict(hasNextPage=False),
+                            nodes=[dict(login="ham")],
+                        ),
+                        repositories=dict(
+                            totalCount=1,
+                            nodes=[
+                                dict(
+                                    name="spam-week-1",
+                                    issues=dict(
+                                        pageInfo=dict(hasNextPage=False),
+                                        nodes=[],
+                                    ),
+                                )
+                            ],
+                        ),
+                    ),
+                )
+            )
+        )
+
+        reviews = api.get_review_progress(
+            review_team_names, review_student_teams, "Peer"
+        )
+
+        assert request_json.call_count == 1
+        for team in teams:
+            assert not team.get_members.called
+        assert reviews == {
+            str(spam): [plug.Review(repo="ham-week-1", done=True)],
+            str(ham): [plug.Review(repo="spam-week-1", done=False)],
+        }
+
+    def test_get_review_progress_skips_team_with_many_repos(
+        self,
+        review_student_teams,
+        review_teams,
+        teams,
+        request_json,
+        api,
+        mocker,
+    ):
+        review_team_name, *_ = review_teams.keys()
+        request_json.return_value = graphql_response(
+            dict(
+                organization=dict(
+                    v0=dict(
+                        members=graphql_connection([dict(login="spam")]),
+                        repositories=dict(
+                            totalCount=3,
+                            nodes=[
+                                dict(
+                                    name="ham-week-1",
+                                    issues=graphql_connection([]),
+                                )
+                            ],
+                        ),
+                    )
+                )
+            )
+        )
+        warning = mocker.patch.object(github_plugin.LOGGER, "warning")
+
+        reviews = api.get_review_progress(
+            [review_team_name], review_student_teams, "Peer"
+        )
+
+        assert not reviews
+        (message,), _ = warning.call_args
+        assert "found 3" in message
+
+
+class TestPaceRequests:
+    """Tests for sending requests through a request pacer."""
+
+    def test_secondary_rate_limited_requests_are_retried(self):
+        requester = MagicMock()
+        request_json = requester.requestJson
+        request_json.side_effect = [
+            (403, {"retry-after": "5"}, '{"message": "secondary rate limit"}'),
+            (201, {}, '{"id": 1}'),
+        ]
+        sleep = MagicMock()
+        github_plugin._pace_requests(
+            requester, github_plugin.ratelimit.RequestPacer(sleep=sleep)
+        )
+
+        response = requester.requestJson("POST", "/orgs/some-org/repos")
+
+        assert response == (201, {}, '{"id": 1}')
+        assert request_json.call_count == 2
+        sleep.assert_called_once_with(pytest.approx(5, abs=0.1))
+
+
+class TestTeamIndex:
+    """Tests for the index of teams and members."""
+
+    def test_lists_teams_only_once(self, teams, organization, api):
+        team_names = [team.name for team in teams]
+        organization.get_teams.reset_mock()
+
+        for _ in range(2):
+            found_teams = api._get_teams_in(reversed(team_names))
+        api.delete_teams(team_names[:1])
+
+        assert found_teams == list(reversed(teams))
+        # once to count the teams, and once to list them
+        assert organization.get_teams.call_count == 2
+        assert api._get_teams_in(team_names[:1]) == []
+
+    def test_looks_up_few_teams_by_slug(self, teams, organization, api):
+        teams_by_slug = {team.name.lower(): team for team in teams}
+        organization.get_team_by_slug.side_effect = (
+            lambda slug: teams_by_slug[slug]
+        )
+        # listing takes more requests than looking up the teams
+        listing = MagicMock(totalCount=github_plugin._MAX_PAGE_SIZE * 2 + 1)
+        organization.get_teams.side_effect = None
+        organization.get_teams.return_value = listing
+
+        found_teams = api._get_teams_in(["one", "last_team"])
+
+        assert [team.name for team in found_teams] == ["one", "last_team"]
+        assert not listing.__iter__.called
+
+    def test_lists_teams_when_cheaper_than_slug_lookups(
+        self, teams, organization, api
+    ):
+        organization.get_team_by_slug.reset_mock()
+
+        found_teams = api._get_teams_in(["one", "two", "last_team"])
+
+        assert [team.name for team in found_teams] == [
+            "one",
+            "two",
+            "last_team",
+        ]
+        assert not organization.get_team_by_slug.called
+
+    def test_does_not_count_teams_to_look_up_single_team(
+        self, teams, organization, api
+    ):
+        teams_by_slug = {team.name.lower(): team for team in teams}
+        organization.get_team_by_slug.side_effect = (
+            lambda slug: teams_by_slug[slug]
+        )
+        organization.get_teams.reset_mock()
+
+        (found_team,) = api._get_teams_in(["one"])
+
+        assert found_team.name == "one"
+        assert not organization.get_teams.called
+
+    def test_lists_teams_when_slug_lookup_fails(
+        self, teams, organization, api
+    ):
+        organization.get_team_by_slug.side_effect = raise_404
+        organization.get_teams.reset_mock()
+
+        found_teams = api._get_teams_in(["one"])
+
+        assert [team.name for team in found_teams] == ["one"]
+        assert organization.get_teams.call_count == 1
+
+    def test_fetches_members_only_once(self, mocker, teams, api):
+        team = teams[0]
+        mocker.patch.object(api, "_get_users", return_value=[User(login=USER)])
+
+        for _ in range(2):
+            api._get_members(team)
+        api._add_to_team([USER], team)
+
+        assert api._get_members(team) == {USER}
+        assert team.get_members.call_count == 1
+
+
+class TestRepoIndex:
+    """Tests for resolving repos by name with the repo index."""
+
+    @pytest.fixture
+    def repo_names(self, repos, organization):
+        organization.get_repo.reset_mock()
+        organization.get_repos.reset_mock()
+        return [repo.name for repo in repos]
+
+    @staticmethod
+    def set_repo_count(organization, public, private):
+        type(organization).public_repos = PropertyMock(return_value=public)
+        type(organization).total_private_repos = PropertyMock(
+            return_value=private
+        )
+
+    def test_lists_repos_once_when_cheaper(
+        self, repo_names, organization, api
+    ):
+        self.set_repo_count(organization, public=10, private=150)
+
+        for _ in range(2):
+            found_repos = list(api._get_repos_by_name(repo_names[:3]))
+
+        assert [repo.name for repo in found_repos] == repo_names[:3]
+        assert organization.get_repos.call_count == 1
+        assert not organization.get_repo.called
+
+    def test_looks_up_few_repos_directly(self, repo_names, organization, api):
+        self.set_repo_count(organization, public=10, private=1000)
+
+        for _ in range(2):
+            found_repos = list(api._get_repos_by_name(repo_names[:3]))
+
+        assert [repo.name for repo in found_repos] == repo_names[:3]
+        assert organization.get_repo.call_count == 3
+        assert not organization.get_repos.called
+
+    def test_looks_up_repos_directly_if_repo_count_is_unknown(
+        self, repo_names, organization, api
+    ):
+        self.set_repo_count(organization, public=10, private=None)
+
+        found_repos = list(api._get_repos_by_name(repo_names))
+
+        assert len(found_repos) == len(repo_names)
+        assert not organization.get_repos.called
+
+    def test_repo_names_are_case_insensitive(
+        self, repo_names, organization, api, mocker
+    ):
+        self.set_repo_count(organization, public=10, private=150)
+        warning = mocker.patch.object(github_plugin.LOGGER, "warning")
+
+        found_repos = list(
+            api._get_repos_by_name(name.upper() for name in repo_names[:3])
+        )
+
+        assert [repo.name for repo in found_repos] == repo_names[:3]
+        assert not warning.called
+
+    def test_listing_keeps_repos_that_are_already_indexed(
+        self, repo_names, repos, organization, api
+    ):
+        self.set_repo_count(organization, public=10, private=1000)
+        list(api._get_repos_by_name(repo_names[:1]))
+        # the first repo was e.g. created after the listing started
+        organization.get_repos.side_effect = lambda: repos[1:]
+        self.set_repo_count(organization, public=10, private=150)
+
+        list(api._get_repos_by_name(repo_names[1:4]))
+        (found_repo,) = api._get_repos_by_name(repo_names[:1])
+
+        assert found_repo.name == repo_names[0]
+        assert organization.get_repos.call_count == 1
+        assert organization.get_repo.call_count == 1
+
+    def test_create_repos_skips_existing_repos_with_other_case(
+        self, repo_names, repo_infos, organization, api
+    ):
+        info = repo_infos[0]._replace(name=repo_names[0].upper())
+        organization.create_repo.reset_mock()
+
+        (url,) = api.create_repos([info])
+
+        assert url == api._insert_auth(
+            generate_repo_url(repo_names[0], ORG_NAME)
+        )
+        assert not organization.create_repo.called
@@ -1,4 +1,5 @@
 from collections import namedtuple
+from unittest.mock import MagicMock
 
 import requests.exceptions
 import pytest
@@ -7,6 +8,7 @@ import repobee_plug as plug
 
 import _repobee
 from _repobee import exception
+from _repobee import ratelimit
 
 import constants
 
@@ -111,6 +113,7 @@ class GitLabMock:
         ]
         self._base_url = url
         self._private_token = private_token
+        self.session = requests.Session()
         self._groups = {}
         self._projects = {}
         self._id = len(self._users)
@@ -305,6 +308,25 @@ class TestInit:
         with pytest.raises(exception.NotFoundError):
             _repobee.ext.gitlab.GitLabAPI(BASE_URL, TOKEN, "fake-name")
 
+    def test_rate_limited_requests_are_retried(self):
+        session = MagicMock()
+        send = session.send
+        send.side_effect = [
+            MagicMock(status_code=429, headers={"Retry-After": "3"}),
+            MagicMock(status_code=200, headers={}),
+        ]
+        sleep = MagicMock()
+        request = MagicMock(method="POST")
+        _repobee.ext.gitlab._pace_requests(
+            session, ratelimit.RequestPacer(sleep=sleep)
+        )
+
+        response = session.send(request, timeout=10)
+
+        assert response.status_code == 200
+        assert send.call_count == 2
+        sleep.assert_called_once_with(pytest.approx(3, abs=0.1))
+
 
 class TestEnsureTeamsAndMembers:
     @pytest.mark.parametrize(
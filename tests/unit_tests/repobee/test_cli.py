@@ -61,6 +61,12 @@ VALID_PARSED_ARGS = dict(
     token=TOKEN,
     num_reviews=1,
     hook_results_file=None,
+    sync=False,
+    depth=None,
+    filter_spec=None,
+    resume=False,
+    task_jobs=1,
+    no_task_cache=False,
     repos=(
         plug.Repo(
             name=plug.generate_repo_name(team, master_name),
@@ -233,13 +239,11 @@ class TestDispatchCommand:
         parser,
         command_func,
     ):
-        expected_filepath = pathlib.Path(".").resolve() / "results.json"
+        expected_filepath = pathlib.Path(str(tmpdir)) / "results.json"
         expected_json = plug.result_mapping_to_json(hook_result_mapping)
         args_dict = dict(VALID_PARSED_ARGS)
         args_dict["hook_results_file"] = str(expected_filepath)
         with mock.patch(
-            "_repobee.util.atomic_write", autospec=True
-        ) as write, mock.patch(
             command_func, autospec=True, return_value=hook_result_mapping
         ):
             args = argparse.Namespace(subparser=parser, **args_dict)
@@ -247,7 +251,48 @@ class TestDispatchCommand:
                 args, api_instance_mock, EMPTY_PATH
             )
 
-        write.assert_called_once_with(expected_json, expected_filepath)
+        assert expected_filepath.read_text(encoding="utf8") == expected_json
+        assert list(pathlib.Path(str(tmpdir)).iterdir()) == [expected_filepath]
+
+    def test_merges_streamed_hook_results(
+        self, tmpdir, hook_result_mapping, api_instance_mock
+    ):
+        """Test that results that the command streams while executing end up
+        in the hook results file along with those that it returns.
+        """
+        expected_filepath = pathlib.Path(str(tmpdir)) / "results.json"
+        args_dict = dict(VALID_PARSED_ARGS)
+        args_dict["hook_results_file"] = str(expected_filepath)
+        streamed = plug.Result(
+            name="sync", status=plug.Status.SUCCESS, msg="Synced"
+        )
+        repo_names = list(hook_result_mapping)
+
+        def clone_repos(*args, on_results, **kwargs):
+            on_results(repo_names[0], [streamed])
+            return hook_result_mapping
+
+        with mock.patch(
+            "_repobee.command.clone_repos",
+            autospec=True,
+            side_effect=clone_repos,
+        ):
+            args = argparse.Namespace(
+                subparser=mainparser.CLONE_PARSER, **args_dict
+            )
+            _repobee.cli.dispatch.dispatch_command(
+                args, api_instance_mock, EMPTY_PATH
+            )
+
+        # results that were streamed are not written again
+        expected = dict(hook_result_mapping)
+        expected[repo_names[0]] = [streamed]
+        assert (
+            plug.json_to_result_mapping(
+                expected_filepath.read_text(encoding="utf8")
+            )
+            == expected
+        )
 
     def test_does_not_write_hook_results_if_there_are_none(
         self, tmpdir, api_instance_mock
@@ -255,12 +300,11 @@ class TestDispatchCommand:
         """Test that no file is created if there are no hook results, even if
         --hook-results-file is specified.
         """
-        expected_filepath = pathlib.Path(".").resolve() / "results.json"
         args_dict = dict(VALID_PARSED_ARGS)
-        args_dict["hook_results_file"] = str(expected_filepath)
+        args_dict["hook_results_file"] = str(
+            pathlib.Path(str(tmpdir)) / "results.json"
+        )
         with mock.patch(
-            "_repobee.util.atomic_write", autospec=True
-        ) as write, mock.patch(
             "_repobee.command.clone_repos", autospec=True, return_value={}
         ):
             args = argparse.Namespace(
@@ -270,7 +314,7 @@ class TestDispatchCommand:
                 args, api_instance_mock, EMPTY_PATH
             )
 
-        assert not write.called
+        assert not list(pathlib.Path(str(tmpdir)).iterdir())
 
     def test_raises_on_invalid_subparser_value(self, api_instance_mock):
         parser = "DOES_NOT_EXIST"
@@ -305,9 +349,37 @@ class TestDispatchCommand:
         )
 
         command_mock.setup_student_repos.assert_called_once_with(
-            args.master_repo_urls, args.students, api_instance_mock
+            args.master_repo_urls,
+            args.students,
+            api_instance_mock,
+            journal=mock.ANY,
+            task_jobs=1,
+            on_results=None,
+        )
+
+    def test_setup_resumes_journal_of_identical_invocation(
+        self, command_mock, api_instance_mock
+    ):
+        args = argparse.Namespace(
+            subparser=mainparser.SETUP_PARSER, **VALID_PARSED_ARGS
+        )
+        resume_args = argparse.Namespace(**{**vars(args), "resume": True})
+        other_args = argparse.Namespace(
+            **{**vars(resume_args), "students": args.students[1:]}
         )
 
+        for parsed_args in [args, resume_args, other_args]:
+            _repobee.cli.dispatch.dispatch_command(
+                parsed_args, api_instance_mock, EMPTY_PATH
+            )
+
+        journals = [
+            kwargs["journal"]
+            for _, kwargs in command_mock.setup_student_repos.call_args_list
+        ]
+        assert journals[0].path == journals[1].path
+        assert journals[1].path != journals[2].path
+
     def test_update_student_repos_called_with_correct_args(
         self, command_mock, api_instance_mock
     ):
@@ -324,6 +396,8 @@ class TestDispatchCommand:
             args.students,
             api_instance_mock,
             issue=args.issue,
+            journal=mock.ANY,
+            task_jobs=1,
         )
 
     def test_create_teams_called_with_correct_args(self, api_instance_mock):
@@ -400,8 +474,59 @@ class TestDispatchCommand:
         )
 
         command_mock.clone_repos.assert_called_once_with(
-            args.repos, api_instance_mock
+            args.repos,
+            api_instance_mock,
+            sync=False,
+            depth=None,
+            filter_spec=None,
+            task_jobs=1,
+            task_cache=mock.ANY,
+            on_results=None,
+            master_repo_urls=args.master_repo_urls,
+        )
+
+    @pytest.mark.parametrize(
+        "extra_args, expect_same_cache",
+        [
+            (dict(students=[]), True),
+            (dict(javac_ignore=["Main.java"]), False),
+        ],
+    )
+    def test_task_cache_depends_on_relevant_args(
+        self, command_mock, api_instance_mock, extra_args, expect_same_cache
+    ):
+        args = argparse.Namespace(
+            subparser=mainparser.CLONE_PARSER, **VALID_PARSED_ARGS
         )
+        other_args = argparse.Namespace(**{**vars(args), **extra_args})
+
+        for parsed_args in [args, other_args]:
+            _repobee.cli.dispatch.dispatch_command(
+                parsed_args, api_instance_mock, EMPTY_PATH
+            )
+
+        first, second = [
+            kwargs["task_cache"]
+            for _, kwargs in command_mock.clone_repos.call_args_list
+        ]
+        assert (
+            first.config_digest == second.config_digest
+        ) == expect_same_cache
+
+    def test_task_cache_disabled_by_no_task_cache(
+        self, command_mock, api_instance_mock
+    ):
+        args = argparse.Namespace(
+            subparser=mainparser.CLONE_PARSER,
+            **{**VALID_PARSED_ARGS, "no_task_cache": True}
+        )
+
+        _repobee.cli.dispatch.dispatch_command(
+            args, api_instance_mock, EMPTY_PATH
+        )
+
+        _, kwargs = command_mock.clone_repos.call_args
+        assert kwargs["task_cache"] is None
 
     def test_verify_settings_called_with_correct_args(self, api_class_mock):
         # regular mockaing is broken for static methods, it seems, produces
@@ -1171,6 +1296,20 @@ class TestSetupAndUpdateParsers:
         parsed_args, _ = _repobee.cli.parsing.handle_args(sys_args)
 
         assert_base_push_args(parsed_args, api_class_mock)
+        assert not parsed_args.resume
+
+    def test_resume(self, api_class_mock, parser):
+        sys_args = [
+            parser,
+            *COMPLETE_PUSH_ARGS,
+            "-s",
+            *STUDENTS_STRING.split(),
+            "--resume",
+        ]
+
+        parsed_args, _ = _repobee.cli.parsing.handle_args(sys_args)
+
+        assert parsed_args.resume
 
     def test_finds_local_repo(self, mocker, api_instance_mock, parser):
         """Tests that the parsers pick up local repos when they are not
@@ -1273,6 +1412,79 @@ class TestCloneParser:
         plugin_manager_mock.hook.parse_args.assert_called_once_with(
             args=mock.ANY
         )
+        assert not args.sync
+
+    def test_sync(self, students_file, plugin_manager_mock):
+        sys_args = [
+            mainparser.CLONE_PARSER,
+            *BASE_ARGS,
+            "--mn",
+            *REPO_NAMES,
+            "--sf",
+            str(students_file),
+            "--sync",
+        ]
+
+        args, _ = _repobee.cli.parsing.handle_args(sys_args)
+
+        assert args.sync
+
+    def test_depth_and_filter(self, students_file, plugin_manager_mock):
+        sys_args = [
+            mainparser.CLONE_PARSER,
+            *BASE_ARGS,
+            "--mn",
+            *REPO_NAMES,
+            "--sf",
+            str(students_file),
+            "--depth",
+            "1",
+            "--filter",
+            "blob:none",
+        ]
+
+        args, _ = _repobee.cli.parsing.handle_args(sys_args)
+
+        assert args.depth == 1
+        assert args.filter_spec == "blob:none"
+
+    def test_raises_on_non_positive_depth(
+        self, students_file, plugin_manager_mock
+    ):
+        sys_args = [
+            mainparser.CLONE_PARSER,
+            *BASE_ARGS,
+            "--mn",
+            *REPO_NAMES,
+            "--sf",
+            str(students_file),
+            "--depth",
+            "0",
+        ]
+
+        with pytest.raises(exception.ParseError) as exc_info:
+            _repobee.cli.parsing.handle_args(sys_args)
+
+        assert "--depth" in str(exc_info.value)
+
+    def test_raises_on_non_positive_task_jobs(
+        self, students_file, plugin_manager_mock
+    ):
+        sys_args = [
+            mainparser.CLONE_PARSER,
+            *BASE_ARGS,
+            "--mn",
+            *REPO_NAMES,
+            "--sf",
+            str(students_file),
+            "--task-jobs",
+            "0",
+        ]
+
+        with pytest.raises(exception.ParseError) as exc_info:
+            _repobee.cli.parsing.handle_args(sys_args)
+
+        assert "--task-jobs" in str(exc_info.value)
 
     @pytest.mark.parametrize(
         "parser, extra_args",
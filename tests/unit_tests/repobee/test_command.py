@@ -1,5 +1,6 @@
 import os
 import pathlib
+import types
 from functools import partial
 from unittest import mock
 from unittest.mock import patch, MagicMock, call, PropertyMock
@@ -13,6 +14,7 @@ from _repobee import git
 from _repobee import util
 from _repobee import exception
 from _repobee import plugin
+from _repobee.journal import Journal
 
 import repobee_plug as plug
 
@@ -86,9 +88,11 @@ def get_repo_urls_fake(self, master_repo_names, org_name=None, teams=None):
     return list(
         map(
             generate_repo_url,
-            master_repo_names
-            if not teams
-            else plug.generate_repo_names(teams, master_repo_names),
+            (
+                master_repo_names
+                if not teams
+                else plug.generate_repo_names(teams, master_repo_names)
+            ),
         )
     )
 
@@ -118,6 +122,12 @@ def git_mock(request, mocker):
     pt = _repobee.git.Push
     git_mock = mocker.patch("_repobee.command.repos.git", autospec=True)
     git_mock.Push = pt
+    git_mock.Pull = _repobee.git.Pull
+    git_mock.mirror_cache.return_value = _repobee.git.mirror_cache()
+    git_mock.partition_up_to_date.side_effect = lambda push_tuples: (
+        list(push_tuples),
+        [],
+    )
     return git_mock
 
 
@@ -248,6 +258,13 @@ def tmpdir_mock(mocker, tmpdir):
     return mock
 
 
+@pytest.fixture(autouse=True)
+def scratch_dir_mock(mocker, tmpdir):
+    mock = mocker.patch("_repobee.util.scratch_dir", autospec=True)
+    mock.return_value.__enter__.return_value = pathlib.Path(str(tmpdir))
+    return mock
+
+
 def assert_raises_on_duplicate_master_urls(function, master_urls, students):
     """Test for functions that take master_urls and students args."""
 
@@ -268,8 +285,10 @@ class TestSetupStudentRepos:
     def test_raises_on_clone_failure(
         self, master_urls, students, git_mock, api_mock
     ):
-        git_mock.clone_single.side_effect = lambda url, cwd: raise_(
-            exception.CloneFailedError("clone failed", 128, b"some error", url)
+        git_mock.clone_all.side_effect = lambda urls, cwd, references: raise_(
+            exception.CloneFailedError(
+                "clone failed", 128, b"some error", urls[0]
+            )
         )()
 
         with pytest.raises(exception.CloneFailedError) as exc_info:
@@ -286,6 +305,56 @@ class TestSetupStudentRepos:
             command.setup_student_repos(master_urls, students, api_mock)
         assert str(exc_info.value) == "master_repo_urls contains duplicates"
 
+    def test_pushes_from_local_master_repo_without_cloning_it(
+        self,
+        master_urls,
+        students,
+        api_mock,
+        git_mock,
+        ensure_teams_and_members_mock,
+        tmpdir,
+    ):
+        local_path = pathlib.Path(str(tmpdir)) / "local" / "week-4"
+        cloned_paths = [
+            os.path.join(str(tmpdir), util.repo_name(url))
+            for url in master_urls
+        ]
+
+        command.setup_student_repos(
+            master_urls + [local_path.as_uri()], students, api_mock
+        )
+
+        git_mock.clone_all.assert_called_once_with(
+            master_urls, cwd=str(tmpdir), references={}
+        )
+        git_mock.repack_for_push.assert_called_once_with(cloned_paths)
+        (push_tuples,), _ = git_mock.push.call_args
+        local_push_tuples = [
+            pt for pt in push_tuples if pt.local_path == str(local_path)
+        ]
+        assert len(local_push_tuples) == len(students)
+        assert all(pt.branch == "HEAD:master" for pt in local_push_tuples)
+
+    def test_clones_local_master_repo_if_setup_task_persists_changes(
+        self, master_urls, students, api_mock, git_mock, tmpdir
+    ):
+        @plug.repobee_hook
+        def setup_task():
+            return plug.Task(act=lambda path, api: None, persist_changes=True)
+
+        module = types.ModuleType("persisting_task")
+        module.setup_task = setup_task
+        plugin.register_plugins([module])
+        urls = master_urls + [
+            (pathlib.Path(str(tmpdir)) / "local" / "week-4").as_uri()
+        ]
+
+        command.setup_student_repos(urls, students, api_mock)
+
+        git_mock.clone_all.assert_called_once_with(
+            urls, cwd=str(tmpdir), references={}
+        )
+
     def test_happy_path(
         self,
         mocker,
@@ -299,17 +368,98 @@ class TestSetupStudentRepos:
         tmpdir,
     ):
         """Test that setup_student_repos makes the correct function calls."""
-        expected_clone_calls = [
-            call(url, cwd=str(tmpdir)) for url in master_urls
-        ]
-
         command.setup_student_repos(master_urls, students, api_mock)
 
-        git_mock.clone_single.assert_has_calls(expected_clone_calls)
+        git_mock.clone_all.assert_called_once_with(
+            master_urls, cwd=str(tmpdir), references={}
+        )
         api_mock.ensure_teams_and_members.assert_called_once_with(students)
         api_mock.create_repos.assert_called_once_with(repo_infos)
+        git_mock.repack_for_push.assert_called_once_with(
+            [
+                os.path.join(str(tmpdir), util.repo_name(url))
+                for url in master_urls
+            ]
+        )
         git_mock.push.assert_called_once_with(push_tuples)
 
+    def test_resumes_from_journal(
+        self,
+        master_urls,
+        students,
+        api_mock,
+        git_mock,
+        repo_infos,
+        push_tuples,
+        tmpdir,
+    ):
+        """Test that steps recorded in the journal are skipped, and that the
+        journal is removed when all steps have been completed.
+        """
+        api_mock.ensure_teams_and_members.side_effect = lambda teams: [
+            plug.Team(name=team.name, members=team.members, id=id)
+            for id, team in enumerate(students)
+            if team in teams
+        ]
+        git_mock.head.return_value = "abc123"
+
+        def push(push_tuples, on_success):
+            for pt in push_tuples:
+                on_success(pt)
+            return []
+
+        git_mock.push.side_effect = push
+        journal_path = pathlib.Path(str(tmpdir)) / "journal.jsonl"
+        journal = Journal(journal_path)
+        journal.record(Journal.TEAM_ENSURED, students[0].name, id=0)
+        journal.record(Journal.REPO_CREATED, repo_infos[0].name)
+        journal.record(
+            Journal.PUSH_SUCCEEDED, repo_infos[0].name, sha="abc123"
+        )
+
+        command.setup_student_repos(
+            master_urls,
+            students,
+            api_mock,
+            journal=Journal(journal_path, resume=True),
+        )
+
+        api_mock.ensure_teams_and_members.assert_called_once_with(students[1:])
+        assert [
+            repo
+            for (repos,), _ in api_mock.create_repos.call_args_list
+            for repo in repos
+        ] == repo_infos[1:]
+        api_mock.get_repo_urls.assert_called_once_with([repo_infos[0].name])
+        git_mock.push.assert_called_once_with(
+            push_tuples[1:], on_success=mock.ANY
+        )
+        assert not journal_path.exists()
+
+    def test_creates_repos_with_single_call_and_journals_them(
+        self,
+        master_urls,
+        students,
+        api_mock,
+        git_mock,
+        ensure_teams_and_members_mock,
+        repo_infos,
+        tmpdir,
+    ):
+        journal = Journal(pathlib.Path(str(tmpdir)) / "journal.jsonl")
+        # the journal is kept if a push fails
+        git_mock.push.return_value = ["failed-push"]
+
+        command.setup_student_repos(
+            master_urls, students, api_mock, journal=journal
+        )
+
+        api_mock.create_repos.assert_called_once_with(repo_infos)
+        journaled = Journal(journal.path, resume=True).completed(
+            Journal.REPO_CREATED
+        )
+        assert sorted(journaled) == sorted(info.name for info in repo_infos)
+
 
 class TestUpdateStudentRepos:
     """Tests for update_student_repos."""
@@ -341,15 +491,78 @@ class TestUpdateStudentRepos:
 
         NOTE: Ignores the git mock.
         """
-        expected_clone_calls = [
-            call(url, cwd=str(tmpdir)) for url in master_urls
-        ]
-
         command.update_student_repos(master_urls, students, api_mock)
 
-        git_mock.clone_single.assert_has_calls(expected_clone_calls)
+        git_mock.clone_all.assert_called_once_with(
+            master_urls, cwd=str(tmpdir), references={}
+        )
+        git_mock.partition_up_to_date.assert_called_once_with(push_tuples)
         git_mock.push.assert_called_once_with(push_tuples)
 
+    def test_only_pushes_to_outdated_repos(
+        self, git_mock, master_urls, students, api_mock, push_tuples
+    ):
+        outdated = push_tuples[: len(push_tuples) // 3]
+        up_to_date = push_tuples[len(push_tuples) // 3 :]
+        git_mock.partition_up_to_date.side_effect = None
+        git_mock.partition_up_to_date.return_value = (outdated, up_to_date)
+
+        command.update_student_repos(master_urls, students, api_mock)
+
+        git_mock.push.assert_called_once_with(outdated)
+
+    def test_journals_pushes_and_keeps_journal_on_failure(
+        self, git_mock, master_urls, students, api_mock, push_tuples, tmpdir
+    ):
+        git_mock.head.return_value = "abc123"
+        fail_pt = push_tuples[1]
+
+        def push(push_tuples, on_success):
+            for pt in push_tuples:
+                if pt != fail_pt:
+                    on_success(pt)
+            return [fail_pt.repo_url]
+
+        git_mock.push.side_effect = push
+        journal = Journal(pathlib.Path(str(tmpdir)) / "journal.jsonl")
+
+        command.update_student_repos(
+            master_urls, students, api_mock, journal=journal
+        )
+
+        pushed = Journal(journal.path, resume=True).completed(
+            Journal.PUSH_SUCCEEDED
+        )
+        assert sorted(pushed) == sorted(
+            util.repo_name(pt.repo_url) for pt in push_tuples if pt != fail_pt
+        )
+        assert all(data == {"sha": "abc123"} for data in pushed.values())
+
+    def test_skips_pushes_of_same_commit_recorded_in_journal(
+        self, git_mock, master_urls, students, api_mock, push_tuples, tmpdir
+    ):
+        git_mock.head.return_value = "new-sha"
+        journal = Journal(pathlib.Path(str(tmpdir)) / "journal.jsonl")
+        journal.record(
+            Journal.PUSH_SUCCEEDED,
+            util.repo_name(push_tuples[0].repo_url),
+            sha="new-sha",
+        )
+        journal.record(
+            Journal.PUSH_SUCCEEDED,
+            util.repo_name(push_tuples[1].repo_url),
+            sha="old-sha",
+        )
+
+        command.update_student_repos(
+            master_urls,
+            students,
+            api_mock,
+            journal=Journal(journal.path, resume=True),
+        )
+
+        git_mock.partition_up_to_date.assert_called_once_with(push_tuples[1:])
+
     @pytest.mark.nogitmock
     @pytest.mark.parametrize(
         "issue",
@@ -382,14 +595,19 @@ class TestUpdateStudentRepos:
             teams=fail_students,
         )
 
-        async def raise_specific(pt):
+        async def raise_specific(pt, pack_times=None):
             if pt.repo_url in fail_repo_urls:
                 raise exception.PushFailedError(
                     "Push failed", 128, b"some error", pt.repo_url
                 )
 
         mocker.patch("_repobee.git._push_async", side_effect=raise_specific)
-        mocker.patch("_repobee.git.clone_single")
+        mocker.patch("_repobee.git.clone_all")
+        mocker.patch("_repobee.git.repack_for_push")
+        mocker.patch(
+            "_repobee.git.partition_up_to_date",
+            side_effect=lambda push_tuples: (list(push_tuples), []),
+        )
 
         command.update_student_repos(master_urls, students, api_mock, issue)
 
@@ -426,14 +644,19 @@ class TestUpdateStudentRepos:
         ]
         fail_repo_urls = [self.generate_url(name) for name in fail_repo_names]
 
-        async def raise_specific(pt):
+        async def raise_specific(pt, pack_times=None):
             if pt.repo_url in fail_repo_urls:
                 raise exception.PushFailedError(
                     "Push failed", 128, b"some error", pt.repo_url
                 )
 
         mocker.patch("_repobee.git._push_async", side_effect=raise_specific)
-        mocker.patch("_repobee.git.clone_single")
+        mocker.patch("_repobee.git.clone_all")
+        mocker.patch("_repobee.git.repack_for_push")
+        mocker.patch(
+            "_repobee.git.partition_up_to_date",
+            side_effect=lambda push_tuples: (list(push_tuples), []),
+        )
 
         command.update_student_repos(master_urls, students, api_mock)
 
@@ -558,7 +781,55 @@ class TestCloneRepos:
         # note that the tmpdir_mock fixture sets the return value of
         # tmpdir.TemporaryDirectory to tmpdir!
         # TODO: improve assert, but as its a generator it's tricky
-        git_mock.clone.assert_called_once_with(mock.ANY, cwd=str(tmpdir))
+        git_mock.clone.assert_called_once_with(
+            mock.ANY,
+            cwd=str(tmpdir),
+            references={},
+            depth=None,
+            filter_spec=None,
+            on_success=mock.ANY,
+        )
+
+    def test_student_repos_borrow_from_mirrors_of_master_repos(
+        self, api_mock, git_mock, master_names, students
+    ):
+        master_urls = [generate_repo_url(name) for name in master_names]
+        mirrored_url, *_ = master_urls
+        mirror = pathlib.Path("mirrors") / "mirror.git"
+        cache = git_mock.mirror_cache.return_value
+        cache.cached_mirrors.return_value.__enter__.return_value = {
+            mirrored_url: mirror
+        }
+        repos = list(repo_generator(students, master_names))
+
+        command.clone_repos(repos, api_mock, master_repo_urls=master_urls)
+
+        cache.cached_mirrors.assert_called_once_with(master_urls)
+        expected_references = {
+            repo.url: mirror
+            for repo in repos
+            if repo.name.endswith("-" + util.repo_name(mirrored_url))
+        }
+        _, kwargs = git_mock.clone.call_args
+        assert kwargs["references"] == expected_references
+
+    def test_picks_mirror_of_longest_matching_master_repo_name(self):
+        task_mirror = pathlib.Path("task-1.git")
+        advanced_task_mirror = pathlib.Path("advanced-task-1.git")
+        mirrors = {
+            generate_repo_url("task-1"): task_mirror,
+            generate_repo_url("advanced-task-1"): advanced_task_mirror,
+        }
+        repos = list(repo_generator(["slarse"], ["task-1", "advanced-task-1"]))
+
+        references = _repobee.command.repos._find_master_mirrors(
+            repos, mirrors
+        )
+
+        assert references == {
+            generate_repo_url("slarse-task-1"): task_mirror,
+            generate_repo_url("slarse-advanced-task-1"): advanced_task_mirror,
+        }
 
     def test_executes_act_hooks(
         self, api_mock, git_mock, master_names, students, act_mocks
@@ -608,6 +879,229 @@ class TestCloneRepos:
             assert res.status == plug.Status.SUCCESS
             assert res.name == plug_name
 
+    @pytest.mark.nogitmock
+    def test_moves_only_successful_clones_into_place(
+        self, api_mock, master_names, students, tmpdir, monkeypatch, mocker
+    ):
+        staging_dir = pathlib.Path(str(tmpdir))
+        dst_dir = staging_dir / "dst"
+        dst_dir.mkdir()
+        monkeypatch.chdir(str(dst_dir))
+        repos = list(repo_generator(students[:2], master_names[:1]))
+        api_mock.extract_repo_name.side_effect = util.repo_name
+
+        def clone(repo_urls, cwd, on_success, **kwargs):
+            for url in repo_urls:
+                (pathlib.Path(cwd) / util.repo_name(url) / ".git").mkdir(
+                    parents=True
+                )
+                if url != repos[1].url:
+                    on_success(url)
+            return [repos[1].url]
+
+        mocker.patch("_repobee.git.clone", side_effect=clone)
+
+        cloned = command.repos._clone_repos_no_check(
+            repos, str(staging_dir), api_mock
+        )
+
+        assert cloned == [repos[0].name]
+        assert (dst_dir / repos[0].name / ".git").is_dir()
+        assert not (staging_dir / repos[0].name).exists()
+        assert not (dst_dir / repos[1].name).exists()
+
+    @pytest.mark.nogitmock
+    def test_hands_over_each_repo_to_clone_tasks_when_cloned(
+        self, api_mock, master_names, students, tmpdir, monkeypatch, mocker
+    ):
+        dst_dir = pathlib.Path(str(tmpdir)) / "dst"
+        dst_dir.mkdir()
+        monkeypatch.chdir(str(dst_dir))
+        repos = list(repo_generator(students[:3], master_names[:1]))
+        api_mock.extract_repo_name.side_effect = util.repo_name
+        result = plug.Result(name="task", status=plug.Status.SUCCESS, msg="")
+
+        @plug.repobee_hook
+        def clone_task():
+            return plug.Task(act=lambda path, api: result)
+
+        module = types.ModuleType("pipelined_task")
+        module.clone_task = clone_task
+        plugin.register_plugins([module])
+
+        events = []
+        put = plugin.TaskPipeline.put
+
+        def record_put(pipeline, repo_name):
+            events.append(("handed over", repo_name))
+            put(pipeline, repo_name)
+
+        mocker.patch.object(
+            plugin.TaskPipeline, "put", autospec=True, side_effect=record_put
+        )
+
+        def clone(repo_urls, cwd, on_success, **kwargs):
+            for url in repo_urls:
+                (pathlib.Path(cwd) / util.repo_name(url) / ".git").mkdir(
+                    parents=True
+                )
+                events.append(("cloned", util.repo_name(url)))
+                on_success(url)
+            return []
+
+        mocker.patch("_repobee.git.clone", side_effect=clone)
+
+        hook_results = command.clone_repos(repos, api_mock)
+
+        assert events == [
+            event
+            for repo in repos
+            for event in [("cloned", repo.name), ("handed over", repo.name)]
+        ]
+        assert hook_results == {repo.name: [result] for repo in repos}
+
+    def test_stages_clones_near_current_directory(
+        self, api_mock, git_mock, scratch_dir_mock, master_names, students
+    ):
+        command.clone_repos(repo_generator(students, master_names), api_mock)
+
+        scratch_dir_mock.assert_called_once_with("staging", pathlib.Path("."))
+
+    def test_passes_depth_and_filter_to_git(
+        self, api_mock, git_mock, master_names, students, tmpdir
+    ):
+        command.clone_repos(
+            repo_generator(students, master_names),
+            api_mock,
+            depth=1,
+            filter_spec="blob:none",
+        )
+
+        git_mock.clone.assert_called_once_with(
+            mock.ANY,
+            cwd=str(tmpdir),
+            references={},
+            depth=1,
+            filter_spec="blob:none",
+            on_success=mock.ANY,
+        )
+
+    def test_clones_full_history_if_task_requires_it(
+        self, api_mock, git_mock, master_names, students, tmpdir
+    ):
+        @plug.repobee_hook
+        def clone_task():
+            return plug.Task(
+                act=lambda path, api: None, requires_full_history=True
+            )
+
+        module = types.ModuleType("full_history_task")
+        module.clone_task = clone_task
+        plugin.register_plugins([module])
+
+        command.clone_repos(
+            repo_generator(students, master_names),
+            api_mock,
+            depth=1,
+            filter_spec="blob:none",
+        )
+
+        git_mock.clone.assert_called_once_with(
+            mock.ANY,
+            cwd=str(tmpdir),
+            references={},
+            depth=None,
+            filter_spec=None,
+            on_success=mock.ANY,
+        )
+
+    @pytest.fixture
+    def sync_repos(self, master_names, students):
+        """Return (local, missing) repos, where the local repos are reported
+        as being git repos on disk.
+        """
+        repos = list(repo_generator(students, master_names))
+        local_repos, missing_repos = repos[::2], repos[1::2]
+        local_names = set(repo.name for repo in local_repos)
+        with patch(
+            "_repobee.util.is_git_repo",
+            side_effect=lambda path: path in local_names,
+        ):
+            yield local_repos, missing_repos
+
+    def test_sync_only_executes_tasks_on_changed_repos(
+        self, api_mock, git_mock, sync_repos, mocker
+    ):
+        local_repos, missing_repos = sync_repos
+        changed_repos, unchanged_repos = local_repos[::2], local_repos[1::2]
+        heads = {repo.url: ("old", "new") for repo in changed_repos}
+        heads.update({repo.url: ("old", "old") for repo in unchanged_repos})
+        git_mock.pull.return_value = (heads, [])
+        git_mock.head.return_value = "new"
+        mocker.patch(
+            "_repobee.command.repos._clone_repos_no_check",
+            autospec=True,
+            return_value=[repo.name for repo in missing_repos],
+        )
+        execute_clone_tasks = mocker.patch(
+            "_repobee.plugin.execute_clone_tasks",
+            autospec=True,
+            return_value={},
+        )
+
+        hook_results = command.clone_repos(
+            local_repos + missing_repos, api_mock, sync=True
+        )
+
+        expected_task_repo_names = [
+            repo.name for repo in changed_repos + missing_repos
+        ]
+        task_repo_names, _ = execute_clone_tasks.call_args[0]
+        assert sorted(task_repo_names) == sorted(expected_task_repo_names)
+        assert git_mock.pull.call_count == 1
+        pulled_urls = [pt.repo_url for pt in git_mock.pull.call_args[0][0]]
+        assert pulled_urls == [repo.url for repo in local_repos]
+        for repo in changed_repos:
+            assert hook_results[repo.name][0].data == dict(
+                old_sha="old", new_sha="new"
+            )
+        for repo in unchanged_repos:
+            assert hook_results[repo.name][0].data == dict(
+                old_sha="old", new_sha="old"
+            )
+        for repo in missing_repos:
+            assert hook_results[repo.name][0].data == dict(
+                old_sha=None, new_sha="new"
+            )
+
+    def test_sync_reports_error_on_failed_pull(
+        self, api_mock, git_mock, sync_repos, mocker
+    ):
+        local_repos, _ = sync_repos
+        failed_repo, *ok_repos = local_repos
+        git_mock.pull.return_value = (
+            {repo.url: ("old", "new") for repo in ok_repos},
+            [failed_repo.url],
+        )
+        mocker.patch(
+            "_repobee.command.repos._clone_repos_no_check",
+            autospec=True,
+            return_value=[],
+        )
+        execute_clone_tasks = mocker.patch(
+            "_repobee.plugin.execute_clone_tasks",
+            autospec=True,
+            return_value={},
+        )
+
+        hook_results = command.clone_repos(local_repos, api_mock, sync=True)
+
+        task_repo_names, _ = execute_clone_tasks.call_args[0]
+        assert failed_repo.name not in task_repo_names
+        result = hook_results[failed_repo.name][0]
+        assert result.name == "sync"
+        assert result.status == plug.Status.ERROR
+
 
 class TestMigrateRepo:
     """Tests for migrate_repo."""
@@ -634,21 +1128,17 @@ class TestMigrateRepo:
             )
             for name, url in zip(master_names, expected_push_urls)
         ]
-        expected_clone_calls = [
-            call(url, cwd=str(tmpdir)) for url in master_urls
-        ]
-
         api_mock.create_repos.side_effect = lambda infos: [
             generate_repo_url(info.name) for info in infos
         ]
-        git_clone_mock = mocker.patch(
-            "_repobee.git.clone_single", autospec=True
-        )
+        git_clone_mock = mocker.patch("_repobee.git.clone_all", autospec=True)
         git_push_mock = mocker.patch("_repobee.git.push", autospec=True)
 
         command.migrate_repos(master_urls, api_mock)
 
-        git_clone_mock.assert_has_calls(expected_clone_calls)
+        git_clone_mock.assert_called_once_with(
+            master_urls, cwd=str(tmpdir), references={}
+        )
         assert api_mock.create_repos.called
         assert (
             not api_mock.ensure_teams_and_members.called
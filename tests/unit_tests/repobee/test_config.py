@@ -6,6 +6,8 @@ import pytest
 import _repobee.constants
 from _repobee import config
 from _repobee import exception
+from _repobee import git
+from _repobee import taskcache
 
 import constants
 
@@ -137,6 +139,126 @@ class TestGetPluginNames:
         assert plugin_names == expected_plugins
 
 
+class TestGetGitSettings:
+    """Tests for get_git_settings."""
+
+    def test_with_no_config_file(self, unused_path):
+        assert config.get_git_settings(unused_path) == {}
+
+    def test_with_full_config(self, config_mock):
+        """The full config does not contain any git settings."""
+        assert config.get_git_settings(str(config_mock)) == {}
+
+    def test_with_git_settings(self, empty_config_mock):
+        empty_config_mock.write(
+            os.linesep.join(
+                [
+                    "[{}]".format(_repobee.constants.DEFAULTS_SECTION_HDR),
+                    "git_min_concurrency = 2",
+                    "git_max_concurrency = 100",
+                    "git_push_tries = 5",
+                    "git_timeout = 60",
+                ]
+            )
+        )
+
+        settings = config.get_git_settings(str(empty_config_mock))
+
+        assert settings == dict(
+            min_concurrency=2, max_concurrency=100, push_tries=5, timeout=60
+        )
+
+    def test_accepts_zero_timeout(self, empty_config_mock):
+        empty_config_mock.write(
+            os.linesep.join(
+                [
+                    "[{}]".format(_repobee.constants.DEFAULTS_SECTION_HDR),
+                    "git_timeout = 0",
+                ]
+            )
+        )
+
+        settings = config.get_git_settings(str(empty_config_mock))
+
+        assert settings == dict(timeout=0)
+
+    @pytest.mark.parametrize("value", ["0", "-1", "many", "1.5"])
+    def test_raises_on_invalid_value(self, value, empty_config_mock):
+        empty_config_mock.write(
+            os.linesep.join(
+                [
+                    "[{}]".format(_repobee.constants.DEFAULTS_SECTION_HDR),
+                    "git_max_concurrency = {}".format(value),
+                ]
+            )
+        )
+
+        with pytest.raises(exception.FileError) as exc_info:
+            config.get_git_settings(str(empty_config_mock))
+
+        assert "git_max_concurrency" in str(exc_info.value)
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            ["git_min_concurrency = 10", "git_max_concurrency = 5"],
+            ["git_min_concurrency = {}".format(git.MAX_CONCURRENT_TASKS + 1)],
+        ],
+    )
+    def test_raises_when_min_concurrency_exceeds_max(
+        self, options, empty_config_mock
+    ):
+        empty_config_mock.write(
+            os.linesep.join(
+                ["[{}]".format(_repobee.constants.DEFAULTS_SECTION_HDR)]
+                + options
+            )
+        )
+
+        with pytest.raises(exception.FileError) as exc_info:
+            config.get_git_settings(str(empty_config_mock))
+
+        assert "git_min_concurrency" in str(exc_info.value)
+
+
+class TestGetTaskCacheSize:
+    """Tests for get_task_cache_size."""
+
+    def test_defaults_without_config_file(self, unused_path):
+        assert (
+            config.get_task_cache_size(unused_path)
+            == taskcache.DEFAULT_TASK_CACHE_SIZE
+        )
+
+    def test_with_configured_size(self, empty_config_mock):
+        empty_config_mock.write(
+            os.linesep.join(
+                [
+                    "[{}]".format(_repobee.constants.DEFAULTS_SECTION_HDR),
+                    "task_cache_size = 10",
+                ]
+            )
+        )
+
+        assert config.get_task_cache_size(str(empty_config_mock)) == 10
+
+    @pytest.mark.parametrize("value", ["0", "-1", "many"])
+    def test_raises_on_invalid_value(self, value, empty_config_mock):
+        empty_config_mock.write(
+            os.linesep.join(
+                [
+                    "[{}]".format(_repobee.constants.DEFAULTS_SECTION_HDR),
+                    "task_cache_size = {}".format(value),
+                ]
+            )
+        )
+
+        with pytest.raises(exception.FileError) as exc_info:
+            config.get_task_cache_size(str(empty_config_mock))
+
+        assert "task_cache_size" in str(exc_info.value)
+
+
 class TestExecuteConfigHooks:
     """Tests for execute_config_hooks."""
 
@@ -0,0 +1,122 @@
+"""Tests for the hookresults module."""
+import pathlib
+from unittest import mock
+
+import pytest
+
+import repobee_plug as plug
+
+from _repobee import hookresults
+
+
+@pytest.fixture
+def records_path(tmpdir):
+    return pathlib.Path(str(tmpdir)) / "results.json.jsonl"
+
+
+def _result(name, msg="Some message", status=plug.Status.SUCCESS):
+    return plug.Result(
+        name=name, status=status, msg=msg, data={"nested": {"data": [1]}}
+    )
+
+
+HOOK_RESULTS = {
+    "slarse-task-1": [
+        _result("javac"),
+        _result("pylint", msg="Ünicode", status=plug.Status.WARNING),
+    ],
+    "glassey-task-1": [_result("javac", status=plug.Status.ERROR)],
+    "glassey-task-2": [],
+}
+
+
+class TestHookResultsWriter:
+    """Tests for the HookResultsWriter class."""
+
+    def test_does_not_create_file_without_results(self, records_path):
+        with hookresults.HookResultsWriter(records_path) as writer:
+            writer.write("slarse-task-1", [])
+
+        assert not records_path.exists()
+        assert not writer.written
+
+    def test_records_are_readable_before_close(self, records_path):
+        writer = hookresults.HookResultsWriter(records_path)
+
+        writer.write("slarse-task-1", HOOK_RESULTS["slarse-task-1"])
+
+        assert hookresults.read_records(records_path) == {
+            "slarse-task-1": HOOK_RESULTS["slarse-task-1"]
+        }
+        writer.close()
+
+    def test_fsyncs_periodically_and_on_close(self, records_path):
+        with mock.patch(
+            "_repobee.hookresults.os.fsync", autospec=True
+        ) as fsync, mock.patch(
+            "_repobee.hookresults.time.monotonic",
+            autospec=True,
+            side_effect=[0, 1, 2, 10, 11, 12],
+        ):
+            writer = hookresults.HookResultsWriter(
+                records_path, fsync_interval=5
+            )
+            for repo_name in ["a", "b", "c"]:
+                writer.write(repo_name, [_result("javac")])
+            assert fsync.call_count == 1
+
+            writer.close()
+            assert fsync.call_count == 2
+
+
+class TestCompact:
+    """Tests for the compact function."""
+
+    def test_output_is_identical_to_result_mapping_to_json(self, records_path):
+        dst = records_path.parent / "results.json"
+        with hookresults.HookResultsWriter(records_path) as writer:
+            for repo_name, results in HOOK_RESULTS.items():
+                writer.write(repo_name, results)
+
+        assert hookresults.compact(records_path, dst) == 2
+        assert dst.read_text(encoding="utf8") == plug.result_mapping_to_json(
+            {
+                name: results
+                for name, results in HOOK_RESULTS.items()
+                if results
+            }
+        )
+
+    def test_empty_records(self, records_path):
+        dst = records_path.parent / "results.json"
+        records_path.write_text("")
+
+        assert hookresults.compact(records_path, dst) == 0
+        assert dst.read_text() == plug.result_mapping_to_json({})
+
+    def test_merges_records_of_same_repo(self, records_path):
+        dst = records_path.parent / "results.json"
+        with hookresults.HookResultsWriter(records_path) as writer:
+            writer.write("slarse-task-1", [_result("sync"), _result("javac")])
+            writer.write("glassey-task-1", [_result("sync")])
+            writer.write("slarse-task-1", [_result("javac", msg="Again")])
+
+        hookresults.compact(records_path, dst)
+
+        assert plug.json_to_result_mapping(dst.read_text("utf8")) == {
+            "slarse-task-1": [_result("sync"), _result("javac", msg="Again")],
+            "glassey-task-1": [_result("sync")],
+        }
+
+    def test_skips_partially_written_last_record(self, records_path):
+        dst = records_path.parent / "results.json"
+        with hookresults.HookResultsWriter(records_path) as writer:
+            writer.write("slarse-task-1", [_result("javac")])
+        with open(str(records_path), "a") as file:
+            file.write('{"repo": "glassey-task-1", "resu')
+
+        hookresults.compact(records_path, dst)
+
+        assert plug.json_to_result_mapping(dst.read_text("utf8")) == {
+            "slarse-task-1": [_result("javac")]
+        }
@@ -0,0 +1,169 @@
+"""Tests for the httpcache module."""
+import os
+import pathlib
+from concurrent import futures
+from unittest import mock
+
+import pytest
+
+from _repobee import httpcache
+
+URL = "https://api.github.com/orgs/some-org/teams"
+BODY = '[{"name": "some-team"}]'
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return httpcache.ConditionalRequestCache(
+        pathlib.Path(str(tmpdir)) / "http", scope="token"
+    )
+
+
+class FakeServer:
+    """Responds with 304 to requests that carry a matching validator."""
+
+    def __init__(self, headers=None, body=BODY):
+        self.headers = {"ETag": '"abc"'} if headers is None else headers
+        self.body = body
+        self.requests = []
+
+    def send(self, headers):
+        self.requests.append(headers)
+        validators = {
+            ("If-None-Match", self.headers.get("ETag")),
+            ("If-Modified-Since", self.headers.get("Last-Modified")),
+        }
+        if validators & set(headers.items()):
+            return 304, {"X-RateLimit-Remaining": "5000"}, None
+        return 200, dict(self.headers), self.body
+
+
+class TestConditionalRequestCache:
+    """Tests for the ConditionalRequestCache class."""
+
+    def test_revalidates_cached_response(self, cache):
+        server = FakeServer()
+
+        first = cache.get(URL, {"Accept": "json"}, server.send)
+        second = cache.get(URL, {"Accept": "json"}, server.send)
+
+        assert first[2] == second[2] == BODY
+        assert second[0] == 200
+        assert second[1]["x-ratelimit-remaining"] == "5000"
+        assert server.requests == [
+            {"Accept": "json"},
+            {"Accept": "json", "If-None-Match": '"abc"'},
+        ]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_revalidates_with_last_modified(self, cache):
+        date = "Mon, 05 Oct 2020 12:00:00 GMT"
+        server = FakeServer(headers={"Last-Modified": date})
+
+        cache.get(URL, {}, server.send)
+        cache.get(URL, {}, server.send)
+
+        assert server.requests[-1] == {"If-Modified-Since": date}
+        assert cache.hits == 1
+
+    def test_decodes_bytes_body(self, cache):
+        server = FakeServer(body=BODY.encode("utf8"))
+
+        cache.get(URL, {}, server.send)
+
+        assert cache.get(URL, {}, server.send)[2] == BODY
+
+    def test_does_not_cache_response_without_validators(self, cache):
+        server = FakeServer(headers={})
+
+        cache.get(URL, {}, server.send)
+        cache.get(URL, {}, server.send)
+
+        assert server.requests == [{}, {}]
+        assert not cache.root.exists()
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    def test_responses_are_scoped(self, cache):
+        server = FakeServer()
+        cache.get(URL, {}, server.send)
+
+        other_cache = httpcache.ConditionalRequestCache(
+            cache.root, scope="other token"
+        )
+        other_cache.get(URL, {}, server.send)
+
+        assert server.requests == [{}, {}]
+        assert other_cache.misses == 1
+
+    def test_responses_are_keyed_by_accept_header(self, cache):
+        server = FakeServer()
+        cache.get(URL, {"Accept": "json"}, server.send)
+
+        cache.get(URL, {"Accept": "preview+json"}, server.send)
+        cache.get(URL, {"accept": "json"}, server.send)
+
+        assert server.requests == [
+            {"Accept": "json"},
+            {"Accept": "preview+json"},
+            {"accept": "json", "If-None-Match": '"abc"'},
+        ]
+
+    def test_scope_is_not_stored(self, cache):
+        cache.get(URL, {}, FakeServer().send)
+
+        (entry,) = cache.root.iterdir()
+        assert "token" not in entry.name
+        assert "token" not in entry.read_text()
+
+    def test_evicts_least_recently_used_entries(self, cache):
+        server = FakeServer()
+        for i in range(3):
+            cache.get("{}?page={}".format(URL, i), {}, server.send)
+        entries = sorted(
+            cache.root.iterdir(), key=lambda path: path.stat().st_mtime
+        )
+        for i, entry in enumerate(entries):
+            os.utime(str(entry), (i, i))
+        cache.max_size = (
+            entries[-1].stat().st_size + entries[-2].stat().st_size
+        ) / (1024 * 1024)
+
+        cache.evict()
+
+        assert sorted(cache.root.iterdir()) == sorted(entries[1:])
+
+    def test_ignores_corrupt_entries(self, cache):
+        server = FakeServer()
+        cache.get(URL, {}, server.send)
+        (entry,) = cache.root.iterdir()
+        entry.write_text('{"status": 200, "head')
+
+        assert cache.get(URL, {}, server.send)[2] == BODY
+        assert server.requests == [{}, {}]
+
+    def test_counts_requests_from_concurrent_threads(self, cache):
+        server = FakeServer()
+        cache.get(URL, {}, server.send)
+
+        with futures.ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(200):
+                executor.submit(cache.get, URL, {}, server.send)
+
+        assert (cache.hits, cache.misses) == (200, 1)
+
+
+def test_log_stats_logs_totals_of_all_caches_once(tmpdir):
+    httpcache.log_stats()  # reset counts of other tests
+    server = FakeServer()
+    for scope in ["token", "other token"]:
+        cache = httpcache.ConditionalRequestCache(
+            pathlib.Path(str(tmpdir)) / "http", scope=scope
+        )
+        cache.get(URL, {}, server.send)
+        cache.get(URL, {}, server.send)
+
+    with mock.patch("_repobee.httpcache.LOGGER", autospec=True) as logger:
+        httpcache.log_stats()
+        httpcache.log_stats()
+
+    logger.info.assert_called_once_with("HTTP cache: 2 hits, 2 misses")
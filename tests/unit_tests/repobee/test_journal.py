@@ -0,0 +1,98 @@
+import pathlib
+from unittest import mock
+
+import pytest
+
+from _repobee.journal import Journal
+
+
+@pytest.fixture
+def journal_path(tmpdir):
+    return pathlib.Path(str(tmpdir)) / "journal.jsonl"
+
+
+class TestJournal:
+    """Tests for the Journal class."""
+
+    def test_resumes_recorded_steps(self, journal_path):
+        journal = Journal(journal_path)
+        journal.record(Journal.TEAM_ENSURED, "some-team", id=3)
+        journal.record(Journal.PUSH_SUCCEEDED, "some-repo", sha="abc123")
+
+        resumed = Journal(journal_path, resume=True)
+
+        assert resumed.completed(Journal.TEAM_ENSURED) == {
+            "some-team": {"id": 3}
+        }
+        assert resumed.completed(Journal.PUSH_SUCCEEDED) == {
+            "some-repo": {"sha": "abc123"}
+        }
+        assert not resumed.completed(Journal.REPO_CREATED)
+
+    def test_discards_existing_journal_when_not_resuming(self, journal_path):
+        Journal(journal_path).record(Journal.REPO_CREATED, "some-repo")
+
+        journal = Journal(journal_path)
+
+        assert not journal_path.exists()
+        assert not journal.completed(Journal.REPO_CREATED)
+
+    def test_discards_partially_written_last_line(self, journal_path):
+        journal = Journal(journal_path)
+        journal.record(Journal.REPO_CREATED, "first-repo")
+        with open(str(journal_path), mode="a", encoding="utf8") as file:
+            file.write('{"step": "repo-created", "key": "sec')
+
+        resumed = Journal(journal_path, resume=True)
+        resumed.record(Journal.REPO_CREATED, "third-repo")
+
+        assert set(
+            Journal(journal_path, resume=True).completed(Journal.REPO_CREATED)
+        ) == {"first-repo", "third-repo"}
+
+    def test_for_command_maps_same_arguments_to_same_journal(
+        self, journal_dir
+    ):
+        journal = Journal.for_command("setup", ["a", "b"])
+        same = Journal.for_command("setup", ["b", "a"])
+        other = Journal.for_command("setup", ["a", "c"])
+
+        assert journal.path == same.path != other.path
+        assert journal.path.parent == journal_dir
+
+    def test_remove(self, journal_path):
+        journal = Journal(journal_path)
+        journal.record(Journal.REPO_CREATED, "some-repo")
+
+        journal.remove()
+
+        assert not journal_path.exists()
+
+    def test_batches_fsyncs(self, journal_path, mocker):
+        fsync_mock = mocker.patch("os.fsync", autospec=True)
+        journal = Journal(journal_path)
+
+        for i in range(10):
+            journal.record(Journal.REPO_CREATED, "repo-{}".format(i))
+        assert not fsync_mock.called
+        journal.sync()
+
+        fsync_mock.assert_called_once_with(mock.ANY)
+        assert (
+            len(
+                Journal(journal_path, resume=True).completed(
+                    Journal.REPO_CREATED
+                )
+            )
+            == 10
+        )
+
+    def test_fsyncs_after_sync_interval(self, journal_path, mocker):
+        fsync_mock = mocker.patch("os.fsync", autospec=True)
+        mocker.patch.object(Journal, "SYNC_INTERVAL", 0)
+        journal = Journal(journal_path)
+
+        journal.record(Journal.REPO_CREATED, "some-repo")
+        journal.sync()
+
+        fsync_mock.assert_called_once_with(mock.ANY)
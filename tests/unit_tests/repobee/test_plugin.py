@@ -1,14 +1,17 @@
 """
-    .. important::
+.. important::
 
-        This test class relies on the vanilla configuration of ``repobee``.
-        That is to say, only the default plugins are allowed. If you have
-        installed any other plugins, tests in here may fail unexpectedly
-        without anything actually being wrong.
+    This test class relies on the vanilla configuration of ``repobee``.
+    That is to say, only the default plugins are allowed. If you have
+    installed any other plugins, tests in here may fail unexpectedly
+    without anything actually being wrong.
 """
+import os
 import shutil
 import pathlib
 import tempfile
+import time
+import threading
 import types
 from unittest.mock import call, MagicMock, patch
 
@@ -29,6 +32,56 @@ import constants
 PLUGINS = constants.PLUGINS
 
 
+def _act_first(path, api):
+    return _pid_result("first", path)
+
+
+def _act_second(path, api):
+    return _pid_result("second", path)
+
+
+def _act_third(path, api):
+    return _pid_result("third", path)
+
+
+def _pid_result(name, path):
+    return plug.Result(
+        name=name,
+        status=plug.Status.SUCCESS,
+        msg=path.name,
+        data={"pid": os.getpid()},
+    )
+
+
+# amount of seconds that _act_slow takes
+_SLOW_ACT_DURATION = 1
+
+
+def _act_slow(path, api):
+    time.sleep(_SLOW_ACT_DURATION)
+    return _pid_result("slow", path)
+
+
+def _act_crash(path, api):
+    raise ValueError("crash")
+
+
+def _act_with_api(path, api):
+    return plug.Result(
+        name="api",
+        status=plug.Status.SUCCESS,
+        msg=path.name,
+        data={"pid": os.getpid(), "api_pid": api.pid},
+    )
+
+
+class _ProcessAPI(plug.API):
+    """An API that remembers which process it was created in."""
+
+    def __init__(self, base_url, token, org_name, user):
+        self.pid = os.getpid()
+
+
 @pytest.fixture(autouse=True)
 def unregister_plugins():
     """Unregister all plugins for each test."""
@@ -204,6 +257,240 @@ class TestTasks:
         res = results[repo_name][0]
         assert res.data["path"] != repo_path
 
+    def test_repo_copies_are_not_created_in_cwd(self, tmpdir, scratch_dir):
+        repo_name = "task-1"
+        cwd = pathlib.Path(str(tmpdir)) / "cwd"
+        (cwd / repo_name).mkdir(parents=True)
+
+        def act(path, api):
+            assert os.listdir(str(cwd)) == [repo_name]
+            return plug.Result(
+                name="task",
+                status=plug.Status.SUCCESS,
+                msg="",
+                data={"path": path},
+            )
+
+        results = plugin._execute_tasks(
+            [repo_name], [plug.Task(act=act)], api=None, cwd=cwd
+        )
+
+        assert results[repo_name][0].data["path"].parent.parent == scratch_dir
+        assert os.listdir(str(cwd)) == [repo_name]
+
+    def test_parallel_results_are_ordered_by_task(self, tmpdir):
+        repo_names = ["task-{}".format(i) for i in range(5)]
+        cwd = pathlib.Path(str(tmpdir))
+        for repo_name in repo_names:
+            (cwd / repo_name).mkdir()
+
+        tasks = [
+            plug.Task(act=_act_first),
+            plug.Task(act=_act_second, parallel_safe=False),
+            plug.Task(act=_act_third),
+        ]
+
+        results = plugin._execute_tasks(
+            repo_names, tasks, api=None, cwd=cwd, jobs=2
+        )
+
+        assert sorted(results) == repo_names
+        for repo_name, repo_results in results.items():
+            assert [res.name for res in repo_results] == [
+                "first",
+                "second",
+                "third",
+            ]
+            assert all(res.msg == repo_name for res in repo_results)
+            first, second, third = [res.data["pid"] for res in repo_results]
+            assert second == os.getpid()
+            assert first != os.getpid() and third != os.getpid()
+
+    def test_workers_create_their_own_api_instances(self, tmpdir):
+        repo_names = ["task-1", "task-2"]
+        cwd = pathlib.Path(str(tmpdir))
+        for repo_name in repo_names:
+            (cwd / repo_name).mkdir()
+        api = _ProcessAPI("https://some-url", "token", "org", "user")
+
+        results = plugin._execute_tasks(
+            repo_names,
+            [plug.Task(act=_act_with_api)],
+            api=api,
+            cwd=cwd,
+            jobs=2,
+        )
+
+        for (res,) in results.values():
+            assert res.data["api_pid"] == res.data["pid"] != os.getpid()
+
+    def test_tasks_that_cant_be_pickled_are_executed_in_this_process(
+        self, tmpdir
+    ):
+        repo_name = "task-1"
+        cwd = pathlib.Path(str(tmpdir))
+        (cwd / repo_name).mkdir()
+
+        results = plugin._execute_tasks(
+            [repo_name],
+            [plug.Task(act=lambda path, api: _pid_result("lambda", path))],
+            api=None,
+            cwd=cwd,
+            jobs=2,
+        )
+
+        assert results[repo_name][0].data["pid"] == os.getpid()
+
+    def test_results_are_reported_as_each_repo_finishes(self, tmpdir):
+        repo_names = ["task-1", "task-2"]
+        cwd = pathlib.Path(str(tmpdir))
+        for repo_name in repo_names:
+            (cwd / repo_name).mkdir()
+        events = []
+
+        def act(path, api):
+            events.append(("act", path.name))
+            return plug.Result(
+                name="task", status=plug.Status.SUCCESS, msg=path.name
+            )
+
+        results = plugin._execute_tasks(
+            repo_names,
+            [plug.Task(act=act)],
+            api=None,
+            cwd=cwd,
+            on_results=lambda name, res: events.append(("report", name)),
+        )
+
+        acted, reported = events[0::2], events[1::2]
+        assert [name for _, name in acted] == [name for _, name in reported]
+        assert set(acted) == {("act", name) for name in repo_names}
+        assert set(reported) == {("report", name) for name in repo_names}
+        assert sorted(results) == repo_names
+
+    def test_parallel_task_crash_is_converted(self, tmpdir):
+        repo_name = "task-1"
+        cwd = pathlib.Path(str(tmpdir))
+        (cwd / repo_name).mkdir()
+
+        with pytest.raises(plug.PlugError) as exc_info:
+            plugin._execute_tasks(
+                [repo_name],
+                [plug.Task(act=_act_crash)],
+                api=None,
+                cwd=cwd,
+                jobs=2,
+            )
+
+        assert "crashed unexpectedly" in str(exc_info.value)
+        assert isinstance(exc_info.value.__cause__, ValueError)
+
+
+class TestTaskPipeline:
+    """Tests for the TaskPipeline class."""
+
+    @pytest.fixture
+    def cwd(self, tmpdir):
+        cwd = pathlib.Path(str(tmpdir))
+        for i in range(3):
+            (cwd / "task-{}".format(i)).mkdir()
+        return cwd
+
+    @staticmethod
+    def _act(path, api):
+        return plug.Result(name="task", status=plug.Status.SUCCESS, msg="")
+
+    def test_executes_tasks_on_handed_over_repos(self, cwd):
+        reported = []
+
+        with plugin.TaskPipeline(
+            [plug.Task(act=self._act)],
+            api=None,
+            cwd=cwd,
+            on_results=lambda name, _: reported.append(name),
+        ) as pipeline:
+            pipeline.put("task-0")
+            pipeline.put("task-2")
+
+        result = self._act(None, None)
+        assert pipeline.results == {"task-0": [result], "task-2": [result]}
+        assert sorted(reported) == ["task-0", "task-2"]
+
+    def test_put_does_not_wait_for_tasks(self, cwd):
+        with plugin.TaskPipeline(
+            [plug.Task(act=_act_slow)], api=None, cwd=cwd, jobs=2
+        ) as pipeline:
+            start = time.monotonic()
+            pipeline.put("task-0")
+            pipeline.put("task-1")
+            handover_time = time.monotonic() - start
+
+        assert handover_time < _SLOW_ACT_DURATION
+        assert sorted(pipeline.results) == ["task-0", "task-1"]
+        for (res,) in pipeline.results.values():
+            assert res.data["pid"] != os.getpid()
+
+    def test_executes_tasks_in_this_process_with_one_job(self, cwd):
+        with plugin.TaskPipeline(
+            [plug.Task(act=_act_slow)], api=None, cwd=cwd
+        ) as pipeline:
+            start = time.monotonic()
+            pipeline.put("task-0")
+            pipeline.put("task-1")
+            handover_time = time.monotonic() - start
+
+        assert handover_time < _SLOW_ACT_DURATION
+        assert sorted(pipeline.results) == ["task-0", "task-1"]
+        for (res,) in pipeline.results.values():
+            assert res.data["pid"] == os.getpid()
+
+    def test_put_blocks_while_queue_is_full(self, cwd, monkeypatch):
+        monkeypatch.setattr(plugin.TaskPipeline, "QUEUE_SIZE", 1)
+        acting = threading.Event()
+        proceed = threading.Event()
+
+        def act(path, api):
+            acting.set()
+            proceed.wait()
+            return self._act(path, api)
+
+        with plugin.TaskPipeline(
+            [plug.Task(act=act)], api=None, cwd=cwd
+        ) as pipeline:
+            pipeline.put("task-0")
+            acting.wait()
+            pipeline.put("task-1")
+            handover = threading.Thread(target=pipeline.put, args=["task-2"])
+            handover.start()
+            handover.join(timeout=0.2)
+            blocked = handover.is_alive()
+            proceed.set()
+            handover.join()
+
+        assert blocked
+        assert sorted(pipeline.results) == ["task-0", "task-1", "task-2"]
+
+    def test_task_crash_in_worker_is_raised_on_exit(self, cwd):
+        with pytest.raises(plug.PlugError) as exc_info:
+            with plugin.TaskPipeline(
+                [plug.Task(act=_act_crash)], api=None, cwd=cwd, jobs=2
+            ) as pipeline:
+                pipeline.put("task-0")
+
+        assert isinstance(exc_info.value.__cause__, ValueError)
+
+    def test_task_crash_is_raised_on_exit(self, cwd):
+        def act(path, api):
+            raise ValueError("crash")
+
+        with pytest.raises(plug.PlugError) as exc_info:
+            with plugin.TaskPipeline(
+                [plug.Task(act=act)], api=None, cwd=cwd
+            ) as pipeline:
+                pipeline.put("task-0")
+
+        assert isinstance(exc_info.value.__cause__, ValueError)
+
 
 class TestInitializePlugins:
     """Tests for the initialize_plugins function."""
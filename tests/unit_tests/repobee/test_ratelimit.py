@@ -0,0 +1,227 @@
+"""Tests for the ratelimit module."""
+import threading
+import time
+from concurrent import futures
+
+import pytest
+
+from _repobee import ratelimit
+
+NOW = 1000000.0
+
+
+class FakeClock:
+    """A clock that only advances when sleeping."""
+
+    def __init__(self):
+        self.now = NOW
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def pacer(clock):
+    return ratelimit.RequestPacer(clock=clock.time, sleep=clock.sleep)
+
+
+def _headers(remaining, limit=5000, reset=NOW + 3600, **extra):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(reset)),
+        **extra,
+    }
+
+
+class TestRequestPacer:
+    """Tests for the RequestPacer class."""
+
+    def test_does_not_pace_with_plenty_of_requests_left(self, pacer, clock):
+        pacer.update(200, _headers(remaining=4000))
+
+        for _ in range(10):
+            pacer.wait("GET")
+
+        assert not clock.sleeps
+
+    def test_spreads_remaining_requests_until_reset(self, pacer, clock):
+        pacer.update(200, _headers(remaining=100))
+
+        for _ in range(3):
+            pacer.wait("GET")
+
+        # the first request is sent immediately
+        assert clock.sleeps == [
+            pytest.approx(3600 / 100),
+            pytest.approx(3600 / 99),
+        ]
+
+    def test_waits_for_reset_when_exhausted(self, pacer, clock):
+        pacer.update(200, _headers(remaining=0, reset=NOW + 120))
+
+        pacer.wait("GET")
+
+        assert clock.sleeps == [120]
+
+    def test_reads_gitlab_headers(self, pacer, clock):
+        pacer.update(
+            200,
+            {
+                "RateLimit-Limit": "600",
+                "RateLimit-Remaining": "0",
+                "RateLimit-Reset": str(int(NOW + 30)),
+            },
+        )
+
+        pacer.wait("POST")
+
+        assert clock.sleeps == [30]
+
+    def test_ignores_limits_of_other_resources(self, pacer, clock):
+        pacer.update(
+            200, _headers(remaining=0, **{"X-RateLimit-Resource": "graphql"})
+        )
+
+        pacer.wait("POST")
+
+        assert not clock.sleeps
+
+    def test_retries_after_retry_after(self, pacer, clock):
+        responses = iter(
+            [
+                (429, {"Retry-After": "17"}, ""),
+                (200, _headers(remaining=4000), "ok"),
+            ]
+        )
+
+        response = pacer.send("GET", lambda: next(responses), lambda r: r)
+
+        assert response[2] == "ok"
+        assert clock.sleeps == [17]
+
+    def test_spaces_content_creation_after_secondary_limit(self, pacer, clock):
+        responses = iter(
+            [
+                (403, {}, "You have exceeded a secondary rate limit."),
+                (201, _headers(remaining=4000), "created"),
+                (201, _headers(remaining=3999), "created"),
+            ]
+        )
+
+        for _ in range(2):
+            pacer.send("POST", lambda: next(responses), lambda r: r)
+        pacer.wait("GET")
+
+        assert clock.sleeps == [
+            ratelimit.DEFAULT_RETRY_DELAY,
+            ratelimit.SECONDARY_LIMIT_INTERVAL,
+        ]
+
+    def test_sends_content_creation_one_at_a_time(self):
+        pacer = ratelimit.RequestPacer()
+        in_flight = []
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def send():
+            nonlocal max_in_flight
+            with lock:
+                in_flight.append(None)
+                max_in_flight = max(max_in_flight, len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.pop()
+            return 201, _headers(remaining=4000), "created"
+
+        with futures.ThreadPoolExecutor(max_workers=4) as executor:
+            for _ in range(8):
+                executor.submit(pacer.send, "POST", send, lambda r: r)
+
+        assert max_in_flight == 1
+
+    def test_sends_bounded_amount_of_content_creation_concurrently(self):
+        pacer = ratelimit.RequestPacer(max_concurrent_writes=2)
+        in_flight = []
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def send():
+            nonlocal max_in_flight
+            with lock:
+                in_flight.append(None)
+                max_in_flight = max(max_in_flight, len(in_flight))
+            time.sleep(0.05)
+            with lock:
+                in_flight.pop()
+            return 201, _headers(remaining=4000), "created"
+
+        with futures.ThreadPoolExecutor(max_workers=4) as executor:
+            for _ in range(8):
+                executor.submit(pacer.send, "POST", send, lambda r: r)
+
+        assert max_in_flight == 2
+
+    def test_content_creation_does_not_hold_its_slot_while_backing_off(
+        self, clock
+    ):
+        slot_free_during_backoff = []
+
+        def sleep(seconds):
+            free = pacer._write_slots.acquire(blocking=False)
+            if free:
+                pacer._write_slots.release()
+            slot_free_during_backoff.append(free)
+            clock.sleep(seconds)
+
+        pacer = ratelimit.RequestPacer(clock=clock.time, sleep=sleep)
+        responses = iter(
+            [
+                (429, {"Retry-After": "10"}, ""),
+                (201, _headers(remaining=4000), "created"),
+            ]
+        )
+
+        response = pacer.send("POST", lambda: next(responses), lambda r: r)
+
+        assert response[2] == "created"
+        assert slot_free_during_backoff == [True]
+
+    def test_sends_reads_concurrently(self):
+        pacer = ratelimit.RequestPacer()
+        # each request waits for the other, so they must be concurrent
+        barrier = threading.Barrier(2, timeout=5)
+
+        def send():
+            barrier.wait()
+            return 200, _headers(remaining=4000), "ok"
+
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            results = [
+                executor.submit(pacer.send, "GET", send, lambda r: r)
+                for _ in range(2)
+            ]
+
+        assert [result.result()[2] for result in results] == ["ok", "ok"]
+
+    def test_gives_up_after_max_retries(self, pacer):
+        attempts = []
+
+        def send():
+            attempts.append(None)
+            return 429, {"Retry-After": "1"}, ""
+
+        status, *_ = pacer.send("GET", send, lambda r: r)
+
+        assert status == 429
+        assert len(attempts) == ratelimit.MAX_RETRIES + 1
@@ -0,0 +1,128 @@
+import pathlib
+import subprocess
+
+import pytest
+
+from _repobee import snapshot
+
+
+def _git(*args, cwd):
+    return subprocess.run(
+        [
+            "git",
+            "-c",
+            "user.name=Repo Bee",
+            "-c",
+            "user.email=repobee@example.com",
+            *args,
+        ],
+        cwd=str(cwd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    ).stdout.decode("utf8")
+
+
+@pytest.fixture
+def root(tmpdir):
+    return pathlib.Path(str(tmpdir))
+
+
+@pytest.fixture
+def repo(root):
+    path = root / "repo"
+    path.mkdir()
+    _git("init", "-q", cwd=path)
+    (path / "src").mkdir()
+    (path / "src" / "Main.java").write_text("class Main {}\n")
+    (path / "README.md").write_text("# Hello\n")
+    _git("add", ".", cwd=path)
+    _git("commit", "-q", "-m", "Initial commit", cwd=path)
+    _git("gc", "-q", cwd=path)
+    return path
+
+
+@pytest.fixture
+def no_reflinks(mocker):
+    mocker.patch("_repobee.snapshot._reflink_supported", return_value=False)
+
+
+class TestCreate:
+    """Tests for create."""
+
+    @pytest.mark.usefixtures("no_reflinks")
+    def test_repo_objects_are_hardlinked(self, repo, root):
+        dst = root / "snapshot"
+
+        strategy = snapshot.create(repo, dst)
+
+        assert strategy == snapshot.Strategy.HARDLINK
+        assert (dst / "src" / "Main.java").read_text() == "class Main {}\n"
+        assert not _git("status", "--porcelain", cwd=dst).strip()
+        packs = list((repo / ".git" / "objects" / "pack").glob("*.pack"))
+        assert packs
+        for pack in packs:
+            linked = dst / ".git" / "objects" / "pack" / pack.name
+            assert linked.stat().st_ino == pack.stat().st_ino
+
+    @pytest.mark.usefixtures("no_reflinks")
+    def test_modifying_hardlinked_snapshot_leaves_original(self, repo, root):
+        dst = root / "snapshot"
+        snapshot.create(repo, dst)
+
+        (dst / "README.md").write_text("# Changed\n")
+        _git("commit", "-q", "-am", "Change", cwd=dst)
+        _git("gc", "-q", "--prune=now", cwd=dst)
+
+        assert (repo / "README.md").read_text() == "# Hello\n"
+        assert not _git("status", "--porcelain", cwd=repo).strip()
+        _git("fsck", "--strict", cwd=repo)
+
+    @pytest.mark.usefixtures("no_reflinks")
+    def test_uncommitted_files_are_included(self, repo, root):
+        (repo / "untracked.txt").write_text("not committed")
+        (repo / "README.md").write_text("# Modified\n")
+        dst = root / "snapshot"
+
+        strategy = snapshot.create(repo, dst)
+
+        assert strategy == snapshot.Strategy.HARDLINK
+        assert (dst / "untracked.txt").read_text() == "not committed"
+        assert (dst / "README.md").read_text() == "# Modified\n"
+
+    @pytest.mark.usefixtures("no_reflinks")
+    def test_only_links_files_in_object_store(self, repo, root):
+        """A directory in the working tree that looks like an object store
+        must be copied, as tasks may modify its files in place.
+        """
+        lookalike = repo / "objects" / "ab" / "file.txt"
+        lookalike.parent.mkdir(parents=True)
+        lookalike.write_text("content")
+        dst = root / "snapshot"
+
+        snapshot.create(repo, dst)
+
+        copied = dst / "objects" / "ab" / "file.txt"
+        assert copied.stat().st_ino != lookalike.stat().st_ino
+
+    @pytest.mark.usefixtures("no_reflinks")
+    def test_non_repo_is_copied(self, root):
+        src = root / "src"
+        src.mkdir()
+        (src / "file.txt").write_text("content")
+        dst = root / "snapshot"
+
+        strategy = snapshot.create(src, dst)
+
+        assert strategy == snapshot.Strategy.COPY
+        assert (dst / "file.txt").read_text() == "content"
+
+    def test_falls_back_if_reflink_fails(self, repo, root, mocker):
+        mocker.patch("_repobee.snapshot._reflink_supported", return_value=True)
+        mocker.patch("_repobee.snapshot._reflink", return_value=False)
+        dst = root / "snapshot"
+
+        strategy = snapshot.create(repo, dst)
+
+        assert strategy == snapshot.Strategy.HARDLINK
+        assert (dst / "README.md").read_text() == "# Hello\n"
@@ -0,0 +1,184 @@
+"""Tests for the taskcache module."""
+import os
+import pathlib
+import subprocess
+
+import pytest
+
+import repobee_plug as plug
+
+import _repobee
+from _repobee import plugin
+from _repobee import taskcache
+from _repobee.ext import javac
+
+TASK_ID = "some.module.act@1.0.0"
+
+
+def _git(*args, cwd):
+    subprocess.run(
+        ["git", *args],
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def repo(tmpdir):
+    path = pathlib.Path(str(tmpdir)) / "task-1"
+    path.mkdir()
+    _git("init", cwd=path)
+    _git("config", "user.name", "Some Name", cwd=path)
+    _git("config", "user.email", "some@example.com", cwd=path)
+    (path / "README.md").write_text("Hello")
+    _git("add", ".", cwd=path)
+    _git("commit", "-m", "Initial commit", cwd=path)
+    return path
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return taskcache.TaskCache(
+        pathlib.Path(str(tmpdir)) / "cache", config_digest="digest"
+    )
+
+
+def _result(status=plug.Status.SUCCESS):
+    return plug.Result(
+        name="task", status=status, msg="Some message", data={"a": [1, 2]}
+    )
+
+
+class TestTaskCache:
+    """Tests for the TaskCache class."""
+
+    def test_stored_results_are_looked_up(self, repo, cache):
+        outcomes = {(repo.name, 0): _result(), (repo.name, 1): None}
+        cache.store([repo], [TASK_ID, TASK_ID + "2"], outcomes)
+
+        # a new instance, as trees are memoized
+        new_cache = taskcache.TaskCache(cache.root, cache.config_digest)
+        assert new_cache.lookup([repo], [TASK_ID, TASK_ID + "2"]) == outcomes
+
+    def test_miss_after_new_commit(self, repo, cache):
+        cache.store([repo], [TASK_ID], {(repo.name, 0): _result()})
+        (repo / "README.md").write_text("Changed")
+        _git("commit", "-am", "Change", cwd=repo)
+
+        new_cache = taskcache.TaskCache(cache.root, cache.config_digest)
+        assert new_cache.lookup([repo], [TASK_ID]) == {}
+
+    def test_miss_with_other_config(self, repo, cache):
+        cache.store([repo], [TASK_ID], {(repo.name, 0): _result()})
+
+        new_cache = taskcache.TaskCache(cache.root, "other digest")
+        assert new_cache.lookup([repo], [TASK_ID]) == {}
+
+    def test_miss_for_other_repo_with_same_tree(self, repo, cache):
+        other_repo = repo.with_name("task-2")
+        other_repo.mkdir()
+        _git("init", cwd=other_repo)
+        (other_repo / "README.md").write_text("Hello")
+        _git("add", ".", cwd=other_repo)
+        _git(
+            "-c",
+            "user.name=Other Name",
+            "-c",
+            "user.email=other@example.com",
+            "commit",
+            "-m",
+            "Initial commit",
+            cwd=other_repo,
+        )
+        cache.store([repo], [TASK_ID], {(repo.name, 0): _result()})
+
+        assert cache.lookup([other_repo], [TASK_ID]) == {}
+
+    def test_does_not_cache_results_for_dirty_repo(self, repo, cache):
+        (repo / "untracked.txt").write_text("Not committed")
+
+        cache.store([repo], [TASK_ID], {(repo.name, 0): _result()})
+
+        assert not list(cache.root.iterdir())
+
+    def test_does_not_cache_errors_or_unidentified_tasks(self, repo, cache):
+        outcomes = {
+            (repo.name, 0): _result(plug.Status.ERROR),
+            (repo.name, 1): _result(),
+        }
+
+        cache.store([repo], [TASK_ID, None], outcomes)
+
+        assert cache.lookup([repo], [TASK_ID, None]) == {}
+
+    def test_evicts_least_recently_used_entries(self, repo, cache):
+        task_ids = ["{}{}".format(TASK_ID, i) for i in range(3)]
+        cache.store(
+            [repo],
+            task_ids,
+            {(repo.name, i): _result() for i in range(len(task_ids))},
+        )
+        entries = sorted(cache.root.iterdir())
+        for i, entry in enumerate(entries):
+            os.utime(str(entry), (i, i))
+        cache.max_size = (
+            entries[-1].stat().st_size + entries[-2].stat().st_size
+        ) / (1024 * 1024)
+
+        cache.evict()
+
+        assert sorted(cache.root.iterdir()) == entries[1:]
+
+    def test_store_evicts_when_cache_outgrows_limit(self, repo, cache):
+        cache.store([repo], [TASK_ID], {(repo.name, 0): _result()})
+        (old_entry,) = cache.root.iterdir()
+        os.utime(str(old_entry), (0, 0))
+        cache.max_size = old_entry.stat().st_size * 1.5 / (1024 * 1024)
+
+        cache.store([repo], [TASK_ID + "2"], {(repo.name, 0): _result()})
+
+        (entry,) = cache.root.iterdir()
+        assert entry != old_entry
+
+    def test_ignores_corrupt_entries(self, repo, cache):
+        cache.store([repo], [TASK_ID], {(repo.name, 0): _result()})
+        (entry,) = cache.root.iterdir()
+        entry.write_text('{"name": "task", "status"')
+
+        assert cache.lookup([repo], [TASK_ID]) == {}
+
+
+class TestExecuteTasksWithCache:
+    """Tests for executing tasks with a task cache."""
+
+    def test_tasks_are_not_executed_on_cached_repos(self, repo, cache, mocker):
+        mocker.patch(
+            "_repobee.plugin.task_id", autospec=True, return_value=TASK_ID
+        )
+        calls = []
+
+        def act(path, api):
+            calls.append(path.name)
+            return _result()
+
+        task = plug.Task(act=act)
+        cwd = repo.parent
+
+        first = plugin._execute_tasks(
+            [repo.name], [task], api=None, cwd=cwd, cache=cache
+        )
+        second = plugin._execute_tasks(
+            [repo.name], [task], api=None, cwd=cwd, cache=cache
+        )
+
+        assert calls == [repo.name]
+        assert first == second == {repo.name: [_result()]}
+
+    def test_task_id_includes_plugin_version(self):
+        task = javac.JavacCloneHook().clone_task()
+
+        assert plugin.task_id(task) == (
+            "_repobee.ext.javac.JavacCloneHook._act@" + _repobee.__version__
+        )
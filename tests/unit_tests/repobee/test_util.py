@@ -1,4 +1,5 @@
 import os
+import pathlib
 import sys
 import itertools
 import tempfile
@@ -94,6 +95,24 @@ def test_repo_name_extracts_correct_part(url, expected_name):
     assert util.repo_name(url) == expected_name
 
 
+class TestLocalRepoPath:
+    """Tests for local_repo_path."""
+
+    def test_returns_path_to_local_repo(self, tmpdir):
+        repo_path = pathlib.Path(str(tmpdir)) / "some repo"
+        (repo_path / ".git").mkdir(parents=True)
+
+        assert util.local_repo_path(repo_path.as_uri()) == repo_path
+
+    def test_returns_none_for_non_repo(self, tmpdir):
+        path = pathlib.Path(str(tmpdir))
+
+        assert util.local_repo_path(path.as_uri()) is None
+
+    def test_returns_none_for_remote_url(self):
+        assert util.local_repo_path("https://github.com/slarse/repo") is None
+
+
 @pytest.fixture
 def directory_structure(tmpdir):
     """Create a directory structure like this:
@@ -193,3 +212,53 @@ class TestFindFilesByExtension:
         files = list(util.find_files_by_extension(str(root), "java"))
 
         assert not files
+
+
+class TestScratchDir:
+    """Tests for scratch_dir."""
+
+    def test_creates_dir_in_scratch_root_on_same_filesystem(
+        self, scratch_dir, tmpdir
+    ):
+        with util.scratch_dir("staging", pathlib.Path(str(tmpdir))) as path:
+            assert path.is_dir()
+            assert path.parent == scratch_dir
+            assert util.is_scratch_dir(path)
+
+        assert not path.exists()
+        assert not list(scratch_dir.iterdir())
+
+    def test_creates_dir_next_to_target_on_other_filesystem(
+        self, mocker, tmpdir
+    ):
+        near = pathlib.Path(str(tmpdir)) / "near"
+        near.mkdir()
+        stat = os.stat
+        mocker.patch(
+            "os.stat",
+            side_effect=lambda p, *args, **kwargs: (
+                os.stat_result((0,) * 2 + (-1,) + (0,) * 7)
+                if pathlib.Path(p) == near
+                else stat(p, *args, **kwargs)
+            ),
+        )
+
+        with util.scratch_dir("staging", near) as path:
+            assert path.parent == near.resolve()
+
+    def test_removes_stale_scratch_dirs(self, scratch_dir, tmpdir):
+        scratch_dir.mkdir(parents=True)
+        stale = scratch_dir / (util.SCRATCH_DIR_PREFIX + "staging-abc")
+        (stale / "repo").mkdir(parents=True)
+        stale_lock = stale.with_name(stale.name + ".lock")
+        stale_lock.touch()
+
+        with util.scratch_dir("staging", pathlib.Path(str(tmpdir))):
+            assert not stale.exists()
+            assert not stale_lock.exists()
+
+    def test_does_not_remove_scratch_dirs_in_use(self, scratch_dir, tmpdir):
+        near = pathlib.Path(str(tmpdir))
+        with util.scratch_dir("staging", near) as in_use:
+            with util.scratch_dir("tasks", near):
+                assert in_use.is_dir()
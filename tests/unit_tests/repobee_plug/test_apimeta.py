@@ -4,6 +4,7 @@ from repobee_plug import _exceptions
 
 import collections
 import datetime
+import pickle
 
 
 def api_methods():
@@ -113,6 +114,25 @@ class TestAPI:
             == expected
         )
 
+    def test_is_recreated_from_init_args_when_unpickled(self):
+        """Connections can't be pickled, so an API instance should be
+        re-created from scratch when it is unpickled.
+        """
+        api = _PickledAPI("some-url", token="some-token")
+        api.connection = object()
+
+        unpickled = pickle.loads(pickle.dumps(api))
+
+        assert isinstance(unpickled, _PickledAPI)
+        assert unpickled.args == ("some-url", "some-token")
+        assert unpickled.connection is None
+
+
+class _PickledAPI(_apimeta.API):
+    def __init__(self, base_url, token):
+        self.args = (base_url, token)
+        self.connection = None
+
 
 class TestAPIObject:
     def test_raises_when_accessing_none_implementation(self):